@@ -4,36 +4,14 @@ from dotenv import load_dotenv
 import os
 import logging
 import traceback
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+from app.utils.logging_config import create_log_handlers
 
 # 加载环境变量
 load_dotenv()
 
 # 配置日志
-log_file = os.getenv('LOG_FILE', './logs/app.log')
 log_level = os.getenv('LOG_LEVEL', 'INFO')
-
-# 确保日志目录存在
-os.makedirs(os.path.dirname(log_file), exist_ok=True)
-
-# 设置日志格式
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(process)d - %(thread)d - %(message)s'
-)
-
-# 文件日志处理器（大小轮转）
-file_handler = RotatingFileHandler(
-    log_file, 
-    maxBytes=10*1024*1024, 
-    backupCount=5
-)
-file_handler.setLevel(getattr(logging, log_level))
-file_handler.setFormatter(formatter)
-
-# 控制台日志处理器
-console_handler = logging.StreamHandler()
-console_handler.setLevel(getattr(logging, log_level))
-console_handler.setFormatter(formatter)
+file_handler, console_handler = create_log_handlers()
 
 # 创建Flask应用
 app = Flask(__name__)
@@ -56,12 +34,13 @@ root_logger.addHandler(console_handler)
 root_logger.setLevel(getattr(logging, log_level))
 
 # 导入数据库和模型
-from app.models import db, Anchor, Recording, Summary
+from app.models import db, Anchor, Recording, Summary, upgrade_schema
 db.init_app(app)
 
-# 创建数据库表
+# 创建数据库表，并为已有数据库补充新增的列
 with app.app_context():
     db.create_all()
+    upgrade_schema()
 
 # 全局错误处理
 @app.errorhandler(404)
@@ -1,8 +1,13 @@
 from flask import Blueprint, jsonify, request
-from app.models import db, Anchor, Recording, Summary
+from app.models import db, Anchor, Recording, Summary, LiveEvent
+from app.services.video_recorder import video_recorder
+from app.services.analysis_queue import analysis_queue
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import desc
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
+import hmac
+import json
 import os
 
 # 创建蓝图
@@ -12,6 +17,9 @@ bp = Blueprint('api', __name__, url_prefix='/api')
 
 # 主播管理接口
 
+# 主播录制模式，None表示使用全局配置
+CAPTURE_MODES = (None, 'video', 'audio')
+
 @bp.route('/anchors', methods=['GET'])
 def get_anchors():
     """获取所有主播列表"""
@@ -37,6 +45,7 @@ def get_anchors():
             'room_id': anchor.room_id,
             'avatar_url': anchor.avatar_url,
             'is_followed': anchor.is_followed,
+            'capture_mode': anchor.capture_mode,
             'created_at': anchor.created_at.isoformat() if anchor.created_at else None,
             'updated_at': anchor.updated_at.isoformat() if anchor.updated_at else None
         } for anchor in anchors],
@@ -52,6 +61,8 @@ def add_anchor():
     data = request.json
     if not data or not data.get('name') or not data.get('douyin_id'):
         return jsonify({'error': 'Missing required fields'}), 400
+    if data.get('capture_mode') not in CAPTURE_MODES:
+        return jsonify({'error': 'Invalid capture_mode'}), 400
     
     # 检查是否已存在
     existing_anchor = Anchor.query.filter_by(douyin_id=data['douyin_id']).first()
@@ -64,7 +75,8 @@ def add_anchor():
         douyin_id=data['douyin_id'],
         room_id=data.get('room_id'),
         avatar_url=data.get('avatar_url'),
-        is_followed=data.get('is_followed', True)
+        is_followed=data.get('is_followed', True),
+        capture_mode=data.get('capture_mode')
     )
     
     db.session.add(new_anchor)
@@ -77,6 +89,7 @@ def add_anchor():
         'room_id': new_anchor.room_id,
         'avatar_url': new_anchor.avatar_url,
         'is_followed': new_anchor.is_followed,
+        'capture_mode': new_anchor.capture_mode,
         'created_at': new_anchor.created_at.isoformat() if new_anchor.created_at else None
     }), 201
 
@@ -98,6 +111,10 @@ def update_anchor(anchor_id):
         anchor.avatar_url = data['avatar_url']
     if 'is_followed' in data:
         anchor.is_followed = data['is_followed']
+    if 'capture_mode' in data:
+        if data['capture_mode'] not in CAPTURE_MODES:
+            return jsonify({'error': 'Invalid capture_mode'}), 400
+        anchor.capture_mode = data['capture_mode']
     
     db.session.commit()
     
@@ -108,6 +125,7 @@ def update_anchor(anchor_id):
         'room_id': anchor.room_id,
         'avatar_url': anchor.avatar_url,
         'is_followed': anchor.is_followed,
+        'capture_mode': anchor.capture_mode,
         'updated_at': anchor.updated_at.isoformat() if anchor.updated_at else None
     }), 200
 
@@ -202,6 +220,17 @@ def get_recording(recording_id):
         } if recording.summary else None
     }), 200
 
+@bp.route('/recordings/<int:recording_id>/progress', methods=['GET'])
+def get_recording_progress(recording_id):
+    """获取录制的实时进度（码率、时长、速度、丢帧、文件大小等）"""
+    recording = Recording.query.filter_by(id=recording_id).first()
+    if not recording:
+        return jsonify({'error': 'Recording not found'}), 404
+    
+    progress = video_recorder.get_recording_status(recording_id, detailed=True)
+    progress['status'] = recording.status
+    return jsonify(progress), 200
+
 # 摘要管理接口
 
 @bp.route('/summaries', methods=['GET'])
@@ -283,8 +312,77 @@ def get_summary(summary_id):
         } if summary.recording else None
     }), 200
 
+# 直播事件推送接口
+
+LIVE_EVENT_TYPES = ('live_start', 'live_end')
+
+def _check_live_event_token():
+    """校验推送事件的令牌"""
+    expected_token = os.getenv('LIVE_EVENT_TOKEN')
+    if not expected_token:
+        return False
+    
+    token = request.headers.get('X-Live-Event-Token')
+    if not token:
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            token = authorization[len('Bearer '):]
+    return bool(token) and hmac.compare_digest(token, expected_token)
+
+@bp.route('/live-events', methods=['POST'])
+def receive_live_events():
+    """接收上游推送的开播/下播事件"""
+    if not _check_live_event_token():
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'Missing request body'}), 400
+    
+    # 支持单个事件或 {"events": [...]} 批量推送
+    events = data.get('events') if isinstance(data, dict) and 'events' in data else [data]
+    if not isinstance(events, list):
+        return jsonify({'error': 'events must be a list'}), 400
+    
+    for event in events:
+        if not isinstance(event, dict) or not event.get('douyin_id') or event.get('type') not in LIVE_EVENT_TYPES:
+            return jsonify({'error': 'Each event requires douyin_id and type (live_start or live_end)'}), 400
+    
+    accepted = 0
+    duplicates = 0
+    for event in events:
+        event_id = event.get('event_id')
+        # 相同event_id的事件只保存一次
+        if event_id and LiveEvent.query.filter_by(event_id=str(event_id)).first():
+            duplicates += 1
+            continue
+        
+        db.session.add(LiveEvent(
+            event_id=str(event_id) if event_id else None,
+            douyin_id=str(event['douyin_id']),
+            event_type=event['type'],
+            live_info=json.dumps(event.get('live_info') or {}, ensure_ascii=False)
+        ))
+        try:
+            db.session.commit()
+            accepted += 1
+        except IntegrityError:
+            # 并发推送相同事件
+            db.session.rollback()
+            duplicates += 1
+    
+    return jsonify({
+        'accepted': accepted,
+        'duplicates': duplicates
+    }), 202
+
 # 系统状态接口
 
+@bp.route('/system/analysis-queue', methods=['GET'])
+def get_analysis_queue():
+    """获取内容分析队列状态（排队深度、排队时间、执行时间）"""
+    return jsonify(analysis_queue.get_stats()), 200
+
 @bp.route('/system/status', methods=['GET'])
 def get_system_status():
     """获取系统状态"""
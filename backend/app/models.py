@@ -2,9 +2,13 @@ from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Foreign
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship, deferred
+import logging
 
 from flask_sqlalchemy import SQLAlchemy
 
+# 配置日志
+logger = logging.getLogger(__name__)
+
 # 创建数据库实例
 db = SQLAlchemy()
 
@@ -18,6 +22,7 @@ class Anchor(db.Model):
     room_id = db.Column(db.String(100), nullable=True, index=True)  # 直播间ID
     avatar_url = db.Column(db.String(255), nullable=True)
     is_followed = db.Column(db.Boolean, default=True, index=True)  # 是否关注
+    capture_mode = db.Column(db.String(20), nullable=True)  # 录制模式：video, audio；为空时使用全局配置
     created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
     updated_at = db.Column(db.DateTime(timezone=True), onupdate=db.func.now())
     
@@ -30,17 +35,63 @@ class Recording(db.Model):
     
     id = db.Column(db.Integer, primary_key=True, index=True)
     anchor_id = db.Column(db.Integer, db.ForeignKey('anchors.id'), nullable=False, index=True)
-    video_path = db.Column(db.String(255), nullable=False)
+    video_path = db.Column(db.String(255), nullable=True)  # 录制文件路径，文件清理后为空
     video_duration = db.Column(db.Integer, nullable=True)
     start_time = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
     end_time = db.Column(db.DateTime(timezone=True), nullable=True, index=True)
-    status = db.Column(db.String(20), default='pending', index=True)  # 状态：pending, recording, completed, failed
+    status = db.Column(db.String(20), default='pending', index=True)  # 状态：pending, recording, finalizing, completed, failed
+    live_transcript = deferred(db.Column(db.Text, nullable=True))  # 录制过程中已转写的文本
+    live_transcribed_seconds = db.Column(db.Float, nullable=True)  # 录制过程中已转写到的秒数
     created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
     updated_at = db.Column(db.DateTime(timezone=True), onupdate=db.func.now())
     
+    __table_args__ = (
+        db.Index('ix_recordings_status_end_time', 'status', 'end_time'),  # 按状态和结束时间筛选过期录制
+    )
+    
     # 关系
     anchor = db.relationship('Anchor', back_populates='recordings', lazy='joined')
     summary = db.relationship('Summary', back_populates='recording', uselist=False, lazy='joined')
+    segments = db.relationship('RecordingSegment', back_populates='recording', lazy='dynamic')
+    transcripts = db.relationship('Transcript', back_populates='recording', lazy='dynamic')
+
+class RecordingSegment(db.Model):
+    """录制分段模型（分段录制模式下每个已写完的分段）"""
+    __tablename__ = 'recording_segments'
+    
+    id = db.Column(db.Integer, primary_key=True, index=True)
+    recording_id = db.Column(db.Integer, db.ForeignKey('recordings.id'), nullable=False, index=True)
+    segment_index = db.Column(db.Integer, nullable=False)  # 分段序号
+    path = db.Column(db.String(255), nullable=True)  # 分段文件路径，清理后为空
+    start_offset = db.Column(db.Float, nullable=True)  # 分段在整场直播中的起始秒数
+    duration = db.Column(db.Float, nullable=True)  # 分段时长（秒）
+    transcript = deferred(db.Column(db.Text, nullable=True))  # 分段转写文本
+    status = db.Column(db.String(20), default='pending', index=True)  # 状态：pending, processing, completed, failed
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), onupdate=db.func.now())
+    
+    # 关系
+    recording = db.relationship('Recording', back_populates='segments')
+
+class Transcript(db.Model):
+    """转写结果模型，按音频内容哈希和模型大小缓存，重新分析时无需再次转写"""
+    __tablename__ = 'transcripts'
+    
+    id = db.Column(db.Integer, primary_key=True, index=True)
+    recording_id = db.Column(db.Integer, db.ForeignKey('recordings.id'), nullable=True, index=True)
+    content_hash = db.Column(db.String(64), nullable=True)  # 16kHz单声道PCM的SHA-256，由分段或增量转写拼接的文本为空
+    model_size = db.Column(db.String(50), nullable=False)  # 转写使用的模型（Whisper模型大小，其他引擎为 引擎:大小）
+    text = deferred(db.Column(db.Text, nullable=False))  # 转写文本
+    segments = deferred(db.Column(db.Text, nullable=True))  # 带时间戳的转写片段（JSON）
+    duration = db.Column(db.Float, nullable=True)  # 音频时长（秒）
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    
+    __table_args__ = (
+        db.UniqueConstraint('content_hash', 'model_size', name='uq_transcripts_hash_model'),
+    )
+    
+    # 关系
+    recording = db.relationship('Recording', back_populates='transcripts')
 
 class Summary(db.Model):
     """内容摘要模型"""
@@ -58,4 +109,121 @@ class Summary(db.Model):
     updated_at = db.Column(db.DateTime(timezone=True), onupdate=db.func.now())
     
     # 关系
-    recording = db.relationship('Recording', back_populates='summary', lazy='joined')
\ No newline at end of file
+    recording = db.relationship('Recording', back_populates='summary', lazy='joined')
+
+
+class AnalysisJob(db.Model):
+    """内容分析任务模型，录制完成后排队等待分析"""
+    __tablename__ = 'analysis_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True, index=True)
+    recording_id = db.Column(db.Integer, db.ForeignKey('recordings.id'), unique=True, nullable=False)
+    priority = db.Column(db.Integer, nullable=False, default=0)  # 优先级，数值小的先分析
+    status = db.Column(db.String(20), default='queued', index=True)  # 状态：queued, running, completed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 已执行次数
+    last_error = db.Column(db.Text, nullable=True)  # 最近一次失败的原因
+    enqueued_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())  # 入队时间，重试时更新
+    started_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_analysis_jobs_status_priority', 'status', 'priority', 'enqueued_at'),  # 按优先级取下一个任务
+    )
+    
+    # 关系
+    recording = db.relationship('Recording')
+
+class SchedulerLease(db.Model):
+    """调度租约模型，用于多进程间选举唯一的主节点"""
+    __tablename__ = 'scheduler_leases'
+    
+    name = db.Column(db.String(50), primary_key=True)  # 租约名称
+    holder = db.Column(db.String(100), nullable=True)  # 当前持有者（节点ID）
+    expires_at = db.Column(db.Float, nullable=False, default=0)  # 租约过期时间（Unix时间戳）
+    heartbeat_at = db.Column(db.Float, nullable=True)  # 最近一次续约时间（Unix时间戳）
+
+class MonitorNode(db.Model):
+    """监测节点模型，用于分片模式下的节点注册和心跳"""
+    __tablename__ = 'monitor_nodes'
+    
+    node_id = db.Column(db.String(100), primary_key=True)  # 节点ID
+    hostname = db.Column(db.String(100), nullable=True)  # 主机名
+    started_at = db.Column(db.Float, nullable=True)  # 节点启动时间（Unix时间戳）
+    heartbeat_at = db.Column(db.Float, nullable=False, default=0, index=True)  # 最近一次心跳时间（Unix时间戳）
+
+class LiveEvent(db.Model):
+    """直播事件模型，保存上游推送的开播/下播事件"""
+    __tablename__ = 'live_events'
+    
+    id = db.Column(db.Integer, primary_key=True, index=True)
+    event_id = db.Column(db.String(100), unique=True, nullable=True)  # 上游事件ID，用于去重
+    douyin_id = db.Column(db.String(100), nullable=False, index=True)  # 抖音ID
+    event_type = db.Column(db.String(20), nullable=False)  # 事件类型：live_start, live_end
+    live_info = db.Column(db.Text, nullable=True)  # 直播信息（JSON）
+    status = db.Column(db.String(20), default='pending', index=True)  # 状态：pending, processed, ignored, failed
+    received_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    processed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+class PipelineEvent(db.Model):
+    """流水线事件模型（持久化事件总线），进程重启或由其他进程发布的事件不会丢失"""
+    __tablename__ = 'pipeline_events'
+    
+    id = db.Column(db.Integer, primary_key=True, index=True)
+    event_type = db.Column(db.String(50), nullable=False)  # 事件类型：recording.completed, summary.completed
+    payload = db.Column(db.Text, nullable=True)  # 事件内容（JSON）
+    status = db.Column(db.String(20), default='pending', index=True)  # 状态：pending, processing, processed, failed
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.now())
+    processed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+# 已有数据库中需要补充的列：(表名, 列名, 列定义)；db.create_all() 不会修改已存在的表
+UPGRADE_COLUMNS = [
+    ('anchors', 'capture_mode', 'VARCHAR(20)'),
+    ('recordings', 'live_transcript', 'TEXT'),
+    ('recordings', 'live_transcribed_seconds', 'FLOAT'),
+]
+
+# 已有数据库中需要改为可空的列：(模型, 列名)
+UPGRADE_NULLABLE = [
+    (Recording, 'video_path'),
+]
+
+def upgrade_schema():
+    """升级已有数据库的表结构（可重复执行），需要在 db.create_all() 之后、应用上下文中调用"""
+    inspector = db.inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    with db.engine.begin() as conn:
+        for table, column, definition in UPGRADE_COLUMNS:
+            if table not in tables:
+                continue
+            if column in {existing['name'] for existing in inspector.get_columns(table)}:
+                continue
+            conn.exec_driver_sql(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+            logger.info(f'Added column {table}.{column}')
+
+    inspector = db.inspect(db.engine)
+    for model, column in UPGRADE_NULLABLE:
+        table = model.__table__
+        if table.name not in tables:
+            continue
+        existing = {item['name']: item for item in inspector.get_columns(table.name)}
+        if column not in existing or existing[column]['nullable']:
+            continue
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'sqlite':
+                # SQLite不支持修改列的约束，需要重建表
+                _rebuild_sqlite_table(conn, table, list(existing))
+            else:
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ALTER COLUMN {column} DROP NOT NULL')
+        logger.info(f'Made column {table.name}.{column} nullable')
+
+def _rebuild_sqlite_table(conn, table, existing_columns):
+    """按模型定义重建SQLite表并复制原有数据（外键约束在SQLite中默认不检查）"""
+    columns = ', '.join(column.name for column in table.columns if column.name in existing_columns)
+    create = str(db.schema.CreateTable(table).compile(conn)).strip()
+    prefix = f'CREATE TABLE {table.name} '
+    conn.exec_driver_sql(f'CREATE TABLE {table.name}_new ' + create[len(prefix):])
+    conn.exec_driver_sql(f'INSERT INTO {table.name}_new ({columns}) SELECT {columns} FROM {table.name}')
+    conn.exec_driver_sql(f'DROP TABLE {table.name}')
+    conn.exec_driver_sql(f'ALTER TABLE {table.name}_new RENAME TO {table.name}')
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
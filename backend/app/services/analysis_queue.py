@@ -0,0 +1,300 @@
+import os
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from threading import Lock, Event
+from flask import Flask, current_app, has_app_context
+from app.models import db, Recording, Summary, AnalysisJob
+from app.services.video_recorder import video_recorder
+from app.services.storage_manager import storage_manager
+from app.services.event_bus import event_bus, SUMMARY_COMPLETED
+from app.utils.logging_config import configure_worker_logging
+from sqlalchemy.exc import IntegrityError
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 未关注主播的录制排在所有关注主播的录制之后
+UNFOLLOWED_PRIORITY = 10 ** 7
+
+# 分析工作进程的应用上下文
+_worker_context = None
+
+def _init_worker():
+    """初始化分析工作进程：配置日志，创建只用于数据库访问的应用上下文"""
+    global _worker_context
+    configure_worker_logging()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///./data.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    _worker_context = app.app_context()
+    _worker_context.push()
+
+def _run_analysis(recording_id, app=None):
+    """在工作进程（或线程）中分析一个录制，返回是否成功；app为空时使用当前的应用上下文"""
+    # 内容分析依赖jieba和语音识别模型，只在执行分析的进程中导入
+    from app.services.content_analyzer import content_analyzer
+    if app is None:
+        return content_analyzer.analyze_recording(recording_id)
+    with app.app_context():
+        return content_analyzer.analyze_recording(recording_id)
+
+class AnalysisQueue:
+    """内容分析任务队列
+
+    已完成但未分析的录制作为任务保存在数据库中，按优先级（关注主播的录制优先，
+    同类录制中时长短的优先）依次分配给分析工作进程。分析是CPU密集且受GIL限制的，
+    配置多个工作进程时各任务在独立进程中并行执行；1表示在当前进程的后台线程中执行。
+    失败的任务重新排队，超过最大次数后标记为失败。
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv('ANALYSIS_WORKERS', 1))  # 并行分析的进程数，每个进程各加载一份模型；1表示在当前进程分析
+        self.poll_interval = int(os.getenv('ANALYSIS_POLL_INTERVAL', 10))  # 检查队列和已完成任务的间隔（秒）
+        self.backfill_interval = int(os.getenv('ANALYSIS_BACKFILL_INTERVAL', 300))  # 扫描未入队录制的间隔（秒）
+        self.max_attempts = int(os.getenv('ANALYSIS_MAX_ATTEMPTS', 3))  # 任务最多执行次数
+        self.keep_analyzed_recordings = os.getenv('KEEP_ANALYZED_RECORDINGS', 'False').lower() == 'true'  # 分析后保留录制文件，存储空间不足时再清理
+        self._pool = None
+        self._pool_lock = Lock()
+        self._running = {}  # future -> 任务ID
+        self._wakeup = Event()
+
+    @staticmethod
+    def get_priority(recording):
+        """计算录制的分析优先级：关注主播优先，其次时长短的优先"""
+        duration = min(recording.video_duration or 0, UNFOLLOWED_PRIORITY - 1)
+        followed = recording.anchor.is_followed if recording.anchor else False
+        return duration if followed else UNFOLLOWED_PRIORITY + duration
+
+    def enqueue(self, recording_id, priority=None):
+        """把录制加入分析队列，已在队列中时返回False"""
+        try:
+            if priority is None:
+                recording = Recording.query.filter_by(id=recording_id).first()
+                if not recording:
+                    logger.error(f'Recording not found: {recording_id}')
+                    return False
+                priority = self.get_priority(recording)
+
+            db.session.add(AnalysisJob(
+                recording_id=recording_id,
+                priority=priority,
+                enqueued_at=datetime.now()
+            ))
+            db.session.commit()
+            logger.info(f'Queued recording {recording_id} for analysis with priority {priority}')
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        except Exception as e:
+            logger.error(f'Error queueing recording {recording_id} for analysis: {e}')
+            db.session.rollback()
+            return False
+
+    def enqueue_pending(self, limit=500):
+        """把已完成但未分析、也不在队列中的录制加入队列（兜底处理重启前或其他节点完成的录制）"""
+        try:
+            recordings = Recording.query.filter_by(
+                status='completed'
+            ).outerjoin(
+                Summary, Summary.recording_id == Recording.id
+            ).outerjoin(
+                AnalysisJob, AnalysisJob.recording_id == Recording.id
+            ).filter(
+                Summary.id == None,
+                AnalysisJob.id == None
+            ).limit(limit).all()
+        except Exception as e:
+            logger.error(f'Error checking pending recordings: {e}')
+            db.session.rollback()
+            return 0
+
+        queued = sum(1 for recording in recordings if self.enqueue(recording.id, self.get_priority(recording)))
+        if queued:
+            logger.info(f'Queued {queued} pending recordings for analysis')
+        return queued
+
+    def recover(self):
+        """把上次运行中断的任务重新排队（当前进程正在执行的除外）"""
+        try:
+            running_ids = set(self._running.values())
+            recovered = AnalysisJob.query.filter(
+                AnalysisJob.status == 'running',
+                ~AnalysisJob.id.in_(running_ids) if running_ids else db.true()
+            ).update({'status': 'queued', 'started_at': None}, synchronize_session=False)
+            db.session.commit()
+            if recovered:
+                logger.info(f'Requeued {recovered} interrupted analysis jobs')
+            return recovered
+        except Exception as e:
+            logger.error(f'Error recovering analysis jobs: {e}')
+            db.session.rollback()
+            return 0
+
+    def wake(self):
+        """有新任务或任务完成时唤醒分析线程"""
+        self._wakeup.set()
+
+    def wait(self, timeout=None):
+        """等待被唤醒，最多等待timeout秒（默认为检查间隔）"""
+        self._wakeup.wait(self.poll_interval if timeout is None else timeout)
+        self._wakeup.clear()
+
+    def dispatch(self):
+        """收集已完成的任务，并按优先级把排队的任务分配给空闲的工作进程，返回本次启动的任务数"""
+        for future in [future for future in self._running if future.done()]:
+            self._finish(self._running.pop(future), future)
+
+        started = 0
+        while len(self._running) < self.workers:
+            job = self._claim_next()
+            if not job:
+                break
+            # 单进程模式下分析线程沿用调度线程的应用上下文
+            app = current_app._get_current_object() if self.workers <= 1 and has_app_context() else None
+            try:
+                future = self._get_pool().submit(_run_analysis, job.recording_id, app)
+            except BrokenProcessPool as e:
+                logger.error(f'Analysis worker pool failed ({e}), restarting it')
+                self._reset_pool()
+                future = self._get_pool().submit(_run_analysis, job.recording_id, app)
+            self._running[future] = job.id
+            future.add_done_callback(lambda _: self.wake())
+            started += 1
+        return started
+
+    def _claim_next(self):
+        """认领优先级最高的排队任务，没有时返回None"""
+        try:
+            candidates = AnalysisJob.query.filter_by(status='queued').order_by(
+                AnalysisJob.priority.asc(), AnalysisJob.enqueued_at.asc()
+            ).limit(5).all()
+            for job in candidates:
+                claimed = AnalysisJob.query.filter(
+                    AnalysisJob.id == job.id,
+                    AnalysisJob.status == 'queued'
+                ).update({
+                    'status': 'running',
+                    'started_at': datetime.now(),
+                    'attempts': AnalysisJob.attempts + 1
+                }, synchronize_session=False)
+                db.session.commit()
+                if claimed == 1:
+                    db.session.refresh(job)
+                    return job
+        except Exception as e:
+            logger.error(f'Error claiming analysis job: {e}')
+            db.session.rollback()
+        return None
+
+    def _finish(self, job_id, future):
+        """记录任务结果，失败时重新排队或标记为失败"""
+        try:
+            success = future.result()
+            error = None if success else 'analysis failed'
+        except BrokenProcessPool as e:
+            # 工作进程异常退出（如内存不足），进程池需要重建
+            self._reset_pool()
+            success, error = False, f'worker process died: {e}'
+        except Exception as e:
+            success, error = False, traceback.format_exc()
+
+        try:
+            job = AnalysisJob.query.filter_by(id=job_id).first()
+            if not job:
+                return
+            job.finished_at = datetime.now()
+            if success:
+                job.status = 'completed'
+                job.last_error = None
+                logger.info(f'Analyzed recording {job.recording_id} successfully')
+            elif job.attempts < self.max_attempts:
+                job.status = 'queued'
+                job.last_error = error
+                job.enqueued_at = datetime.now()
+                logger.warning(
+                    f'Failed to analyze recording {job.recording_id} '
+                    f'(attempt {job.attempts}/{self.max_attempts}), requeued'
+                )
+            else:
+                job.status = 'failed'
+                job.last_error = error
+                logger.error(f'Failed to analyze recording {job.recording_id} after {job.attempts} attempts')
+            db.session.commit()
+        except Exception as e:
+            logger.error(f'Error updating analysis job {job_id}: {e}')
+            db.session.rollback()
+            return
+
+        if success:
+            if self.keep_analyzed_recordings:
+                # 保留的文件由存储空间管理按水位清理，这里只更新当前进程的存储占用统计
+                recording = Recording.query.filter_by(id=job.recording_id).first()
+                if recording:
+                    storage_manager.refresh(recording)
+            else:
+                # 分析完成后清理录制文件（同时更新当前进程的存储占用统计）
+                video_recorder.cleanup_recording(job.recording_id)
+
+            summary = Summary.query.filter_by(recording_id=job.recording_id).first()
+            if summary:
+                event_bus.publish(SUMMARY_COMPLETED, {'summary_id': summary.id, 'recording_id': job.recording_id})
+
+    def _get_pool(self):
+        """创建分析进程池（spawn方式启动），单进程模式下使用一个后台线程"""
+        with self._pool_lock:
+            if self._pool is None:
+                if self.workers > 1:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analysis')
+            return self._pool
+
+    def _reset_pool(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def get_stats(self):
+        """获取队列状态：各状态的任务数、排队最久的等待时间，以及最近24小时任务的平均排队和执行时间"""
+        now = datetime.now()
+        counts = dict(db.session.query(AnalysisJob.status, db.func.count(AnalysisJob.id)).group_by(AnalysisJob.status))
+        oldest = db.session.query(db.func.min(AnalysisJob.enqueued_at)).filter(AnalysisJob.status == 'queued').scalar()
+
+        finished = db.session.query(
+            AnalysisJob.enqueued_at, AnalysisJob.started_at, AnalysisJob.finished_at
+        ).filter(
+            AnalysisJob.status == 'completed',
+            AnalysisJob.finished_at >= now - timedelta(days=1)
+        ).all()
+        waits = [(started - enqueued).total_seconds() for enqueued, started, _ in finished if enqueued and started]
+        runs = [(done - started).total_seconds() for _, started, done in finished if started and done]
+
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'completed': counts.get('completed', 0),
+            'failed': counts.get('failed', 0),
+            'workers': self.workers,
+            'oldest_queued_seconds': round((now - oldest).total_seconds()) if oldest else 0,
+            'avg_queue_seconds_24h': round(sum(waits) / len(waits)) if waits else 0,
+            'avg_run_seconds_24h': round(sum(runs) / len(runs)) if runs else 0,
+            'completed_24h': len(finished)
+        }
+
+# 创建分析队列实例
+analysis_queue = AnalysisQueue()
@@ -0,0 +1,132 @@
+import os
+import logging
+import math
+from threading import Lock
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class ASRBackend:
+    """语音识别引擎接口
+
+    load() 加载模型，失败时返回None；transcribe(audio, **options) 转写音频文件路径或
+    16kHz单声道float32数组，返回Whisper格式的结果 {'text', 'segments': [{'start', 'end', 'text'}]}。
+    模型在第一次转写时才加载。同一个模型实例的转写依次执行（whisper解码时在模型上注册kv-cache钩子，
+    分段转写、增量转写和内容分析线程并发调用会互相干扰）。
+    """
+
+    engine = None
+
+    def __init__(self, model_size=None, threads=None):
+        self.model_size = model_size or os.getenv('WHISPER_MODEL_SIZE', 'small')
+        self.threads = threads
+        self.model = None
+        self._lock = Lock()
+        self._transcribe_lock = Lock()
+
+    def load(self):
+        """加载模型，加载失败返回None"""
+        if self.model is not None:
+            return self.model
+
+        with self._lock:
+            if self.model is None:
+                try:
+                    logger.info(f'Loading {self.engine} model: {self.model_size}')
+                    self.model = self._load_model()
+                    logger.info(f'{self.engine} model loaded successfully')
+                except Exception as e:
+                    logger.error(f'Error loading {self.engine} model: {e}')
+        return self.model
+
+    def transcribe(self, audio, **options):
+        model = self.load()
+        if model is None:
+            raise RuntimeError(f'{self.engine} model not loaded')
+        with self._transcribe_lock:
+            return self._transcribe(model, audio, **options)
+
+    def _load_model(self):
+        raise NotImplementedError
+
+    def _transcribe(self, model, audio, **options):
+        raise NotImplementedError
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper（PyTorch）"""
+
+    engine = 'whisper'
+
+    def _load_model(self):
+        # whisper依赖torch，导入本身就需要数秒，放到第一次使用时
+        import whisper
+        return whisper.load_model(self.model_size)
+
+    def _transcribe(self, model, audio, **options):
+        return model.transcribe(audio, **options)
+
+class FasterWhisperBackend(ASRBackend):
+    """faster-whisper（CTranslate2），CPU上使用int8量化推理"""
+
+    engine = 'faster-whisper'
+
+    def __init__(self, model_size=None, threads=None):
+        super().__init__(model_size, threads)
+        self.compute_type = os.getenv('ASR_COMPUTE_TYPE', 'int8')  # faster-whisper的计算精度：int8、int8_float32、float32等
+
+    def _load_model(self):
+        from faster_whisper import WhisperModel
+        return WhisperModel(
+            self.model_size,
+            device='cpu',
+            compute_type=self.compute_type,
+            cpu_threads=self.threads or 0
+        )
+
+    def _transcribe(self, model, audio, **options):
+        segments, _ = model.transcribe(audio, **options)
+        segments = [
+            {'start': segment.start, 'end': segment.end, 'text': segment.text}
+            for segment in segments
+        ]
+        return {'text': ''.join(segment['text'] for segment in segments), 'segments': segments}
+
+class StubBackend(ASRBackend):
+    """确定性的模拟引擎（测试用）：每stub_segment_seconds秒音频输出一个标明时间范围的片段"""
+
+    engine = 'stub'
+
+    def __init__(self, model_size=None, threads=None):
+        super().__init__(model_size, threads)
+        self.segment_seconds = float(os.getenv('ASR_STUB_SEGMENT_SECONDS', 10))  # 模拟引擎每个片段的时长（秒）
+
+    def _load_model(self):
+        return self
+
+    def _transcribe(self, model, audio, **options):
+        if isinstance(audio, str):
+            raise ValueError('Stub backend only accepts audio arrays')
+        duration = len(audio) / 16000
+        segments = []
+        for i in range(math.ceil(duration / self.segment_seconds)):
+            start = i * self.segment_seconds
+            end = min(duration, start + self.segment_seconds)
+            segments.append({'start': start, 'end': end, 'text': f'[{start:.0f}s-{end:.0f}s]'})
+        return {'text': ''.join(segment['text'] for segment in segments), 'segments': segments}
+
+# 可选的语音识别引擎
+ASR_BACKENDS = {
+    backend.engine: backend for backend in (WhisperBackend, FasterWhisperBackend, StubBackend)
+}
+
+def create_backend(engine=None, model_size=None, threads=None):
+    """按引擎名称（默认读取ASR_ENGINE）创建语音识别引擎，未知的名称使用whisper"""
+    engine = (engine or os.getenv('ASR_ENGINE', 'whisper')).lower()
+    if engine not in ASR_BACKENDS:
+        logger.error(f'Unknown ASR engine {engine}, using whisper')
+        engine = 'whisper'
+    return ASR_BACKENDS[engine](model_size, threads)
@@ -0,0 +1,84 @@
+import argparse
+import logging
+import multiprocessing
+import resource
+import subprocess
+import time
+import numpy as np
+from app.services.asr import ASR_BACKENDS, create_backend
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+def load_audio(path):
+    """用ffmpeg把音频文件转换为16kHz单声道float32数组"""
+    cmd = ['ffmpeg', '-nostdin', '-i', path, '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE), '-f', 'f32le', '-']
+    result = subprocess.run(cmd, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def synthetic_audio(seconds=60, seed=0):
+    """生成固定的测试音频（调幅噪声），只用于比较吞吐量，不代表识别效果"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = (np.sin(2 * np.pi * 0.25 * t) > 0).astype(np.float32)
+    return (0.1 * envelope * rng.standard_normal(len(t))).astype(np.float32)
+
+def _run(engine, model_size, threads, audio, options):
+    """在单独的进程中加载引擎并转写，进程的峰值内存只包含该引擎"""
+    backend = create_backend(engine, model_size, threads)
+    started = time.time()
+    if backend.load() is None:
+        return {'engine': engine, 'error': 'model not loaded'}
+    load_seconds = time.time() - started
+
+    started = time.time()
+    result = backend.transcribe(audio, **options)
+    transcribe_seconds = time.time() - started
+    return {
+        'engine': engine,
+        'load_seconds': load_seconds,
+        'transcribe_seconds': transcribe_seconds,
+        'rtf': transcribe_seconds / (len(audio) / SAMPLE_RATE),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'text_length': len(result['text'])
+    }
+
+def benchmark(engines, audio, model_size=None, threads=None, options=None):
+    """依次测试各引擎，返回每个引擎的加载时间、实时率（转写耗时/音频时长）和峰值内存"""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for engine in engines:
+        with context.Pool(1) as pool:
+            try:
+                results.append(pool.apply(_run, (engine, model_size, threads, audio, options or {})))
+            except Exception as e:
+                results.append({'engine': engine, 'error': str(e)})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='ASR engine benchmark')
+    parser.add_argument('--audio', help='audio or video file to transcribe; a fixed synthetic sample is used if omitted')
+    parser.add_argument('--seconds', type=float, default=60, help='length of the synthetic sample')
+    parser.add_argument('--engines', default=','.join(ASR_BACKENDS), help='comma separated engines')
+    parser.add_argument('--model-size', default=None)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--language', default='zh')
+    args = parser.parse_args()
+
+    audio = load_audio(args.audio) if args.audio else synthetic_audio(args.seconds)
+    print(f'Audio: {len(audio) / SAMPLE_RATE:.1f}s')
+    print(f'{"engine":<16}{"load(s)":>10}{"rtf":>10}{"peak rss(MB)":>16}{"chars":>8}')
+    for result in benchmark(args.engines.split(','), audio, args.model_size, args.threads, {'language': args.language}):
+        if 'error' in result:
+            print(f'{result["engine"]:<16}error: {result["error"]}')
+            continue
+        print(
+            f'{result["engine"]:<16}{result["load_seconds"]:>10.2f}{result["rtf"]:>10.3f}'
+            f'{result["peak_rss_mb"]:>16.0f}{result["text_length"]:>8}'
+        )
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    main()
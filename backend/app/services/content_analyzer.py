@@ -1,14 +1,25 @@
+import hashlib
+import json
 import logging
 import os
+import struct
 import subprocess
+import tempfile
+import time
 import traceback
 from datetime import datetime
-from app.models import db, Recording, Summary
+from threading import Lock
+from app.models import db, Recording, RecordingSegment, Summary, Transcript
+from sqlalchemy.exc import IntegrityError
+from app.utils.media import is_audio_only
+from app.utils.text import PhraseMatcher, classify_sentences
+from app.services.storage_manager import storage_manager
+from app.services.transcription import ChunkedTranscriber, SAMPLE_RATE
+from app.services.summarization import HierarchicalSummarizer
 from dotenv import load_dotenv
+import numpy as np
 import jieba
 import jieba.analyse
-from summa import summarizer
-import whisper
 
 # 加载环境变量
 load_dotenv()
@@ -16,24 +27,52 @@ load_dotenv()
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 文本分析的句子分类及其关键词，可通过ANALYSIS_KEYWORDS_FILE覆盖
+DEFAULT_KEYWORDS = {
+    'core_points': ['认为', '觉得', '建议', '推荐', '关注', '看好', '看空', '观点', '分析', '预测'],
+    'market_analysis': ['市场', '走势', '指数', '板块', '行业', '经济', '政策'],
+    'investment_advice': ['建议', '投资', '策略', '注意', '风险', '机会', '关注', '布局']
+}
+
 class ContentAnalyzer:
     """内容提取和分析服务"""
     
     def __init__(self):
         self.summary_storage_path = os.getenv('SUMMARY_STORAGE_PATH', './data/summaries')
-        self.whisper_model = None
-        self._load_whisper_model()
+        self.segment_wait_timeout = int(os.getenv('SEGMENT_WAIT_TIMEOUT', 900))  # 等待其他线程转写分段的最长时间（秒）
+        self.pcm_extract_mode = os.getenv('PCM_EXTRACT_MODE', 'pipe').lower()  # 音频提取方式：pipe从ffmpeg输出直接读入内存，mmap写入临时PCM文件后内存映射
+        self.keep_analyzed_recordings = os.getenv('KEEP_ANALYZED_RECORDINGS', 'False').lower() == 'true'  # 分析后保留录制文件，存储空间不足时再清理
+        self.transcriber = ChunkedTranscriber()  # 分块并行转写，模型在第一次转写时才加载
+        self.summarizer = HierarchicalSummarizer()  # 分层抽取式摘要，计算量与文本长度大致成正比
+        self.keywords_file = os.getenv('ANALYSIS_KEYWORDS_FILE', '')  # 句子分类关键词文件（JSON，{分类: [关键词]}），修改后下次分析时生效
+        self._keywords_mtime = None
+        self._keywords_lock = Lock()
+        self.phrase_matcher = PhraseMatcher(DEFAULT_KEYWORDS)
+        self._reload_keywords()
     
-    def _load_whisper_model(self):
-        """加载Whisper模型"""
-        try:
-            model_size = os.getenv('WHISPER_MODEL_SIZE', 'small')
-            logger.info(f'Loading Whisper model: {model_size}')
-            self.whisper_model = whisper.load_model(model_size)
-            logger.info('Whisper model loaded successfully')
-        except Exception as e:
-            logger.error(f'Error loading Whisper model: {e}')
-            self.whisper_model = None
+    def set_keywords(self, keywords):
+        """更换句子分类关键词：构建新的匹配器后整体替换，正在进行的分析不受影响"""
+        categories = dict(DEFAULT_KEYWORDS)
+        categories.update({name: list(phrases) for name, phrases in keywords.items() if name in DEFAULT_KEYWORDS})
+        self.phrase_matcher = PhraseMatcher(categories)
+        logger.info(f'Analysis keywords updated: {sum(len(phrases) for phrases in categories.values())} phrases')
+    
+    def _reload_keywords(self):
+        """关键词文件有修改时重新加载"""
+        if not self.keywords_file:
+            return
+        
+        with self._keywords_lock:
+            try:
+                mtime = os.path.getmtime(self.keywords_file)
+                if mtime == self._keywords_mtime:
+                    return
+                with open(self.keywords_file, 'r', encoding='utf-8') as f:
+                    keywords = json.load(f)
+                self.set_keywords(keywords)
+                self._keywords_mtime = mtime
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                logger.error(f'Error loading analysis keywords from {self.keywords_file}: {e}')
     
     def analyze_recording(self, recording_id):
         """分析录制内容并生成摘要"""
@@ -46,25 +85,43 @@ class ContentAnalyzer:
                 logger.error(f'Recording not found: {recording_id}')
                 return False
             
-            # 检查视频文件是否存在
-            if not os.path.exists(recording.video_path):
-                logger.error(f'Video file not found: {recording.video_path}')
-                return False
-            
-            # 提取音频
-            audio_path = self._extract_audio(recording.video_path)
-            if not audio_path:
-                logger.error(f'Failed to extract audio from video: {recording.video_path}')
-                return False
-            
-            # 转换音频为文本
-            transcript = self._transcribe_audio(audio_path)
-            if not transcript:
-                logger.error(f'Failed to transcribe audio: {audio_path}')
-                return False
-            
-            # 清理音频文件
-            self._cleanup_audio(audio_path)
+            segments = recording.segments.order_by(RecordingSegment.segment_index).all()
+            # 已保存的转写结果（重新分析时）直接使用
+            transcript = self._load_transcript(recording_id)
+            if transcript is not None:
+                logger.info(f'Reusing stored transcript for recording: {recording_id}')
+            elif segments:
+                # 分段录制：大部分分段已在录制过程中转写，这里只补齐剩余分段
+                transcript, mock = self._transcribe_segments(segments)
+                if not transcript:
+                    logger.error(f'Failed to transcribe segments of recording: {recording_id}')
+                    return False
+                if not mock:
+                    self._save_transcript(recording_id, transcript)
+            elif recording.live_transcribed_seconds:
+                # 录制过程中已转写的部分直接使用，只转写剩余部分
+                tail = self._transcribe_video(recording.video_path, start=recording.live_transcribed_seconds)
+                if tail is not None:
+                    # 剩余部分没有语音时只使用录制中已转写的文本
+                    transcript = (recording.live_transcript or '') + tail['text']
+                    if not transcript:
+                        logger.error(f'No speech transcribed for recording: {recording_id}')
+                        return False
+                    if not tail.get('mock'):
+                        self._save_transcript(recording_id, transcript)
+                else:
+                    # 剩余部分的音频无法提取时不能只用录制中的部分文本，改为转写整场录制
+                    logger.error(
+                        f'Failed to transcribe recording {recording_id} after '
+                        f'{recording.live_transcribed_seconds:.0f}s, transcribing the full recording'
+                    )
+                    transcript = self._transcribe_recording(recording)
+                    if not transcript:
+                        return False
+            else:
+                transcript = self._transcribe_recording(recording)
+                if not transcript:
+                    return False
             
             # 分析文本内容
             summary_data = self._analyze_text(transcript)
@@ -78,8 +135,11 @@ class ContentAnalyzer:
                 logger.error(f'Failed to save summary')
                 return False
             
-            # 清理视频文件
-            self._cleanup_video(recording)
+            # 清理视频文件（保留时由存储管理在空间不足时清理）
+            if not self.keep_analyzed_recordings:
+                self._cleanup_video(recording)
+                self._cleanup_segments(segments)
+                storage_manager.refresh(recording)
             
             logger.info(f'Recording {recording_id} analyzed successfully')
             return True
@@ -88,64 +148,301 @@ class ContentAnalyzer:
             db.session.rollback()
             return False
     
-    def _extract_audio(self, video_path):
-        """从视频中提取音频"""
+    def _load_transcript(self, recording_id):
+        """读取录制已保存的转写文本（当前模型），没有时返回None"""
+        transcript = Transcript.query.filter_by(
+            recording_id=recording_id,
+            model_size=self.transcriber.model_name
+        ).order_by(Transcript.id.desc()).first()
+        return transcript.text if transcript else None
+    
+    def _save_transcript(self, recording_id, text, content_hash=None, result=None, duration=None):
+        """保存转写结果，同一音频内容已保存时跳过"""
+        transcript = Transcript(
+            recording_id=recording_id,
+            content_hash=content_hash,
+            model_size=self.transcriber.model_name,
+            text=text,
+            segments=json.dumps(result['segments'], ensure_ascii=False) if result and result.get('segments') else None,
+            duration=duration
+        )
+        try:
+            db.session.add(transcript)
+            db.session.commit()
+        except IntegrityError:
+            # 其他进程同时转写了相同的音频
+            db.session.rollback()
+    
+    def _transcribe_recording(self, recording):
+        """转写整场录制，相同音频内容（按PCM哈希和模型）已转写过时直接复用"""
+        video_path = recording.video_path
+        if not video_path or not os.path.exists(video_path):
+            logger.error(f'Video file not found: {video_path}')
+            return None
+        
+        audio = self.extract_audio(video_path)
+        if audio is None:
+            logger.error(f'Failed to extract audio from video: {video_path}')
+            return None
+        
+        content_hash = hashlib.sha256(memoryview(audio).cast('B')).hexdigest()
+        cached = Transcript.query.filter_by(
+            content_hash=content_hash,
+            model_size=self.transcriber.model_name
+        ).first()
+        if cached:
+            logger.info(f'Reusing transcript {cached.id} with the same audio for recording: {recording.id}')
+            if cached.recording_id != recording.id:
+                # 复制一份关联到本录制（内容哈希唯一，副本不带哈希），录制文件清理后重新分析仍可读取
+                segments = {'segments': json.loads(cached.segments)} if cached.segments else None
+                self._save_transcript(recording.id, cached.text, result=segments, duration=cached.duration)
+            return cached.text
+        
+        result = self._transcribe_audio(audio)
+        if not result['text']:
+            logger.error(f'Failed to transcribe audio: {video_path}')
+            return None
+        if not result.get('mock'):
+            self._save_transcript(recording.id, result['text'], content_hash, result, len(audio) / SAMPLE_RATE)
+        return result['text']
+    
+    def _transcribe_video(self, video_path, start=None):
+        """提取视频音频并转写，start为开始转写的秒数，返回 {'text', 'segments'}（模拟结果带mock标记）
+        
+        没有语音（或start已在文件末尾）时返回空文本，文件不存在或音频提取失败时返回None。
+        """
+        # 检查视频文件是否存在
+        if not video_path or not os.path.exists(video_path):
+            logger.error(f'Video file not found: {video_path}')
+            return None
+        
+        # 提取音频
+        audio = self.extract_audio(video_path, start)
+        if audio is None:
+            logger.error(f'Failed to extract audio from video: {video_path}')
+            return None
+        
+        # 转换音频为文本
+        result = self._transcribe_audio(audio)
+        if not result['text']:
+            logger.info(f'No speech transcribed from {video_path}')
+        return result
+    
+    def transcribe_segment(self, segment_id):
+        """转写单个已写完的录制分段，返回转写结果，未转写（已被认领或转写失败）时返回None
+        
+        模拟结果不保存到分段，分段标记为失败，之后重新转写。
+        """
+        logger.info(f'Transcribing recording segment: {segment_id}')
+        
+        try:
+            if not self._claim_segment(segment_id):
+                logger.info(f'Segment {segment_id} already transcribed or in progress')
+                return None
+            
+            segment = RecordingSegment.query.filter_by(id=segment_id).first()
+            result = self._transcribe_video(segment.path)
+            if result is not None and not result.get('mock'):
+                segment.transcript = result['text']
+                segment.status = 'completed'
+            else:
+                segment.status = 'failed'
+            db.session.commit()
+            
+            logger.info(f'Segment {segment.segment_index} of recording {segment.recording_id} transcribed: {segment.status}')
+            return result
+        except Exception as e:
+            logger.error(f'Error transcribing segment {segment_id}: {e}')
+            db.session.rollback()
+            RecordingSegment.query.filter_by(id=segment_id, status='processing').update(
+                {'status': 'failed'}, synchronize_session=False
+            )
+            db.session.commit()
+            return None
+    
+    def get_pending_segment_ids(self, limit=50):
+        """获取等待转写的分段ID"""
+        return [
+            row.id for row in db.session.query(RecordingSegment.id).filter_by(
+                status='pending'
+            ).order_by(RecordingSegment.id).limit(limit)
+        ]
+    
+    def _claim_segment(self, segment_id):
+        """把分段标记为转写中，成功返回True；已被其他线程或进程认领时返回False"""
+        claimed = RecordingSegment.query.filter(
+            RecordingSegment.id == segment_id,
+            RecordingSegment.status.in_(['pending', 'failed'])
+        ).update({'status': 'processing'}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+    
+    def _transcribe_segments(self, segments):
+        """补齐未转写的分段，按顺序拼接全部分段的转写文本，返回 (文本, 是否包含模拟结果)"""
+        deadline = time.time() + self.segment_wait_timeout
+        mocked = {}  # 分段ID -> 本次使用的模拟结果（不保存到分段）
+        for segment in segments:
+            if segment.status in ('pending', 'failed'):
+                result = self.transcribe_segment(segment.id)
+                if result is not None and result.get('mock'):
+                    mocked[segment.id] = result['text']
+            
+            # 正在由分段转写任务处理的分段，等待其完成
+            db.session.refresh(segment)
+            while segment.status == 'processing' and time.time() < deadline:
+                time.sleep(5)
+                db.session.refresh(segment)
+        
+        transcripts = [
+            mocked.get(segment.id) or (segment.transcript if segment.status == 'completed' else None)
+            for segment in segments
+        ]
+        transcripts = [transcript for transcript in transcripts if transcript]
+        missing = sum(1 for segment in segments if segment.id not in mocked and segment.status != 'completed')
+        if missing:
+            logger.warning(f'{missing} of {len(segments)} segments have no transcript')
+        return '\n'.join(transcripts), bool(mocked)
+    
+    def extract_audio(self, video_path, start=None, duration=None):
+        """从视频中提取Whisper使用的16kHz单声道float32音频，可只提取从start秒开始的duration秒
+        
+        ffmpeg直接输出原始PCM，不生成中间音频文件。只录音频时直接写入的16kHz单声道WAV
+        不经过ffmpeg，直接读取采样。
+        """
         logger.info(f'Extracting audio from video: {video_path}')
         
-        # 生成音频文件名
-        audio_path = os.path.splitext(video_path)[0] + '.mp3'
+        if is_audio_only(video_path) and video_path.lower().endswith('.wav'):
+            audio = self._read_wav(video_path, start, duration)
+            if audio is not None:
+                return audio
         
-        # 构建FFmpeg命令
-        cmd = [
-            'ffmpeg',
-            '-i', video_path,
-            '-q:a', '0',  # 最高音频质量
-            '-map', 'a',  # 只提取音频
-            '-y',  # 覆盖已存在的文件
+        # 构建FFmpeg命令：解码为16kHz单声道float32小端PCM
+        cmd = ['ffmpeg', '-nostdin']
+        if start:
+            cmd += ['-ss', f'{start:.3f}']  # 输入前定位，只解码需要的部分
+        cmd += ['-i', video_path]
+        if duration:
+            cmd += ['-t', f'{duration:.3f}']
+        cmd += [
+            '-vn',  # 不解码视频
+            '-ac', '1',
+            '-ar', str(SAMPLE_RATE),
+            '-f', 'f32le',
             '-loglevel', 'error',  # 只记录错误
-            audio_path
         ]
         
         try:
-            # 执行命令
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                shell=False
-            )
-            
-            if result.returncode == 0:
-                logger.info(f'Audio extracted successfully: {audio_path}')
-                return audio_path
+            if self.pcm_extract_mode == 'mmap':
+                audio = self._extract_pcm_mmap(cmd, os.path.dirname(video_path))
             else:
-                logger.error(f'Error extracting audio: {result.stderr}')
-                return None
+                audio = self._extract_pcm_pipe(cmd)
+            if audio is not None:
+                logger.info(f'Audio extracted successfully: {len(audio) / SAMPLE_RATE:.0f}s')
+            return audio
         except Exception as e:
             logger.error(f'Error extracting audio: {e}')
             return None
     
-    def _transcribe_audio(self, audio_path):
-        """将音频转换为文本"""
-        logger.info(f'Transcribing audio: {audio_path}')
+    def _extract_pcm_pipe(self, cmd):
+        """从ffmpeg标准输出分块读入内存，读取缓冲区直接作为音频数组"""
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(cmd + ['pipe:1'], stdout=subprocess.PIPE, stderr=stderr, shell=False)
+            buffer = bytearray()
+            while True:
+                chunk = process.stdout.read(1 << 20)
+                if not chunk:
+                    break
+                buffer += chunk
+            process.stdout.close()
+            if process.wait() != 0:
+                stderr.seek(0)
+                logger.error(f'Error extracting audio: {stderr.read().decode("utf-8", "replace")}')
+                return None
+        # 去掉不完整的末尾采样
+        del buffer[len(buffer) - len(buffer) % 4:]
+        return np.frombuffer(buffer, dtype=np.float32)
+    
+    def _extract_pcm_mmap(self, cmd, pcm_dir):
+        """ffmpeg写入临时PCM文件后内存映射，映射建立后立即删除文件"""
+        # 临时文件放在录制文件旁边，避免写入基于内存的/tmp
+        fd, pcm_path = tempfile.mkstemp(suffix='.pcm', dir=pcm_dir)
+        os.close(fd)
+        try:
+            result = subprocess.run(cmd + ['-y', pcm_path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, shell=False)
+            if result.returncode != 0:
+                logger.error(f'Error extracting audio: {result.stderr}')
+                return None
+            samples = os.path.getsize(pcm_path) // 4
+            if not samples:
+                return np.zeros(0, dtype=np.float32)
+            # 写时复制映射：数组可写，数据按需从文件换入
+            return np.memmap(pcm_path, dtype=np.float32, mode='c', shape=(samples,))
+        finally:
+            # 已映射的文件删除后在映射释放前仍可读取
+            os.remove(pcm_path)
+    
+    @staticmethod
+    def _read_wav(path, start=None, duration=None):
+        """读取16kHz单声道16位PCM WAV的采样，格式不符或文件头损坏时返回None
+        
+        录制中的WAV文件头里的数据长度要到录制结束才写入（为0或占位值），
+        数据长度超出文件实际大小时按文件大小读取，录制过程中也能读取已写入的采样。
+        """
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(12)
+                if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+                    return None
+                fmt = None
+                while True:
+                    chunk_header = f.read(8)
+                    if len(chunk_header) < 8:
+                        return None
+                    chunk_id, size = chunk_header[:4], struct.unpack('<I', chunk_header[4:])[0]
+                    if chunk_id == b'data':
+                        break
+                    data = f.read(size + size % 2)
+                    if chunk_id == b'fmt ':
+                        fmt = data
+                if fmt is None or len(fmt) < 16:
+                    return None
+                audio_format, channels, rate = struct.unpack('<HHI', fmt[:8])
+                bits = struct.unpack('<H', fmt[14:16])[0]
+                if audio_format != 1 or channels != 1 or rate != SAMPLE_RATE or bits != 16:
+                    return None
+                
+                data_start = f.tell()
+                available = os.fstat(f.fileno()).st_size - data_start
+                if 0 < size <= available:
+                    available = size
+                total = available // 2
+                first = min(int((start or 0) * SAMPLE_RATE), total)
+                count = total - first
+                if duration:
+                    count = min(count, int(duration * SAMPLE_RATE))
+                f.seek(data_start + first * 2)
+                frames = f.read(count * 2)
+        except (OSError, struct.error):
+            return None
+        frames = frames[:len(frames) - len(frames) % 2]
+        return np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    
+    def _transcribe_audio(self, audio):
+        """将音频（16kHz单声道float32数组）转换为文本，返回 {'text', 'segments'}，使用模拟结果时带mock标记"""
+        logger.info(f'Transcribing audio: {len(audio) / SAMPLE_RATE:.0f}s')
         
         try:
-            if not self.whisper_model:
-                self._load_whisper_model()
-                if not self.whisper_model:
-                    logger.error('Whisper model not loaded')
-                    return self._mock_transcribe(audio_path)
-            
-            # 使用本地Whisper模型转录音频
-            result = self.whisper_model.transcribe(audio_path, language="zh")
-            transcript = result["text"]
-            logger.info(f'Audio transcribed successfully, text length: {len(transcript)}')
-            return transcript
+            # 使用Whisper模型转录音频
+            result = self.transcriber.transcribe(audio, language="zh")
+            if result is None:
+                logger.error('Whisper model not loaded')
+                return {'text': self._mock_transcribe(audio), 'segments': [], 'mock': True}
+            logger.info(f'Audio transcribed successfully, text length: {len(result["text"])}')
+            return result
         except Exception as e:
             logger.error(f'Error transcribing audio: {e}')
             # 出错时使用模拟结果
-            return self._mock_transcribe(audio_path)
+            return {'text': self._mock_transcribe(audio), 'segments': [], 'mock': True}
     
     def _analyze_text(self, text):
         """分析文本内容并生成摘要"""
@@ -153,17 +450,17 @@ class ContentAnalyzer:
         
         try:
             # 生成摘要
-            summary = summarizer.summarize(text, ratio=0.2)
+            summary = self.summarizer.summarize(text)
             
             # 提取关键词
             keywords = jieba.analyse.extract_tags(text, topK=10)
             
-            # 提取核心观点
-            core_points = self._extract_core_points(text)
-            
-            # 分析市场观点和投资建议
-            market_analysis = self._extract_market_analysis(text)
-            investment_advice = self._extract_investment_advice(text)
+            # 一次扫描提取核心观点、市场分析和投资建议
+            self._reload_keywords()
+            classified = classify_sentences(text, self.phrase_matcher)
+            core_points = self._extract_core_points(classified)
+            market_analysis = self._extract_market_analysis(classified)
+            investment_advice = self._extract_investment_advice(classified)
             
             return {
                 'content': summary,
@@ -177,19 +474,9 @@ class ContentAnalyzer:
             # 出错时使用模拟结果
             return self._mock_analyze_text(text)
     
-    def _extract_core_points(self, text):
+    def _extract_core_points(self, classified):
         """提取核心观点"""
-        # 简单实现：提取包含关键信息的句子
-        sentences = text.split('。')
-        core_points = []
-        
-        # 关键词列表
-        key_phrases = ['认为', '觉得', '建议', '推荐', '关注', '看好', '看空', '观点', '分析', '预测']
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence and any(phrase in sentence for phrase in key_phrases):
-                core_points.append(sentence)
+        core_points = classified['core_points']
         
         # 如果没有找到足够的核心观点，返回默认内容
         if not core_points:
@@ -197,36 +484,18 @@ class ContentAnalyzer:
         
         return core_points
     
-    def _extract_market_analysis(self, text):
+    def _extract_market_analysis(self, classified):
         """提取市场分析"""
-        # 简单实现：查找包含市场分析相关内容的部分
-        market_keywords = ['市场', '走势', '指数', '板块', '行业', '经济', '政策']
-        
-        sentences = text.split('。')
-        market_sentences = []
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence and any(keyword in sentence for keyword in market_keywords):
-                market_sentences.append(sentence)
+        market_sentences = classified['market_analysis']
         
         if market_sentences:
             return '。'.join(market_sentences[:3]) + '。'
         else:
             return '市场整体趋势稳定，需关注政策变化和行业动态。'
     
-    def _extract_investment_advice(self, text):
+    def _extract_investment_advice(self, classified):
         """提取投资建议"""
-        # 简单实现：查找包含投资建议相关内容的部分
-        advice_keywords = ['建议', '投资', '策略', '注意', '风险', '机会', '关注', '布局']
-        
-        sentences = text.split('。')
-        advice_sentences = []
-        
-        for sentence in sentences:
-            sentence = sentence.strip()
-            if sentence and any(keyword in sentence for keyword in advice_keywords):
-                advice_sentences.append(sentence)
+        advice_sentences = classified['investment_advice']
         
         if not advice_sentences:
             advice_sentences = ['保持理性投资，不盲目跟风', '分散投资，降低风险', '长期投资，减少频繁交易']
@@ -237,10 +506,14 @@ class ContentAnalyzer:
         """保存摘要到数据库"""
         logger.info(f'Saving summary for recording: {recording_id}')
         
-        # 检查是否已存在摘要
+        # 已存在摘要时（重新分析）更新内容
         existing_summary = Summary.query.filter_by(recording_id=recording_id).first()
         if existing_summary:
-            logger.warning(f'Summary already exists for recording: {recording_id}')
+            logger.info(f'Updating existing summary for recording: {recording_id}')
+            for field in ('content', 'core_points', 'market_analysis', 'investment_advice', 'keywords'):
+                setattr(existing_summary, field, summary_data.get(field, ''))
+            existing_summary.status = 'completed'
+            db.session.commit()
             return existing_summary
         
         # 创建新摘要
@@ -260,15 +533,6 @@ class ContentAnalyzer:
         logger.info(f'Summary saved successfully: {summary.id}')
         return summary
     
-    def _cleanup_audio(self, audio_path):
-        """清理音频文件"""
-        if audio_path and os.path.exists(audio_path):
-            try:
-                os.remove(audio_path)
-                logger.info(f'Cleaned up audio file: {audio_path}')
-            except Exception as e:
-                logger.error(f'Error cleaning up audio file: {e}')
-    
     def _cleanup_video(self, recording):
         """清理视频文件"""
         if recording.video_path and os.path.exists(recording.video_path):
@@ -280,7 +544,22 @@ class ContentAnalyzer:
             except Exception as e:
                 logger.error(f'Error cleaning up video file: {e}')
     
-    def _mock_transcribe(self, audio_path):
+    def _cleanup_segments(self, segments):
+        """清理已转写的分段文件"""
+        cleaned = False
+        for segment in segments:
+            if segment.path and os.path.exists(segment.path):
+                try:
+                    os.remove(segment.path)
+                    segment.path = None
+                    cleaned = True
+                except Exception as e:
+                    logger.error(f'Error cleaning up segment file: {e}')
+        if cleaned:
+            db.session.commit()
+            logger.info(f'Cleaned up segment files for recording: {segments[0].recording_id}')
+    
+    def _mock_transcribe(self, audio):
         """模拟音频转录"""
         # 模拟转录结果
         return """各位观众朋友们，大家晚上好！欢迎来到我的直播间。今天我想和大家分享一下我对当前股市的看法。
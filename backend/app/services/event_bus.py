@@ -0,0 +1,195 @@
+import os
+import json
+import queue
+import logging
+import traceback
+from datetime import datetime, timedelta
+from threading import Thread, Lock
+from flask import current_app, has_app_context
+from app.models import db, PipelineEvent
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 流水线事件类型
+RECORDING_COMPLETED = 'recording.completed'  # 录制完成：{'recording_id'}
+SUMMARY_COMPLETED = 'summary.completed'  # 摘要生成完成：{'summary_id', 'recording_id'}
+
+class EventBus:
+    """流水线事件总线
+
+    录制完成、摘要生成等事件发布后由后台线程立即分发给订阅的处理函数，
+    各阶段不再依赖轮询衔接。默认只在进程内分发，分发线程未运行（非主节点）时
+    发布的事件直接丢弃，由各阶段的兜底扫描处理；开启持久化后事件先写入数据库，
+    分发线程还会定期认领其他进程发布或重启前未处理的事件。
+    """
+
+    def __init__(self):
+        self.durable = os.getenv('EVENT_BUS_DURABLE', 'False').lower() == 'true'  # 事件写入数据库，跨进程和重启不丢失
+        self.poll_interval = int(os.getenv('EVENT_BUS_POLL_INTERVAL', 5))  # 持久化模式下认领其他进程发布的事件的间隔（秒）
+        self.is_running = False
+        self.handlers = {}  # 事件类型 -> [处理函数]
+        self._events = queue.Queue()
+        self._lock = Lock()
+        self._thread = None
+        self._app = None
+
+    def subscribe(self, event_type, handler):
+        """订阅事件，处理函数接收事件内容（dict）"""
+        with self._lock:
+            self.handlers.setdefault(event_type, []).append(handler)
+
+    def publish(self, event_type, payload=None):
+        """发布事件，立即返回，处理函数在分发线程中执行"""
+        payload = payload or {}
+        if self.durable:
+            try:
+                event = PipelineEvent(event_type=event_type, payload=json.dumps(payload))
+                db.session.add(event)
+                db.session.commit()
+                event_id = event.id
+            except Exception as e:
+                logger.error(f'Error saving {event_type} event: {e}')
+                db.session.rollback()
+                return False
+            if self.is_running:
+                self._events.put((event_id, event_type, payload))
+            return True
+
+        if not self.is_running:
+            logger.debug(f'Event bus not running, dropping {event_type} event')
+            return False
+        self._events.put((None, event_type, payload))
+        return True
+
+    def start(self):
+        """启动分发线程"""
+        if self.is_running:
+            return
+        logger.info(f'Starting event bus (durable: {self.durable})')
+        self._app = current_app._get_current_object() if has_app_context() else None
+        self.is_running = True
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止分发线程，未分发的进程内事件丢弃（持久化事件保留在数据库中）"""
+        if not self.is_running:
+            return
+        logger.info('Stopping event bus')
+        self.is_running = False
+        self._events.put(None)
+        if self._thread:
+            self._thread.join(timeout=10)
+        self._events = queue.Queue()
+
+    def _run(self):
+        if self._app is None:
+            self._dispatch_loop()
+            return
+        with self._app.app_context():
+            self._dispatch_loop()
+
+    def _dispatch_loop(self):
+        while self.is_running:
+            try:
+                try:
+                    item = self._events.get(timeout=self.poll_interval)
+                except queue.Empty:
+                    item = False
+                if item is False:
+                    if self.durable:
+                        self._dispatch_stored()
+                    continue
+                if item is None:
+                    break
+
+                event_id, event_type, payload = item
+                if event_id is None:
+                    self._dispatch(event_type, payload)
+                elif self._claim(event_id):
+                    self._finish(event_id, self._dispatch(event_type, payload))
+            except Exception as e:
+                logger.error(f'Error in event bus: {e}')
+                db.session.rollback()
+
+    def _dispatch(self, event_type, payload):
+        """依次调用订阅的处理函数，全部成功返回True"""
+        with self._lock:
+            handlers = list(self.handlers.get(event_type, []))
+
+        success = True
+        for handler in handlers:
+            try:
+                handler(payload)
+            except Exception:
+                logger.error(f'Error handling {event_type} event: {traceback.format_exc()}')
+                db.session.rollback()
+                success = False
+        return success
+
+    def _dispatch_stored(self, limit=100):
+        """分发数据库中待处理的事件（其他进程发布或重启前未处理的）"""
+        events = PipelineEvent.query.filter_by(status='pending').order_by(PipelineEvent.id).limit(limit).all()
+        for event in events:
+            if not self.is_running:
+                break
+            if self._claim(event.id):
+                payload = json.loads(event.payload) if event.payload else {}
+                self._finish(event.id, self._dispatch(event.event_type, payload))
+
+    def _claim(self, event_id):
+        """把事件标记为处理中，已被其他进程认领时返回False"""
+        claimed = PipelineEvent.query.filter(
+            PipelineEvent.id == event_id,
+            PipelineEvent.status == 'pending'
+        ).update({'status': 'processing'}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _finish(self, event_id, success):
+        PipelineEvent.query.filter_by(id=event_id).update({
+            'status': 'processed' if success else 'failed',
+            'processed_at': datetime.now()
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def recover(self):
+        """把上次运行中断时处理中的事件重新标记为待处理"""
+        if not self.durable:
+            return 0
+        try:
+            recovered = PipelineEvent.query.filter_by(status='processing').update(
+                {'status': 'pending'}, synchronize_session=False
+            )
+            db.session.commit()
+            if recovered:
+                logger.info(f'Requeued {recovered} interrupted pipeline events')
+            return recovered
+        except Exception as e:
+            logger.error(f'Error recovering pipeline events: {e}')
+            db.session.rollback()
+            return 0
+
+    def cleanup(self, days=7):
+        """清理已处理的持久化事件"""
+        if not self.durable:
+            return 0
+        try:
+            deleted = PipelineEvent.query.filter(
+                PipelineEvent.status.in_(['processed', 'failed']),
+                PipelineEvent.processed_at < datetime.now() - timedelta(days=days)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            return deleted
+        except Exception as e:
+            logger.error(f'Error cleaning up pipeline events: {e}')
+            db.session.rollback()
+            return 0
+
+# 创建事件总线实例
+event_bus = EventBus()
@@ -0,0 +1,152 @@
+import os
+import socket
+import time
+import uuid
+import logging
+from threading import Thread, Event
+from sqlalchemy.exc import IntegrityError
+from app.models import db, SchedulerLease
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+def default_node_id():
+    """生成当前进程的节点ID"""
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+class LeaderElection:
+    """基于数据库租约的主节点选举服务
+    
+    所有进程竞争同一行租约记录：租约未过期时只有持有者可以续约，租约过期后
+    任意进程都可以接管。主节点定期续约，备用节点定期尝试获取，因此主节点退出后
+    备用节点最多在一个租约有效期加一个心跳间隔内接管。
+    """
+    
+    def __init__(self, lease_name='task_scheduler'):
+        self.lease_name = lease_name
+        self.node_id = default_node_id()
+        self.lease_ttl = int(os.getenv('LEADER_LEASE_TTL', 15))  # 租约有效期（秒）
+        self.heartbeat_interval = float(os.getenv('LEADER_HEARTBEAT_INTERVAL', 5))  # 续约间隔（秒）
+        self.is_leader = False
+        self.is_running = False
+        self.lease_expires_at = 0
+        self._on_elected = None
+        self._on_revoked = None
+        self._stop_event = Event()
+        self._thread = None
+    
+    def start(self, on_elected=None, on_revoked=None):
+        """启动选举心跳线程"""
+        logger.info(f'Starting leader election for {self.lease_name} as node {self.node_id}')
+        self._on_elected = on_elected
+        self._on_revoked = on_revoked
+        self.is_running = True
+        self._stop_event.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """停止选举并释放租约"""
+        logger.info(f'Stopping leader election for {self.lease_name}')
+        self.is_running = False
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=10)
+        if self.is_leader:
+            self.release()
+            self._set_leader(False)
+    
+    def _run(self):
+        """心跳循环：主节点续约，备用节点尝试接管"""
+        while self.is_running:
+            try:
+                acquired = self.try_acquire()
+            except Exception as e:
+                logger.error(f'Error renewing lease {self.lease_name}: {e}')
+                db.session.rollback()
+                # 数据库暂时不可用时，在本地租约过期前保持主节点身份
+                acquired = self.is_leader and time.time() < self.lease_expires_at
+            
+            self._set_leader(acquired)
+            self._stop_event.wait(self.heartbeat_interval)
+    
+    def try_acquire(self):
+        """尝试获取或续约租约，成功返回True"""
+        now = time.time()
+        expires_at = now + self.lease_ttl
+        
+        # 原子更新：自己持有或租约已过期时才能获取
+        updated = SchedulerLease.query.filter(
+            SchedulerLease.name == self.lease_name,
+            db.or_(SchedulerLease.holder == self.node_id, SchedulerLease.expires_at < now)
+        ).update({
+            'holder': self.node_id,
+            'expires_at': expires_at,
+            'heartbeat_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        
+        if not updated:
+            if db.session.get(SchedulerLease, self.lease_name) is not None:
+                return False
+            # 租约记录不存在时创建，并发创建时只有一个进程成功
+            try:
+                db.session.add(SchedulerLease(
+                    name=self.lease_name,
+                    holder=self.node_id,
+                    expires_at=expires_at,
+                    heartbeat_at=now
+                ))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                return False
+        
+        self.lease_expires_at = expires_at
+        return True
+    
+    def release(self):
+        """主动释放租约，便于备用节点立即接管"""
+        try:
+            SchedulerLease.query.filter_by(
+                name=self.lease_name,
+                holder=self.node_id
+            ).update({'holder': None, 'expires_at': 0}, synchronize_session=False)
+            db.session.commit()
+            logger.info(f'Released lease {self.lease_name}')
+        except Exception as e:
+            logger.error(f'Error releasing lease {self.lease_name}: {e}')
+            db.session.rollback()
+    
+    def get_holder(self):
+        """获取当前租约持有者，租约过期时返回None"""
+        lease = db.session.get(SchedulerLease, self.lease_name)
+        if lease and lease.holder and lease.expires_at >= time.time():
+            return lease.holder
+        return None
+    
+    def _set_leader(self, is_leader):
+        """更新主节点身份并触发回调"""
+        if is_leader == self.is_leader:
+            return
+        
+        self.is_leader = is_leader
+        if is_leader:
+            logger.info(f'Node {self.node_id} became leader for {self.lease_name}')
+            callback = self._on_elected
+        else:
+            logger.warning(f'Node {self.node_id} lost leadership for {self.lease_name}')
+            callback = self._on_revoked
+        
+        if callback:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f'Error in leader election callback: {e}')
+
+# 创建主节点选举服务实例
+leader_election = LeaderElection()
@@ -1,9 +1,16 @@
 import time
-import requests
+import json
+import heapq
 import logging
 import traceback
-from datetime import datetime
-from app.models import db, Anchor, Recording
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from sqlalchemy.orm import lazyload
+from app.models import db, Anchor, Recording, LiveEvent
+from app.services.shard_manager import shard_manager
+from app.services.video_recorder import video_recorder
+from app.services.storage_manager import storage_manager
+from app.utils.http_client import create_session, backoff_delay
 import os
 from dotenv import load_dotenv
 
@@ -13,6 +20,120 @@ load_dotenv()
 # 配置日志
 logger = logging.getLogger(__name__)
 
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+class PollingSchedule:
+    """基于开播历史的自适应轮询调度
+    
+    以每个主播的下次检查时间为键维护一个小顶堆。根据历史录制的开播时间学习主播
+    习惯的开播时段，在这些时段附近密集检查，其余时间逐步退避，但不会越过下一个
+    开播时段的起点。
+    """
+    
+    def __init__(self, base_interval, min_interval, max_interval, hot_window):
+        self.base_interval = base_interval  # 无历史或直播中时的检查间隔（秒）
+        self.min_interval = min_interval  # 开播时段内的检查间隔（秒）
+        self.max_interval = max_interval  # 非开播时段的最大检查间隔（秒）
+        self.hot_window = hot_window  # 开播时段前后的窗口（分钟）
+        self._heap = []  # (下次检查时间戳, 主播ID)
+        self._due = {}  # 主播ID -> 下次检查时间戳，用于识别堆中已失效的条目
+        self._weekly_starts = {}  # 主播ID -> 历史开播时间（周内分钟）
+        self._daily_starts = {}  # 主播ID -> 历史开播时间（日内分钟）
+    
+    def __len__(self):
+        return len(self._due)
+    
+    def __contains__(self, anchor_id):
+        return anchor_id in self._due
+    
+    def learn(self, start_times_by_anchor):
+        """根据历史开播时间更新各主播的开播时段"""
+        self._weekly_starts = {}
+        self._daily_starts = {}
+        for anchor_id, start_times in start_times_by_anchor.items():
+            weekly = sorted({self._minute_of_week(start_time) for start_time in start_times})
+            self._weekly_starts[anchor_id] = weekly
+            self._daily_starts[anchor_id] = sorted({minute % MINUTES_PER_DAY for minute in weekly})
+    
+    def sync(self, anchor_ids, now):
+        """同步调度的主播集合：新关注的主播立即检查，取消关注的主播移出调度"""
+        anchor_ids = set(anchor_ids)
+        for anchor_id in list(self._due):
+            if anchor_id not in anchor_ids:
+                del self._due[anchor_id]
+        for anchor_id in anchor_ids:
+            if anchor_id not in self._due:
+                self.schedule(anchor_id, now)
+        
+        # 失效条目过多时重建堆
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due, anchor_id) for anchor_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+    
+    def schedule(self, anchor_id, due):
+        """设置主播的下次检查时间"""
+        self._due[anchor_id] = due
+        heapq.heappush(self._heap, (due, anchor_id))
+    
+    def reschedule(self, anchor_id, now, is_live=False):
+        """根据开播时段计算并设置主播的下次检查时间，返回间隔秒数"""
+        delay = self.next_delay(anchor_id, now, is_live)
+        self.schedule(anchor_id, now + delay)
+        return delay
+    
+    def pop_due(self, now):
+        """取出所有已到期的主播ID"""
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            due, anchor_id = heapq.heappop(self._heap)
+            if self._due.get(anchor_id) == due:
+                del self._due[anchor_id]
+                due_ids.append(anchor_id)
+        return due_ids
+    
+    def next_due(self):
+        """最早的下次检查时间戳，没有调度的主播时返回None"""
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+    
+    def next_delay(self, anchor_id, now, is_live=False):
+        """计算主播距离下次检查的秒数"""
+        # 直播中按基础间隔检查，及时发现下播
+        if is_live:
+            return self.base_interval
+        
+        weekly = self._weekly_starts.get(anchor_id)
+        if not weekly:
+            return self.base_interval
+        
+        minute = self._minute_of_week(datetime.fromtimestamp(now))
+        if self._distance(weekly, minute, MINUTES_PER_WEEK) <= self.hot_window:
+            return self.min_interval
+        
+        # 同一时刻在其他日期开播过，按基础间隔检查；否则退避
+        daily_minute = minute % MINUTES_PER_DAY
+        if self._distance(self._daily_starts[anchor_id], daily_minute, MINUTES_PER_DAY) <= self.hot_window:
+            delay = self.base_interval
+        else:
+            delay = self.max_interval
+        
+        # 退避不越过下一个开播时段的起点
+        minutes_until_window = min(
+            (start - self.hot_window - minute) % MINUTES_PER_WEEK for start in weekly
+        )
+        return max(self.min_interval, min(delay, minutes_until_window * 60))
+    
+    @staticmethod
+    def _minute_of_week(moment):
+        return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute + moment.second / 60
+    
+    @staticmethod
+    def _distance(points, value, period):
+        """value到points中最近一点的环形距离"""
+        return min(min(abs(point - value), period - abs(point - value)) for point in points)
+
 class LiveMonitor:
     """直播监测服务"""
     
@@ -22,27 +143,177 @@ class LiveMonitor:
         self.use_real_api = os.getenv('USE_REAL_API', 'False').lower() == 'true'
         self.api_timeout = int(os.getenv('API_TIMEOUT', 10))
         self.api_retries = int(os.getenv('API_RETRIES', 3))
+        self.api_url = os.getenv('DOUYIN_API_URL', 'https://api.example.com/douyin/live/status')
+        self.batch_api_url = os.getenv('DOUYIN_BATCH_API_URL')  # 批量查询接口，未配置时逐个查询
+        self.api_batch_size = max(1, int(os.getenv('API_BATCH_SIZE', 50)))  # 每次批量查询的主播数量
+        self.api_backoff_base = float(os.getenv('API_BACKOFF_BASE', 1))  # 重试退避的基础秒数
+        self.api_backoff_max = float(os.getenv('API_BACKOFF_MAX', 30))  # 重试退避的最大秒数
+        self.max_concurrency = max(1, int(os.getenv('MONITOR_CONCURRENCY', 20)))  # 并发检查的最大线程数
+        self.api_pool_size = max(1, int(os.getenv('API_POOL_SIZE', self.max_concurrency)))  # HTTP连接池大小
         self.is_running = False
+        self._run_id = 0  # 每次启动监测递增，旧的监测循环检测到变化后退出
+        self.sharding = os.getenv('MONITOR_SHARDING', 'False').lower() == 'true'  # 多个监测节点按抖音ID分片
+        self._shard_version = None
+        self._capture_shard_version = None  # 上次完成录制交接时的分片版本
+        self.shard_sync_interval = float(os.getenv('SHARD_SYNC_INTERVAL', 5))  # 分片模式下等待期间检查分片变化的间隔（秒）
+        self.last_sweep_stats = {}  # 最近一轮检查的统计信息
+        self.anchor_latencies = {}  # 每个主播最近一次状态检查的耗时（秒）
+        
+        # 自适应轮询配置
+        self.adaptive_polling = os.getenv('ADAPTIVE_POLLING', 'False').lower() == 'true'
+        self.history_days = int(os.getenv('ADAPTIVE_HISTORY_DAYS', 28))  # 学习开播时段使用的历史天数
+        self.schedule_refresh_interval = int(os.getenv('ADAPTIVE_REFRESH_INTERVAL', 600))  # 刷新主播列表和开播时段的间隔（秒）
+        self.schedule = PollingSchedule(
+            base_interval=self.check_interval,
+            min_interval=int(os.getenv('ADAPTIVE_MIN_INTERVAL', 60)),
+            max_interval=int(os.getenv('ADAPTIVE_MAX_INTERVAL', 1800)),
+            hot_window=int(os.getenv('ADAPTIVE_HOT_WINDOW', 30))
+        )
+        self._last_schedule_refresh = 0
+        self._live_anchor_ids = set()
+        
+        # 推送事件配置
+        self.live_event_poll_interval = float(os.getenv('LIVE_EVENT_POLL_INTERVAL', 2))  # 处理推送事件的间隔（秒），0表示关闭
+        self.live_event_batch_size = int(os.getenv('LIVE_EVENT_BATCH_SIZE', 500))  # 每次处理的最大事件数
+        self.push_reconcile_interval = int(os.getenv('PUSH_RECONCILE_INTERVAL', 1800))  # 收到推送的主播改为低频轮询核对（秒）
+        self._pushed_at = {}  # 主播ID -> 最近一次收到推送事件的时间戳
         self.headers = {
             'User-Agent': self.user_agent,
             'Accept': 'application/json',
             'Content-Type': 'application/json'
         }
+        # 所有状态查询共用一个带连接池的会话
+        self.session = create_session(self.api_pool_size, self.headers)
     
     def start_monitoring(self):
         """开始监测"""
         logger.info('Starting live monitor service')
         self.is_running = True
+        self._run_id += 1
+        run_id = self._run_id
         
-        while self.is_running:
+        # 恢复上次运行（或上一个主节点）中断的录制
+        self.recover_recordings()
+        
+        while self.is_running and run_id == self._run_id:
             try:
-                self.check_all_anchors()
-                logger.info(f'Checked all anchors, sleeping for {self.check_interval} seconds')
-                time.sleep(self.check_interval)
+                self._sync_shard_recordings()
+                if self.adaptive_polling:
+                    sleep_seconds = self.check_due_anchors()
+                else:
+                    sweep_start = time.monotonic()
+                    self.check_all_anchors()
+                    # 扣除本轮检查耗时，保证按固定间隔发起检查
+                    sleep_seconds = max(0, self.check_interval - (time.monotonic() - sweep_start))
+                logger.info(f'Checked anchors, sleeping for {sleep_seconds:.0f} seconds')
+                self._wait(sleep_seconds, run_id)
             except Exception as e:
                 logger.error(f'Error in live monitor: {e}')
                 time.sleep(self.check_interval)
     
+    def recover_recordings(self):
+        """启动时恢复状态仍为recording或finalizing（停止后未完成收尾）的录制，分片模式下只处理分配给本节点的主播"""
+        try:
+            recordings = Recording.query.filter(Recording.status.in_(['recording', 'finalizing'])).all()
+            if self.sharding:
+                recordings = [r for r in recordings if shard_manager.owns(r.anchor.douyin_id)]
+            if not recordings:
+                return {}
+            
+            results = {}
+            for recording in recordings:
+                result = video_recorder.recover_recording(recording)
+                results[result] = results.get(result, 0) + 1
+            logger.info(f'Recovered {len(recordings)} interrupted recordings: {results}')
+            return results
+        except Exception as e:
+            logger.error(f'Error recovering recordings: {e}')
+            db.session.rollback()
+            return {}
+    
+    def _sync_shard_recordings(self):
+        """分片变化后交接录制：停止已分配给其他节点的主播的录制，接管分配给本节点但没有录制进程的录制
+        
+        还有录制在原节点上运行（原节点尚未感知分片变化）时不记录版本，下次检查时继续接管。
+        """
+        if not self.sharding or shard_manager.version == self._capture_shard_version:
+            return
+        version = shard_manager.version
+        self._stop_moved_recordings()
+        if self._take_over_recordings():
+            self._capture_shard_version = version
+    
+    def _stop_moved_recordings(self):
+        """停止本节点上已不再分配给本节点的主播的录制，由新的节点检测到仍在直播时重新开始录制"""
+        recording_ids = video_recorder.get_active_recording_ids()
+        if not recording_ids:
+            return 0
+        
+        try:
+            recordings = Recording.query.filter(
+                Recording.id.in_(recording_ids),
+                Recording.status == 'recording'
+            ).all()
+            moved = [recording for recording in recordings if not shard_manager.owns(recording.anchor.douyin_id)]
+            for recording in moved:
+                logger.info(f'Anchor {recording.anchor_id} moved to another node, stopping recording {recording.id}')
+                self.stop_recording(recording)
+            return len(moved)
+        except Exception as e:
+            logger.error(f'Error stopping recordings of moved anchors: {e}')
+            db.session.rollback()
+            return 0
+    
+    def _take_over_recordings(self):
+        """接管分配给本节点、但录制进程不在本节点的录制（原节点已下线或主播刚分配过来）
+        
+        按中断的录制恢复：能读取到原节点的状态快照时继续录制，否则用已写入的文件结束录制，
+        主播仍在直播时由下一次检查重新开始录制。原节点仍在录制时返回False，稍后再接管。
+        """
+        try:
+            local_ids = set(video_recorder.get_active_recording_ids())
+            recordings = [
+                recording for recording in Recording.query.filter_by(status='recording').all()
+                if recording.id not in local_ids and shard_manager.owns(recording.anchor.douyin_id)
+            ]
+            waiting = False
+            results = {}
+            for recording in recordings:
+                if video_recorder.get_recording_status(recording.id, detailed=True)['running']:
+                    # 原节点仍在写入状态快照，等其感知分片变化并停止录制
+                    waiting = True
+                    continue
+                result = video_recorder.recover_recording(recording)
+                results[result] = results.get(result, 0) + 1
+                if self.adaptive_polling and recording.anchor_id in self.schedule:
+                    # 尽快检查主播是否仍在直播
+                    self.schedule.schedule(recording.anchor_id, time.time())
+            if results:
+                logger.info(f'Took over {sum(results.values())} recordings of anchors assigned to this node: {results}')
+            return not waiting
+        except Exception as e:
+            logger.error(f'Error taking over recordings: {e}')
+            db.session.rollback()
+            return False
+    
+    def _wait(self, seconds, run_id):
+        """等待下一轮检查，期间及时处理推送的直播事件"""
+        deadline = time.monotonic() + seconds
+        while self.is_running and run_id == self._run_id:
+            # 分片变化后及时交接录制，不等到下一轮检查
+            self._sync_shard_recordings()
+            if self.live_event_poll_interval > 0:
+                self.process_live_events()
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self.sharding:
+                remaining = min(remaining, self.shard_sync_interval)
+            if self.live_event_poll_interval > 0:
+                remaining = min(remaining, self.live_event_poll_interval)
+            time.sleep(remaining)
+    
     def stop_monitoring(self):
         """停止监测"""
         logger.info('Stopping live monitor service')
@@ -53,18 +324,307 @@ class LiveMonitor:
         try:
             # 获取所有关注的主播
             anchors = Anchor.query.filter_by(is_followed=True).all()
-            logger.info(f'Checking {len(anchors)} anchors')
+            if self.sharding:
+                # 只检查分配给本节点的主播
+                total = len(anchors)
+                anchors = [anchor for anchor in anchors if shard_manager.owns(anchor.douyin_id)]
+                logger.info(f'Checking {len(anchors)} of {total} anchors assigned to node {shard_manager.node_id}')
+            else:
+                logger.info(f'Checking {len(anchors)} anchors')
+            
+            self._sweep_anchors(anchors)
+        except Exception as e:
+            logger.error(f'Error checking all anchors: {e}')
+    
+    def check_due_anchors(self):
+        """按自适应调度检查已到期的主播，返回距离下一次检查的秒数"""
+        now = time.time()
+        shard_changed = self.sharding and shard_manager.version != self._shard_version
+        if shard_changed or now - self._last_schedule_refresh >= self.schedule_refresh_interval:
+            self._refresh_schedule(now)
+        
+        due_ids = self.schedule.pop_due(now)
+        if due_ids:
+            anchors = []
+            # 分批查询，避免超出SQLite的参数数量限制
+            for i in range(0, len(due_ids), 500):
+                anchors.extend(Anchor.query.filter(
+                    Anchor.id.in_(due_ids[i:i + 500]),
+                    Anchor.is_followed == True
+                ).all())
+            logger.info(f'Checking {len(anchors)} due anchors ({len(self.schedule) + len(due_ids)} scheduled)')
             
+            self._sweep_anchors(anchors)
+            
+            now = time.time()
             for anchor in anchors:
+                if now - self._pushed_at.get(anchor.id, 0) < self.push_reconcile_interval:
+                    # 有推送事件的主播以推送为准，轮询只做低频核对
+                    self.schedule.schedule(anchor.id, now + self.push_reconcile_interval)
+                else:
+                    self.schedule.reschedule(anchor.id, now, anchor.id in self._live_anchor_ids)
+        
+        now = time.time()
+        next_refresh = self._last_schedule_refresh + self.schedule_refresh_interval
+        next_due = self.schedule.next_due()
+        if next_due is None:
+            next_due = next_refresh
+        return max(1, min(next_due, next_refresh) - now)
+    
+    def _refresh_schedule(self, now):
+        """刷新调度的主播列表，并根据历史录制重新学习开播时段"""
+        anchor_ids = [
+            row.id for row in db.session.query(Anchor.id, Anchor.douyin_id).filter(Anchor.is_followed == True)
+            if not self.sharding or shard_manager.owns(row.douyin_id)
+        ]
+        self._shard_version = shard_manager.version
+        
+        cutoff = datetime.now() - timedelta(days=self.history_days)
+        history = {}
+        for anchor_id, start_time in db.session.query(Recording.anchor_id, Recording.start_time).filter(
+            Recording.start_time >= cutoff
+        ):
+            history.setdefault(anchor_id, []).append(start_time)
+        
+        self._live_anchor_ids = {
+            row.anchor_id for row in db.session.query(Recording.anchor_id).filter(Recording.status == 'recording')
+        }
+        
+        self.schedule.learn(history)
+        self.schedule.sync(anchor_ids, now)
+        self._last_schedule_refresh = now
+        logger.info(f'Polling schedule refreshed: {len(anchor_ids)} anchors, {len(history)} with go-live history')
+    
+    def _sweep_anchors(self, anchors):
+        """并发检查一批主播的直播状态
+        
+        直播状态查询（网络请求）在线程池中并发执行，数据库相关的开播/下播处理
+        仍在当前线程中按结果返回顺序依次执行。正在进行的录制在本轮开始时一次性
+        加载，开播/下播的变更在本轮结束时合并为一次事务提交。
+        """
+        sweep_start = time.monotonic()
+        latencies = {}
+        error_count = 0
+        started = []
+        stopped = []
+        
+        if anchors:
+            active_recordings = self._load_active_recordings()
+            chunks = self._chunk_anchors(anchors)
+            workers = min(self.max_concurrency, len(chunks))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='live-check') as executor:
+                futures = {
+                    executor.submit(self._timed_check_live_statuses, [anchor.douyin_id for anchor in chunk]): chunk
+                    for chunk in chunks
+                }
+                
+                for future in as_completed(futures):
+                    chunk = futures[future]
+                    try:
+                        statuses, latency = future.result()
+                    except Exception as e:
+                        error_count += len(chunk)
+                        logger.error(f'Error checking {len(chunk)} anchors: {e}')
+                        continue
+                    
+                    for anchor in chunk:
+                        try:
+                            is_live, live_info = statuses[anchor.douyin_id]
+                            latencies[anchor.douyin_id] = latency
+                            self._handle_live_status(anchor, is_live, live_info, active_recordings, started, stopped)
+                        except Exception as e:
+                            error_count += 1
+                            logger.error(f'Error checking anchor {anchor.name}: {e}')
+            
+            self._commit_transitions(started, stopped)
+        
+        self.anchor_latencies = latencies
+        self.last_sweep_stats = self._build_sweep_stats(
+            len(anchors), time.monotonic() - sweep_start, list(latencies.values()), error_count
+        )
+        self._log_sweep_stats(self.last_sweep_stats)
+        return self.last_sweep_stats
+    
+    def _load_pending_events(self):
+        """按接收顺序读取一批待处理的事件，分片模式下只读取分配给本节点的主播的事件
+        
+        其他节点积压的事件不占用本节点的批次。
+        """
+        query = LiveEvent.query.filter_by(status='pending')
+        if not self.sharding:
+            return query.order_by(LiveEvent.id).limit(self.live_event_batch_size).all()
+        
+        douyin_ids = [
+            douyin_id for (douyin_id,) in db.session.query(LiveEvent.douyin_id).filter_by(status='pending').distinct()
+            if shard_manager.owns(douyin_id)
+        ]
+        events = []
+        # 分批查询，避免超出SQLite的参数数量限制
+        for i in range(0, len(douyin_ids), 500):
+            events.extend(query.filter(LiveEvent.douyin_id.in_(douyin_ids[i:i + 500])).order_by(
+                LiveEvent.id
+            ).limit(self.live_event_batch_size).all())
+        events.sort(key=lambda event: event.id)
+        return events[:self.live_event_batch_size]
+    
+    def process_live_events(self):
+        """处理上游推送的开播/下播事件，返回处理的事件数
+        
+        事件与轮询结果走相同的开播/下播逻辑。同一主播在一批事件中只按最新的事件处理，
+        开始录制前检查是否已有正在进行的录制，因此重复推送不会产生重复录制。
+        """
+        try:
+            events = self._load_pending_events()
+            if not events:
+                return 0
+            
+            douyin_ids = {event.douyin_id for event in events}
+            anchors = {
+                anchor.douyin_id: anchor
+                for anchor in Anchor.query.filter(Anchor.douyin_id.in_(douyin_ids)).all()
+            }
+            
+            # 同一主播只保留最新的事件
+            processed_at = datetime.now()
+            latest_events = {}
+            for event in events:
+                anchor = anchors.get(event.douyin_id)
+                if anchor is None or not anchor.is_followed:
+                    event.status = 'ignored'
+                    event.processed_at = processed_at
+                    continue
+                previous = latest_events.get(event.douyin_id)
+                if previous is not None:
+                    previous.status = 'ignored'
+                    previous.processed_at = processed_at
+                latest_events[event.douyin_id] = event
+            
+            active_recordings = self._load_active_recordings()
+            started = []
+            stopped = []
+            now = time.time()
+            for douyin_id, event in latest_events.items():
+                anchor = anchors[douyin_id]
                 try:
-                    self.check_anchor(anchor)
-                    # 避免请求过快，添加短暂延迟
-                    time.sleep(1)
+                    is_live = event.event_type == 'live_start'
+                    live_info = json.loads(event.live_info) if event.live_info else {}
+                    logger.info(f'Received {event.event_type} event for anchor {anchor.name}')
+                    self._handle_live_status(anchor, is_live, live_info, active_recordings, started, stopped)
+                    event.status = 'processed'
                 except Exception as e:
-                    logger.error(f'Error checking anchor {anchor.name}: {e}')
-                    time.sleep(1)
+                    logger.error(f'Error processing live event {event.id}: {e}')
+                    event.status = 'failed'
+                event.processed_at = processed_at
+                
+                self._pushed_at[anchor.id] = now
+                if self.adaptive_polling and anchor.id in self.schedule:
+                    self.schedule.schedule(anchor.id, now + self.push_reconcile_interval)
+            
+            self._commit_transitions(started, stopped)
+            # 没有开播/下播变更时单独提交事件状态
+            db.session.commit()
+            logger.info(f'Processed {len(events)} live events')
+            return len(events)
         except Exception as e:
-            logger.error(f'Error checking all anchors: {e}')
+            logger.error(f'Error processing live events: {e}')
+            db.session.rollback()
+            return 0
+    
+    def cleanup_live_events(self, days=7):
+        """清理已处理的旧事件"""
+        try:
+            cutoff_date = datetime.now() - timedelta(days=days)
+            deleted = LiveEvent.query.filter(
+                LiveEvent.status != 'pending',
+                LiveEvent.received_at < cutoff_date
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            logger.info(f'Cleaned up {deleted} old live events')
+            return deleted
+        except Exception as e:
+            logger.error(f'Error cleaning up live events: {e}')
+            db.session.rollback()
+            return 0
+    
+    def _load_active_recordings(self):
+        """一次查询加载所有正在进行的录制，返回 {anchor_id: recording}"""
+        # 不需要关联的主播和摘要，关闭预加载避免多表连接
+        recordings = Recording.query.options(
+            lazyload(Recording.anchor),
+            lazyload(Recording.summary)
+        ).filter_by(status='recording').all()
+        return {recording.anchor_id: recording for recording in recordings}
+    
+    def _commit_transitions(self, started, stopped):
+        """合并提交本轮的开播/下播变更"""
+        if not started and not stopped:
+            return
+        
+        # 提交后不使对象过期，后续处理读取录制字段时无需逐条重新查询
+        session = db.session()
+        expire_on_commit = session.expire_on_commit
+        session.expire_on_commit = False
+        try:
+            session.commit()
+        except Exception as e:
+            logger.error(f'Error committing {len(started)} started and {len(stopped)} stopped recordings: {e}')
+            session.rollback()
+            return
+        finally:
+            session.expire_on_commit = expire_on_commit
+        
+        for recording, live_info in started:
+            self._on_recording_started(recording, live_info)
+        for recording in stopped:
+            self._on_recording_stopped(recording)
+        # 处理完成后再使对象过期，下一轮读取数据库中的最新状态
+        session.expire_all()
+        logger.info(f'Committed {len(started)} started and {len(stopped)} stopped recordings')
+    
+    def _chunk_anchors(self, anchors):
+        """按查询方式分组：支持批量查询时每组最多api_batch_size个主播，否则每组一个"""
+        size = self.api_batch_size if self._use_batch_api() else 1
+        return [anchors[i:i + size] for i in range(0, len(anchors), size)]
+    
+    def _timed_check_live_statuses(self, douyin_ids):
+        """检查一组主播的直播状态并记录耗时"""
+        start = time.monotonic()
+        statuses = self._check_live_statuses(douyin_ids)
+        return statuses, time.monotonic() - start
+    
+    def _build_sweep_stats(self, anchor_count, duration, latencies, error_count):
+        """生成一轮检查的统计信息"""
+        latencies = sorted(latencies)
+        stats = {
+            'anchor_count': anchor_count,
+            'checked_count': len(latencies),
+            'error_count': error_count,
+            'concurrency': self.max_concurrency,
+            'duration': round(duration, 3),
+            'latency_avg': None,
+            'latency_p95': None,
+            'latency_max': None,
+            'finished_at': datetime.now().isoformat()
+        }
+        if latencies:
+            p95_index = min(len(latencies) - 1, int(len(latencies) * 0.95))
+            stats['latency_avg'] = round(sum(latencies) / len(latencies), 3)
+            stats['latency_p95'] = round(latencies[p95_index], 3)
+            stats['latency_max'] = round(latencies[-1], 3)
+        return stats
+    
+    def _log_sweep_stats(self, stats):
+        """输出一轮检查的统计信息"""
+        logger.info(
+            f"Sweep finished: {stats['checked_count']}/{stats['anchor_count']} anchors in {stats['duration']:.2f}s "
+            f"(concurrency: {stats['concurrency']}, errors: {stats['error_count']}, "
+            f"latency avg/p95/max: {stats['latency_avg']}/{stats['latency_p95']}/{stats['latency_max']}s)"
+        )
+        if stats['duration'] > self.check_interval:
+            logger.warning(
+                f"Sweep took {stats['duration']:.2f}s, longer than check interval {self.check_interval}s; "
+                f'consider raising MONITOR_CONCURRENCY'
+            )
     
     def check_anchor(self, anchor):
         """检查单个主播是否开播"""
@@ -73,46 +633,74 @@ class LiveMonitor:
         try:
             # 检查直播状态
             is_live, live_info = self._check_live_status(anchor.douyin_id)
-            
-            if is_live:
-                logger.info(f'Anchor {anchor.name} is live!')
-                # 检查是否已经有正在进行的录制
-                existing_recording = Recording.query.filter_by(
-                    anchor_id=anchor.id,
-                    status='recording'
-                ).first()
-                
-                if not existing_recording:
-                    # 开始新的录制
-                    self.start_recording(anchor, live_info)
-                else:
-                    logger.info(f'Anchor {anchor.name} is already being recorded')
-            else:
-                logger.info(f'Anchor {anchor.name} is not live')
-                # 检查是否有正在进行的录制需要停止
-                existing_recording = Recording.query.filter_by(
-                    anchor_id=anchor.id,
-                    status='recording'
-                ).first()
-                
-                if existing_recording:
-                    # 停止录制
-                    self.stop_recording(existing_recording)
+            self._handle_live_status(anchor, is_live, live_info)
         except Exception as e:
             logger.error(f'Error checking anchor {anchor.name}: {e}')
     
-    def start_recording(self, anchor, live_info=None):
+    def _handle_live_status(self, anchor, is_live, live_info, active_recordings=None, started=None, stopped=None):
+        """根据直播状态开始或停止录制
+        
+        传入active_recordings时使用内存中的录制索引，变更只加入会话，由调用方
+        通过_commit_transitions统一提交；否则单独查询并立即提交。
+        """
+        batched = active_recordings is not None
+        if batched:
+            existing_recording = active_recordings.get(anchor.id)
+        else:
+            # 检查是否已经有正在进行的录制
+            existing_recording = Recording.query.filter_by(
+                anchor_id=anchor.id,
+                status='recording'
+            ).first()
+        
+        if is_live:
+            logger.info(f'Anchor {anchor.name} is live!')
+            self._live_anchor_ids.add(anchor.id)
+            
+            if not existing_recording:
+                # 开始新的录制（存储空间不足时返回None，下次检查再重试）
+                recording = self.start_recording(anchor, live_info, commit=not batched)
+                if recording and batched:
+                    active_recordings[anchor.id] = recording
+                    started.append((recording, live_info))
+            else:
+                logger.info(f'Anchor {anchor.name} is already being recorded')
+        else:
+            logger.info(f'Anchor {anchor.name} is not live')
+            self._live_anchor_ids.discard(anchor.id)
+            
+            # 检查是否有正在进行的录制需要停止
+            if existing_recording:
+                # 停止录制
+                self.stop_recording(existing_recording, commit=not batched)
+                if batched:
+                    del active_recordings[anchor.id]
+                    stopped.append(existing_recording)
+    
+    def start_recording(self, anchor, live_info=None, commit=True):
         """开始录制直播"""
         logger.info(f'Starting recording for anchor {anchor.name}')
         
+        if not video_recorder.accepting:
+            # 已交出录制（失去主节点身份），进行中的检查不再创建录制
+            logger.warning(f'Recorder is not accepting recordings, skipping anchor {anchor.name}')
+            return None
+        
         # 创建录制目录
         video_storage_path = os.getenv('VIDEO_STORAGE_PATH', './data/temp_videos')
         anchor_dir = os.path.join(video_storage_path, str(anchor.id))
         os.makedirs(anchor_dir, exist_ok=True)
         
-        # 生成视频文件名
+        # 剩余空间不足时降级为只录音频，严重不足时放弃本次录制
+        capture_mode = storage_manager.admit_capture(anchor.capture_mode)
+        if capture_mode is False:
+            logger.error(f'Not enough storage to record anchor {anchor.name}')
+            return None
+        
+        # 生成视频文件名，扩展名由录制模式决定（只录音频时为音频文件）
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        video_filename = f'{anchor.id}_{timestamp}.mp4'
+        extension = video_recorder.output_extension(capture_mode)
+        video_filename = f'{anchor.id}_{timestamp}{extension}'
         video_path = os.path.join(anchor_dir, video_filename)
         
         # 创建录制记录
@@ -124,30 +712,58 @@ class LiveMonitor:
         )
         
         db.session.add(recording)
-        db.session.commit()
-        
-        # 启动录制进程
-        # 这里需要实现实际的录制逻辑
-        # 由于抖音API的限制，这里提供一个模拟实现
-        # 实际项目中需要使用FFmpeg或其他工具来录制直播
+        if commit:
+            db.session.commit()
+            self._on_recording_started(recording, live_info)
+        return recording
+    
+    def _on_recording_started(self, recording, live_info=None):
+        """录制记录提交后启动录制进程"""
+        storage_manager.track(recording.id, recording.anchor_id)
+        stream_url = (live_info or {}).get('stream_url')
+        if stream_url:
+            # 由录制服务控制并发数量，超出上限时排队
+            if not video_recorder.start_recording(recording.id, stream_url, recording.video_path):
+                self._fail_recording(recording)
+                return
+        else:
+            logger.warning(f'No stream URL for recording {recording.id}, skipping video capture')
         
-        logger.info(f'Recording started for anchor {anchor.name}, recording ID: {recording.id}')
+        logger.info(f'Recording started for anchor {recording.anchor_id}, recording ID: {recording.id}')
+    
+    def _fail_recording(self, recording):
+        """录制进程没有启动（启动失败或已交出录制）时把录制标记为失败，主播仍在直播时下一次检查重新开始录制"""
+        logger.error(f'Failed to start capture for recording {recording.id}, marking it as failed')
+        try:
+            recording.status = 'failed'
+            recording.end_time = datetime.now()
+            db.session.commit()
+        except Exception as e:
+            logger.error(f'Error marking recording {recording.id} as failed: {e}')
+            db.session.rollback()
+        storage_manager.release(recording.id)
     
-    def stop_recording(self, recording):
+    def stop_recording(self, recording, commit=True):
         """停止录制直播"""
         logger.info(f'Stopping recording for recording ID: {recording.id}')
         
-        # 更新录制状态
+        # 更新录制状态，录制进程在当前进程时由录制服务在后台收尾后改为completed
         recording.end_time = datetime.now()
-        recording.status = 'completed'
+        recording.status = 'finalizing' if video_recorder.has_recording(recording.id) else 'completed'
         
-        # 计算视频时长
-        # 这里需要实现实际的视频时长计算
-        # 实际项目中可以使用FFprobe来获取视频时长
-        recording.video_duration = 3600  # 模拟1小时
-        
-        db.session.commit()
+        # 先按直播时长估算，录制服务停止进程后按实际录制的文件更新
+        recording.video_duration = int((recording.end_time - recording.start_time).total_seconds())
         
+        if commit:
+            db.session.commit()
+            self._on_recording_stopped(recording)
+        return recording
+    
+    def _on_recording_stopped(self, recording):
+        """录制状态提交后停止录制进程"""
+        if not video_recorder.stop_recording(recording.id) and recording.status == 'finalizing':
+            # 录制进程在提交前已自行结束并收尾，重新按已写入的文件完成录制
+            video_recorder.process_recording(recording.id)
         logger.info(f'Recording stopped for recording ID: {recording.id}')
     
     def _check_live_status(self, douyin_id):
@@ -157,6 +773,55 @@ class LiveMonitor:
         else:
             return self._mock_check_live_status(douyin_id)
     
+    def _check_live_statuses(self, douyin_ids):
+        """检查多个主播的直播状态，返回 {douyin_id: (is_live, live_info)}"""
+        if len(douyin_ids) > 1 and self._use_batch_api():
+            statuses = self._real_check_live_status_batch(douyin_ids)
+        else:
+            statuses = {}
+        
+        # 批量接口未返回的主播逐个查询
+        for douyin_id in douyin_ids:
+            if douyin_id not in statuses:
+                statuses[douyin_id] = self._check_live_status(douyin_id)
+        return statuses
+    
+    def _use_batch_api(self):
+        """是否使用批量查询接口"""
+        return self.use_real_api and bool(self.batch_api_url)
+    
+    def _real_check_live_status_batch(self, douyin_ids):
+        """使用批量API一次查询多个主播的直播状态"""
+        for retry in range(self.api_retries):
+            try:
+                logger.info(f'Checking live status via batch API for {len(douyin_ids)} IDs, retry: {retry+1}')
+                response = self.session.post(
+                    self.batch_api_url,
+                    json={'douyin_ids': douyin_ids},
+                    timeout=self.api_timeout
+                )
+                
+                if response.status_code == 200:
+                    results = response.json().get('results', {})
+                    return {
+                        douyin_id: (result.get('is_live', False), result.get('live_info', {}))
+                        for douyin_id, result in results.items()
+                        if douyin_id in douyin_ids
+                    }
+                else:
+                    logger.warning(f'Batch API returned non-200 status: {response.status_code}')
+            except Exception as e:
+                logger.warning(f'Batch API request failed: {e}')
+            
+            if retry < self.api_retries - 1:
+                delay = backoff_delay(retry, self.api_backoff_base, self.api_backoff_max)
+                logger.info(f'Retrying in {delay:.1f} seconds...')
+                time.sleep(delay)
+        
+        # 批量查询失败时由调用方逐个查询
+        logger.warning('All batch API retries failed, falling back to single lookups')
+        return {}
+    
     def _real_check_live_status(self, douyin_id):
         """使用真实API检查直播状态"""
         # 这里需要实现真实的抖音API调用
@@ -167,13 +832,12 @@ class LiveMonitor:
                 # 构建API请求
                 # 注意：实际项目中需要使用正确的API端点和参数
                 # 这里只是一个示例框架
-                api_url = f'https://api.example.com/douyin/live/status'
                 params = {'douyin_id': douyin_id}
                 
-                response = requests.get(
-                    api_url,
+                # 复用连接池中的keep-alive连接
+                response = self.session.get(
+                    self.api_url,
                     params=params,
-                    headers=self.headers,
                     timeout=self.api_timeout
                 )
                 
@@ -188,8 +852,9 @@ class LiveMonitor:
                 logger.warning(f'API request failed: {e}')
             
             if retry < self.api_retries - 1:
-                logger.info(f'Retrying in 2 seconds...')
-                time.sleep(2)
+                delay = backoff_delay(retry, self.api_backoff_base, self.api_backoff_max)
+                logger.info(f'Retrying in {delay:.1f} seconds...')
+                time.sleep(delay)
         
         # 如果所有重试都失败，返回模拟结果
         logger.warning('All API retries failed, using mock result')
@@ -0,0 +1,93 @@
+import os
+import logging
+from app.models import db, Recording
+from app.services.video_recorder import video_recorder
+from app.services.content_analyzer import content_analyzer
+from app.services.transcription import SAMPLE_RATE
+from app.utils.audio import detect_speech
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class LiveTranscriber:
+    """录制中的增量转写服务
+
+    定期读取正在写入的录制文件（MPEG-TS或分片MP4在写入过程中即可读取），转写上次位置
+    之后新录制的音频，追加到录制的实时转写文本。窗口末尾如果正在说话，只转写到这段
+    话之前，剩余部分留到下一轮，避免把一句话切成两半。录制结束后分析只需转写剩余部分。
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('LIVE_TRANSCRIBE', 'False').lower() == 'true'  # 是否在录制过程中增量转写
+        self.interval = int(os.getenv('LIVE_TRANSCRIBE_INTERVAL', 120))  # 增量转写的检查间隔（秒）
+        self.min_window = float(os.getenv('LIVE_TRANSCRIBE_MIN_WINDOW', 60))  # 新录制的音频达到该时长（秒）才转写
+        self.safety_margin = float(os.getenv('LIVE_TRANSCRIBE_MARGIN', 5))  # 不读取文件末尾正在写入的秒数
+
+    def run_once(self):
+        """对当前进程正在录制的所有录制执行一轮增量转写"""
+        if video_recorder.container == 'mp4':
+            logger.warning('Live transcription requires RECORDING_CONTAINER=ts or fmp4')
+            return 0
+
+        transcribed = 0
+        for recording_id in video_recorder.get_active_recording_ids():
+            try:
+                transcribed += self.transcribe_recording(recording_id)
+            except Exception as e:
+                logger.error(f'Error transcribing live recording {recording_id}: {e}')
+                db.session.rollback()
+        return transcribed
+
+    def transcribe_recording(self, recording_id):
+        """转写录制上次位置之后的新音频，返回本次转写的秒数"""
+        parts = video_recorder.get_capture_parts(recording_id)
+        if not parts:
+            return 0
+
+        recording = Recording.query.filter_by(id=recording_id).first()
+        if not recording or recording.status != 'recording':
+            return 0
+
+        position = recording.live_transcribed_seconds or 0
+        texts = []
+        for index, (path, offset, seconds) in enumerate(parts):
+            is_current = index == len(parts) - 1
+            end = offset + seconds - (self.safety_margin if is_current else 0)
+            start = max(position, offset)
+            if end - start <= 0 or (is_current and end - start < self.min_window):
+                continue
+
+            audio = content_analyzer.extract_audio(path, start - offset, end - start)
+            if audio is None:
+                break
+
+            cut = len(audio)
+            if is_current:
+                # 末尾的话还没说完时留到下一轮
+                regions = detect_speech(audio, SAMPLE_RATE, threshold_db=content_analyzer.transcriber.vad_threshold_db)
+                if regions and regions[-1][1] >= len(audio) and regions[-1][0] > 0:
+                    cut = regions[-1][0]
+
+            result = content_analyzer.transcriber.transcribe(audio[:cut], language='zh')
+            if result is None:
+                # 模型不可用，下一轮再试
+                break
+            texts.append(result['text'])
+            position = start + cut / SAMPLE_RATE
+
+        if position == (recording.live_transcribed_seconds or 0):
+            return 0
+
+        transcribed = position - (recording.live_transcribed_seconds or 0)
+        recording.live_transcript = (recording.live_transcript or '') + ''.join(texts)
+        recording.live_transcribed_seconds = position
+        db.session.commit()
+        logger.info(f'Live transcribed recording {recording_id} up to {position:.0f}s')
+        return transcribed
+
+# 创建增量转写服务实例
+live_transcriber = LiveTranscriber()
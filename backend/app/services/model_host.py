@@ -0,0 +1,116 @@
+import os
+import logging
+import traceback
+from multiprocessing.connection import Listener, Client
+from threading import Thread
+from app.services.asr import create_backend
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+def parse_address(address):
+    """解析模型服务地址：host:port 使用TCP，其他视为Unix socket路径"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and not address.startswith('/'):
+        return (host or '127.0.0.1', int(port))
+    return address
+
+def resolve_authkey(address, authkey=None):
+    """读取连接认证密钥（没有默认值）
+    
+    连接上传输的是pickle数据，能连接的一方即可在对方进程中执行代码：TCP地址必须配置密钥，
+    未配置密钥时只允许Unix socket（文件权限限制为当前用户）。
+    """
+    authkey = authkey or os.getenv('WHISPER_MODEL_HOST_AUTHKEY', '')
+    if not authkey:
+        if not isinstance(address, str):
+            raise ValueError('WHISPER_MODEL_HOST_AUTHKEY must be set to use a TCP model host address')
+        return None
+    return authkey.encode('utf-8')
+
+class ModelHostServer:
+    """Whisper模型服务
+
+    在单独的进程中加载一份模型（引擎由ASR_ENGINE选择），通过本地socket为同一节点上的其他进程提供转写，
+    各进程不再各自加载模型。模型不支持并发调用，请求按到达顺序依次转写。
+    """
+
+    def __init__(self, address=None, authkey=None):
+        self.address = parse_address(address or os.getenv('WHISPER_MODEL_HOST', '/tmp/live-record-whisper.sock'))
+        self.authkey = resolve_authkey(self.address, authkey)
+        self.model = create_backend()
+
+    def serve_forever(self):
+        """加载模型并处理转写请求"""
+        if self.model.load() is None:
+            raise RuntimeError('Whisper model not loaded')
+
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            # 清理上次运行遗留的socket文件
+            os.remove(self.address)
+
+        if isinstance(self.address, str):
+            # socket文件只允许当前用户连接
+            umask = os.umask(0o177)
+            try:
+                listener = Listener(self.address, authkey=self.authkey)
+            finally:
+                os.umask(umask)
+            os.chmod(self.address, 0o600)
+        else:
+            listener = Listener(self.address, authkey=self.authkey)
+        
+        with listener:
+            logger.info(f'Whisper model host listening on {self.address}')
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.error(f'Error accepting model host connection: {e}')
+                    continue
+                Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        """处理一个连接上的转写请求，请求格式 {'audio': 路径或数组, 'options': {...}}"""
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                try:
+                    result = self.model.transcribe(request['audio'], **request.get('options', {}))
+                    response = {'result': result}
+                except Exception as e:
+                    logger.error(f'Error transcribing on model host: {traceback.format_exc()}')
+                    response = {'error': str(e)}
+
+                try:
+                    conn.send(response)
+                except (EOFError, OSError):
+                    return
+
+class ModelHostClient:
+    """Whisper模型服务的客户端"""
+
+    def __init__(self, address, authkey=None):
+        self.address = parse_address(address)
+        self.authkey = resolve_authkey(self.address, authkey)
+
+    def transcribe(self, audio, **options):
+        """请求模型服务转写，服务不可用时抛出OSError或EOFError"""
+        with Client(self.address, authkey=self.authkey) as conn:
+            conn.send({'audio': audio, 'options': options})
+            response = conn.recv()
+        if 'error' in response:
+            raise RuntimeError(f'Model host error: {response["error"]}')
+        return response['result']
+
+if __name__ == '__main__':
+    logging.basicConfig(level=getattr(logging, os.getenv('LOG_LEVEL', 'INFO')))
+    ModelHostServer().serve_forever()
@@ -23,6 +23,7 @@ class NotificationService:
         
         # 发送时间配置
         self.summary_send_time = os.getenv('SUMMARY_SEND_TIME', '08:00')
+        self.notify_on_summary = os.getenv('SUMMARY_NOTIFY_IMMEDIATELY', 'True').lower() == 'true'  # 每个摘要生成后立即发送通知
     
     def send_summary(self, summary_id):
         """发送摘要通知"""
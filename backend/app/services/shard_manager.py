@@ -0,0 +1,144 @@
+import os
+import bisect
+import hashlib
+import socket
+import time
+import logging
+from threading import Thread, Event
+from app.models import db, MonitorNode
+from app.services.leader_election import default_node_id
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+class HashRing:
+    """一致性哈希环
+    
+    每个节点在环上放置多个虚拟节点，节点加入或离开时只有落在其相邻区间的
+    主播会迁移，其余主播的归属保持不变。
+    """
+    
+    def __init__(self, nodes=(), replicas=100):
+        self.replicas = replicas
+        ring = sorted(
+            (self._hash(f'{node}#{i}'), node)
+            for node in nodes
+            for i in range(replicas)
+        )
+        self._keys = [key for key, _ in ring]
+        self._owners = [node for _, node in ring]
+    
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+    
+    def get_node(self, key):
+        """获取key所属的节点，环为空时返回None"""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._owners[index]
+
+class ShardManager:
+    """监测节点分片服务
+    
+    各监测节点在数据库中注册并定期心跳，根据存活节点构建一致性哈希环，
+    按抖音ID把关注的主播分配到各节点。
+    """
+    
+    def __init__(self):
+        self.node_id = default_node_id()
+        self.hostname = socket.gethostname()
+        self.heartbeat_interval = float(os.getenv('SHARD_HEARTBEAT_INTERVAL', 10))  # 心跳间隔（秒）
+        self.node_ttl = int(os.getenv('SHARD_NODE_TTL', 30))  # 超过该时间没有心跳的节点视为离线（秒）
+        self.virtual_nodes = int(os.getenv('SHARD_VIRTUAL_NODES', 100))  # 每个节点的虚拟节点数
+        self.nodes = []
+        self.ring = HashRing()
+        self.version = 0  # 节点成员变化时递增
+        self.is_running = False
+        self._stop_event = Event()
+        self._thread = None
+    
+    def start(self):
+        """注册节点并启动心跳线程"""
+        logger.info(f'Starting shard manager as node {self.node_id}')
+        self.is_running = True
+        self._stop_event.clear()
+        try:
+            self.heartbeat()
+        except Exception as e:
+            logger.error(f'Error registering monitor node: {e}')
+            db.session.rollback()
+        
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """注销节点，其负责的主播由其他节点接管"""
+        logger.info(f'Stopping shard manager for node {self.node_id}')
+        self.is_running = False
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=10)
+        
+        try:
+            MonitorNode.query.filter_by(node_id=self.node_id).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f'Error unregistering monitor node: {e}')
+            db.session.rollback()
+    
+    def _run(self):
+        """心跳循环"""
+        while self.is_running:
+            self._stop_event.wait(self.heartbeat_interval)
+            if not self.is_running:
+                break
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f'Error in monitor node heartbeat: {e}')
+                db.session.rollback()
+    
+    def heartbeat(self):
+        """更新本节点心跳，并根据存活节点重建哈希环"""
+        now = time.time()
+        node = db.session.get(MonitorNode, self.node_id)
+        if node is None:
+            db.session.add(MonitorNode(
+                node_id=self.node_id,
+                hostname=self.hostname,
+                started_at=now,
+                heartbeat_at=now
+            ))
+        else:
+            node.heartbeat_at = now
+        
+        # 清理长时间失联的节点记录
+        MonitorNode.query.filter(
+            MonitorNode.heartbeat_at < now - 10 * self.node_ttl
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        
+        nodes = sorted(
+            row.node_id for row in db.session.query(MonitorNode.node_id).filter(
+                MonitorNode.heartbeat_at >= now - self.node_ttl
+            )
+        )
+        if nodes != self.nodes:
+            self.nodes = nodes
+            self.ring = HashRing(nodes, self.virtual_nodes)
+            self.version += 1
+            logger.info(f'Monitor nodes changed, {len(nodes)} active: {", ".join(nodes)}')
+    
+    def owns(self, douyin_id):
+        """主播是否由本节点负责"""
+        owner = self.ring.get_node(douyin_id)
+        return owner is None or owner == self.node_id
+
+# 创建分片服务实例
+shard_manager = ShardManager()
@@ -0,0 +1,182 @@
+import os
+import shutil
+import logging
+from threading import RLock
+from app.models import db, Anchor, Recording, RecordingSegment, Summary
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+
+class StorageManager:
+    """录制存储空间管理服务
+
+    按录制和主播增量统计录制文件占用的字节数：录制中的文件由录制服务按进度
+    上报，录制结束、分析或清理后重新统计对应录制的文件。占用超过高水位时
+    按策略选出已分析的录制供清理，剩余空间过低时降级或拒绝新的录制。
+    """
+
+    def __init__(self):
+        self.storage_path = os.getenv('VIDEO_STORAGE_PATH', './data/temp_videos')
+        self.quota_bytes = int(float(os.getenv('STORAGE_QUOTA_GB', 0)) * GB)  # 录制文件的空间配额，0表示使用整个磁盘
+        self.high_watermark = float(os.getenv('STORAGE_HIGH_WATERMARK', 0.9))  # 占用超过该比例时开始清理
+        self.low_watermark = float(os.getenv('STORAGE_LOW_WATERMARK', 0.8))  # 清理到该比例以下为止
+        self.eviction_policy = os.getenv('STORAGE_EVICTION_POLICY', 'lru').lower()  # 清理顺序：lru最早结束的优先，priority未关注主播优先
+        self.audio_only_free_bytes = int(float(os.getenv('STORAGE_AUDIO_ONLY_FREE_GB', 10)) * GB)  # 剩余空间低于该值时新录制只录音频
+        self.reserved_free_bytes = int(float(os.getenv('STORAGE_RESERVED_FREE_GB', 2)) * GB)  # 剩余空间低于该值时拒绝新录制
+        self.check_interval = int(os.getenv('STORAGE_CHECK_INTERVAL', 60))  # 检查存储占用的间隔（秒）
+        self.recording_bytes = {}  # 录制ID -> 占用字节数
+        self.recording_anchors = {}  # 录制ID -> 主播ID
+        self.anchor_bytes = {}  # 主播ID -> 占用字节数
+        self.total_bytes = 0
+        self._lock = RLock()
+
+    def track(self, recording_id, anchor_id, size=0):
+        """开始统计一个录制的文件占用"""
+        with self._lock:
+            self.recording_anchors[recording_id] = anchor_id
+            self.update(recording_id, size)
+
+    def update(self, recording_id, size):
+        """更新录制的文件占用，按差值调整主播和总占用"""
+        with self._lock:
+            delta = size - self.recording_bytes.get(recording_id, 0)
+            if not delta and recording_id in self.recording_bytes:
+                return
+            self.recording_bytes[recording_id] = size
+            anchor_id = self.recording_anchors.get(recording_id)
+            self.anchor_bytes[anchor_id] = self.anchor_bytes.get(anchor_id, 0) + delta
+            self.total_bytes += delta
+
+    def release(self, recording_id):
+        """录制文件已全部删除，停止统计"""
+        with self._lock:
+            size = self.recording_bytes.pop(recording_id, 0)
+            anchor_id = self.recording_anchors.pop(recording_id, None)
+            if anchor_id in self.anchor_bytes:
+                self.anchor_bytes[anchor_id] -= size
+                if self.anchor_bytes[anchor_id] <= 0:
+                    del self.anchor_bytes[anchor_id]
+            self.total_bytes -= size
+
+    def refresh(self, recording):
+        """重新统计录制当前在磁盘上的文件（录制结束、分析或清理后调用）"""
+        size = self.measure(recording)
+        if size:
+            self.track(recording.id, recording.anchor_id, size)
+        else:
+            self.release(recording.id)
+        return size
+
+    def measure(self, recording):
+        """统计录制文件和分段文件的实际大小"""
+        paths = [recording.video_path]
+        paths.extend(path for (path,) in db.session.query(RecordingSegment.path).filter(
+            RecordingSegment.recording_id == recording.id,
+            RecordingSegment.path != None
+        ))
+        return sum(self.file_size(path) for path in paths)
+
+    @staticmethod
+    def file_size(path):
+        """文件大小（字节），路径为空或文件不存在时返回0"""
+        try:
+            return os.path.getsize(path) if path else 0
+        except OSError:
+            return 0
+
+    def load(self):
+        """启动时统计所有仍保留文件的录制"""
+        try:
+            recordings = Recording.query.filter(Recording.video_path != None).all()
+            for recording in recordings:
+                self.refresh(recording)
+            logger.info(
+                f'Storage usage loaded: {len(self.recording_bytes)} recordings, '
+                f'{self.total_bytes / GB:.2f} GB'
+            )
+        except Exception as e:
+            logger.error(f'Error loading storage usage: {e}')
+            db.session.rollback()
+
+    def _disk_usage(self):
+        os.makedirs(self.storage_path, exist_ok=True)
+        return shutil.disk_usage(self.storage_path)
+
+    def get_free_bytes(self):
+        """可用于录制的剩余空间：磁盘剩余空间和配额剩余空间中较小的一个"""
+        free = self._disk_usage().free
+        if self.quota_bytes:
+            free = min(free, self.quota_bytes - self.total_bytes)
+        return max(0, free)
+
+    def get_usage(self):
+        """获取存储占用情况"""
+        disk = self._disk_usage()
+        with self._lock:
+            total_bytes = self.total_bytes
+            anchor_bytes = dict(self.anchor_bytes)
+        capacity = self.quota_bytes or disk.total
+        used = total_bytes if self.quota_bytes else disk.used
+        return {
+            'total_bytes': total_bytes,
+            'anchor_bytes': anchor_bytes,
+            'recording_count': len(self.recording_bytes),
+            'quota_bytes': self.quota_bytes,
+            'disk_total_bytes': disk.total,
+            'disk_free_bytes': disk.free,
+            'usage_ratio': round(used / capacity, 4) if capacity else 0
+        }
+
+    def bytes_to_free(self):
+        """超过高水位时返回需要清理的字节数（清理到低水位），否则返回0"""
+        if self.quota_bytes:
+            capacity, used = self.quota_bytes, self.total_bytes
+        else:
+            disk = self._disk_usage()
+            capacity, used = disk.total, disk.used
+
+        if used <= capacity * self.high_watermark:
+            return 0
+        return int(used - capacity * self.low_watermark)
+
+    def get_eviction_candidates(self, limit=100):
+        """按清理策略返回可清理的录制：已完成分析且仍保留文件，返回 [(录制ID, 字节数)]"""
+        query = db.session.query(Recording.id).join(
+            Summary, Summary.recording_id == Recording.id
+        ).filter(
+            Recording.status == 'completed',
+            Recording.video_path != None
+        )
+        if self.eviction_policy == 'priority':
+            # 先清理未关注主播的录制，再按结束时间从早到晚
+            query = query.join(Anchor, Anchor.id == Recording.anchor_id).order_by(
+                Anchor.is_followed.asc(), Recording.end_time.asc()
+            )
+        else:
+            query = query.order_by(Recording.end_time.asc())
+
+        with self._lock:
+            return [
+                (recording_id, self.recording_bytes.get(recording_id, 0))
+                for (recording_id,) in query.limit(limit)
+            ]
+
+    def admit_capture(self, capture_mode=None):
+        """根据剩余空间决定新录制的模式：空间充足返回原模式，偏低返回audio，严重不足返回False"""
+        free = self.get_free_bytes()
+        if free < self.reserved_free_bytes:
+            logger.error(f'Free storage critically low ({free / GB:.2f} GB), refusing new capture')
+            return False
+        if free < self.audio_only_free_bytes and capture_mode != 'audio':
+            logger.warning(f'Free storage low ({free / GB:.2f} GB), downgrading new capture to audio-only')
+            return 'audio'
+        return capture_mode
+
+# 创建存储管理服务实例
+storage_manager = StorageManager()
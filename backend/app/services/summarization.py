@@ -0,0 +1,105 @@
+import os
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from app.utils.text import split_sentences, text_rank
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 摘要切分句子使用的分隔符（中英文句末标点和换行）
+SENTENCE_DELIMITERS = '。！？!?；;\n'
+
+def _summarize_chunk(sentences, count):
+    """在工作进程中对一个分块执行TextRank"""
+    return text_rank(sentences, count)
+
+class HierarchicalSummarizer:
+    """分层抽取式摘要
+
+    TextRank的计算量与句子数的平方成正比，长时间直播的转写文本直接计算会非常慢。
+    这里先按原文顺序把句子切成不超过chunk_sentences句的分块，各分块（可在进程池中
+    并行）按比例选出重要句子，再对选出的句子逐层重复，直到句子数不超过分块上限，
+    最后一次选出摘要。每次调用的句子数有上限，总计算量与文本长度大致成正比。
+    """
+
+    def __init__(self):
+        self.ratio = float(os.getenv('SUMMARY_RATIO', 0.2))  # 每层保留的句子比例
+        self.max_sentences = int(os.getenv('SUMMARY_MAX_SENTENCES', 20))  # 最终摘要的最大句子数
+        self.chunk_sentences = max(2, int(os.getenv('SUMMARY_CHUNK_SENTENCES', 200)))  # 每次TextRank计算的最大句子数，至少2句才能逐层减少
+        self.workers = int(os.getenv('SUMMARY_WORKERS', 1))  # 并行计算分块摘要的进程数；1表示在当前进程计算
+        self._pool = None
+        self._pool_lock = Lock()
+
+    def summarize(self, text):
+        """生成文本的抽取式摘要"""
+        started = time.time()
+        # 句子保留原文的句末标点，摘要不改写原文的问句、感叹句和英文标点
+        sentences = split_sentences(text, SENTENCE_DELIMITERS, keep_delimiters=True)
+        if not sentences:
+            return ''
+
+        count = min(self.max_sentences, max(1, round(len(sentences) * self.ratio)))
+        levels = 0
+        while len(sentences) > self.chunk_sentences:
+            chunks = [
+                sentences[i:i + self.chunk_sentences]
+                for i in range(0, len(sentences), self.chunk_sentences)
+            ]
+            # 每个多于1句的分块至少去掉1句，保证每层句子数都在减少（比例配置为1或更大时也不会死循环）
+            counts = [max(1, min(len(chunk) - 1, round(len(chunk) * self.ratio))) for chunk in chunks]
+            sentences = [sentence for selected in self._summarize_chunks(chunks, counts) for sentence in selected]
+            levels += 1
+
+        summary = text_rank(sentences, count)
+        logger.info(
+            f'Summarized {len(text)} chars into {len(summary)} sentences '
+            f'({levels} intermediate levels) in {time.time() - started:.1f}s'
+        )
+        return self._join(summary)
+
+    @staticmethod
+    def _join(sentences):
+        """按原文标点拼接选出的句子：原文以换行分隔的句子换行，英文标点后加空格"""
+        parts = []
+        for sentence in sentences:
+            if sentence[-1] not in SENTENCE_DELIMITERS:
+                sentence += '\n'
+            elif sentence[-1].isascii():
+                sentence += ' '
+            parts.append(sentence)
+        return ''.join(parts).strip()
+
+    def _summarize_chunks(self, chunks, counts):
+        """按顺序返回各分块选出的句子"""
+        if self.workers > 1 and len(chunks) > 1:
+            try:
+                return list(self._get_pool().map(_summarize_chunk, chunks, counts))
+            except BrokenProcessPool as e:
+                logger.error(f'Summarization worker pool failed ({e}), summarizing in process')
+                self._reset_pool()
+
+        return [text_rank(chunk, count) for chunk, count in zip(chunks, counts)]
+
+    def _get_pool(self):
+        """创建摘要进程池（spawn方式启动，与转写进程池一致）"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def _reset_pool(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
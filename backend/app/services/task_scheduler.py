@@ -1,14 +1,21 @@
 import logging
 import os
+import queue
 import time
 import traceback
 from datetime import datetime, timedelta
 from threading import Thread
 from app.services.live_monitor import live_monitor
 from app.services.content_analyzer import content_analyzer
+from app.services.analysis_queue import analysis_queue
+from app.services.event_bus import event_bus, RECORDING_COMPLETED, SUMMARY_COMPLETED
 from app.services.notification_service import notification_service
 from app.services.video_recorder import video_recorder
-from app.models import db, Recording, Summary
+from app.services.storage_manager import storage_manager
+from app.services.live_transcriber import live_transcriber
+from app.services.leader_election import leader_election
+from app.services.shard_manager import shard_manager
+from app.models import db
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -26,41 +33,121 @@ class TaskScheduler:
         self.summary_send_time = os.getenv('SUMMARY_SEND_TIME', '08:00')
         self.backup_interval = int(os.getenv('BACKUP_INTERVAL', 86400))  # 24小时
         self.last_backup_time = datetime.now()
+        self.leader_election_enabled = os.getenv('LEADER_ELECTION', 'True').lower() == 'true'  # 多进程部署时只让主节点运行任务
+        self._leader_generation = 0  # 每次启动或停止主节点任务时递增，旧任务线程检测到变化后退出
     
     def start(self):
         """启动定时任务服务"""
         logger.info('Starting task scheduler service')
         self.is_running = True
         
-        # 启动直播监测线程
-        monitor_thread = Thread(target=self._run_live_monitor, daemon=True)
-        monitor_thread.start()
-        self.threads.append(monitor_thread)
+        # 录制完成后立即排队分析，摘要生成后立即发送通知
+        event_bus.subscribe(RECORDING_COMPLETED, self._on_recording_completed)
+        event_bus.subscribe(SUMMARY_COMPLETED, self._on_summary_completed)
+        
+        if live_monitor.sharding:
+            # 分片模式下每个节点都运行直播监测，只检查分配给自己的主播
+            shard_manager.start()
+            monitor_thread = Thread(target=self._run_live_monitor, daemon=True)
+            monitor_thread.start()
+            self.threads.append(monitor_thread)
+            
+            # 增量转写在录制所在的节点运行
+            if live_transcriber.enabled:
+                live_thread = Thread(target=self._run_live_transcriber, daemon=True)
+                live_thread.start()
+                self.threads.append(live_thread)
+        
+        if self.leader_election_enabled:
+            # 当选主节点后才启动任务，失去主节点身份时停止
+            leader_election.start(
+                on_elected=self._start_leader_tasks,
+                on_revoked=self._stop_leader_tasks
+            )
+        else:
+            self._start_leader_tasks()
+        
+        logger.info('Task scheduler service started successfully')
+    
+    def _start_leader_tasks(self):
+        """启动只允许在一个进程中运行的任务"""
+        logger.info('Starting leader tasks')
+        self._leader_generation += 1
+        generation = self._leader_generation
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        
+        # 启动事件分发
+        event_bus.recover()
+        event_bus.start()
+        
+        # 启动直播监测线程（分片模式下已在每个节点单独启动）
+        if not live_monitor.sharding:
+            video_recorder.resume()
+            monitor_thread = Thread(target=self._run_live_monitor, daemon=True)
+            monitor_thread.start()
+            self.threads.append(monitor_thread)
+            
+            # 启动录制中的增量转写线程
+            if live_transcriber.enabled:
+                live_thread = Thread(target=self._run_live_transcriber, args=(generation,), daemon=True)
+                live_thread.start()
+                self.threads.append(live_thread)
         
         # 启动内容分析线程
-        analyzer_thread = Thread(target=self._run_content_analyzer, daemon=True)
+        analyzer_thread = Thread(target=self._run_content_analyzer, args=(generation,), daemon=True)
         analyzer_thread.start()
         self.threads.append(analyzer_thread)
         
+        # 启动分段转写线程（分段录制模式）
+        if video_recorder.segment_duration > 0:
+            segment_thread = Thread(target=self._run_segment_transcriber, args=(generation,), daemon=True)
+            segment_thread.start()
+            self.threads.append(segment_thread)
+        
+        # 启动存储空间管理线程
+        storage_thread = Thread(target=self._run_storage_manager, args=(generation,), daemon=True)
+        storage_thread.start()
+        self.threads.append(storage_thread)
+        
         # 启动通知发送线程
-        notification_thread = Thread(target=self._run_notification_service, daemon=True)
+        notification_thread = Thread(target=self._run_notification_service, args=(generation,), daemon=True)
         notification_thread.start()
         self.threads.append(notification_thread)
         
         # 启动维护任务线程
-        maintenance_thread = Thread(target=self._run_maintenance_tasks, daemon=True)
+        maintenance_thread = Thread(target=self._run_maintenance_tasks, args=(generation,), daemon=True)
         maintenance_thread.start()
         self.threads.append(maintenance_thread)
+    
+    def _stop_leader_tasks(self):
+        """停止主节点任务"""
+        logger.info('Stopping leader tasks')
+        self._leader_generation += 1
+        event_bus.stop()
+        analysis_queue.wake()
         
-        logger.info('Task scheduler service started successfully')
+        # 停止直播监测并交出录制，由新的主节点恢复（分片模式下直播监测和录制不依赖主节点身份）
+        if not live_monitor.sharding:
+            live_monitor.stop_monitoring()
+            video_recorder.release_all()
+    
+    def _is_active(self, generation):
+        """任务线程是否应继续运行"""
+        return self.is_running and generation == self._leader_generation
     
     def stop(self):
         """停止定时任务服务"""
         logger.info('Stopping task scheduler service')
         self.is_running = False
         
-        # 停止直播监测
-        live_monitor.stop_monitoring()
+        if self.leader_election_enabled:
+            # 释放租约，备用节点可以立即接管
+            leader_election.stop()
+        self._stop_leader_tasks()
+        
+        if live_monitor.sharding:
+            live_monitor.stop_monitoring()
+            shard_manager.stop()
         
         # 等待线程结束
         for thread in self.threads:
@@ -75,25 +162,85 @@ class TaskScheduler:
         # 直接调用直播监测服务的启动方法
         live_monitor.start_monitoring()
     
-    def _run_content_analyzer(self):
-        """运行内容分析任务"""
+    def _run_content_analyzer(self, generation):
+        """运行内容分析任务：按优先级把队列中的录制分配给分析工作进程"""
         logger.info('Starting content analyzer task')
+        analysis_queue.recover()
+        last_backfill = 0
         
-        while self.is_running:
+        while self._is_active(generation):
             try:
-                # 查找需要分析的录制
-                self._analyze_pending_recordings()
-                # 每5分钟检查一次
-                time.sleep(300)
+                # 定期把未入队的已完成录制加入队列
+                if time.time() - last_backfill >= analysis_queue.backfill_interval:
+                    analysis_queue.enqueue_pending()
+                    last_backfill = time.time()
+                analysis_queue.dispatch()
+                # 有新录制完成或任务结束时立即被唤醒
+                analysis_queue.wait()
             except Exception as e:
                 logger.error(f'Error in content analyzer task: {e}')
-                time.sleep(300)
+                time.sleep(analysis_queue.poll_interval)
     
-    def _run_notification_service(self):
+    def _run_segment_transcriber(self, generation):
+        """运行分段转写任务：录制中每写完一个分段就立即转写"""
+        logger.info('Starting segment transcriber task')
+        
+        while self._is_active(generation):
+            try:
+                try:
+                    segment_ids = [video_recorder.closed_segments.get(timeout=30)]
+                except queue.Empty:
+                    # 兜底处理其他节点录制或重启前遗留的分段
+                    segment_ids = content_analyzer.get_pending_segment_ids()
+                
+                for segment_id in segment_ids:
+                    if not self._is_active(generation):
+                        break
+                    content_analyzer.transcribe_segment(segment_id)
+            except Exception as e:
+                logger.error(f'Error in segment transcriber task: {e}')
+                time.sleep(30)
+    
+    def _run_storage_manager(self, generation):
+        """运行存储空间管理任务：占用超过高水位时清理已分析的录制文件"""
+        logger.info('Starting storage manager task')
+        storage_manager.load()
+        
+        while self._is_active(generation):
+            try:
+                video_recorder.enforce_storage_quota()
+                time.sleep(storage_manager.check_interval)
+            except Exception as e:
+                logger.error(f'Error in storage manager task: {e}')
+                time.sleep(storage_manager.check_interval)
+    
+    def _run_live_transcriber(self, generation=None):
+        """运行录制中的增量转写任务，generation为空时（分片模式）不随主节点身份停止"""
+        logger.info('Starting live transcriber task')
+        
+        while self.is_running if generation is None else self._is_active(generation):
+            try:
+                live_transcriber.run_once()
+                time.sleep(live_transcriber.interval)
+            except Exception as e:
+                logger.error(f'Error in live transcriber task: {e}')
+                time.sleep(live_transcriber.interval)
+    
+    def _on_recording_completed(self, payload):
+        """录制完成：加入分析队列并唤醒分析线程"""
+        if analysis_queue.enqueue(payload['recording_id']):
+            analysis_queue.wake()
+    
+    def _on_summary_completed(self, payload):
+        """摘要生成完成：立即发送通知"""
+        if notification_service.notify_on_summary:
+            notification_service.send_summary(payload['summary_id'])
+    
+    def _run_notification_service(self, generation):
         """运行通知发送任务"""
         logger.info('Starting notification service task')
         
-        while self.is_running:
+        while self._is_active(generation):
             try:
                 # 检查是否到了发送时间
                 current_time = datetime.now().strftime('%H:%M')
@@ -109,11 +256,11 @@ class TaskScheduler:
                 logger.error(f'Error in notification service task: {e}')
                 time.sleep(60)
     
-    def _run_maintenance_tasks(self):
+    def _run_maintenance_tasks(self, generation):
         """运行维护任务"""
         logger.info('Starting maintenance tasks')
         
-        while self.is_running:
+        while self._is_active(generation):
             try:
                 # 执行数据库备份
                 self._backup_database()
@@ -121,46 +268,16 @@ class TaskScheduler:
                 # 清理旧的录制文件
                 self._cleanup_old_recordings()
                 
+                # 清理已处理的推送事件和流水线事件
+                live_monitor.cleanup_live_events(days=7)
+                event_bus.cleanup(days=7)
+                
                 # 每小时执行一次维护任务
                 time.sleep(3600)
             except Exception as e:
                 logger.error(f'Error in maintenance tasks: {e}')
                 time.sleep(3600)
     
-    def _analyze_pending_recordings(self):
-        """分析待处理的录制"""
-        logger.info('Checking for pending recordings to analyze')
-        
-        try:
-            # 查找已完成但未分析的录制
-            pending_recordings = Recording.query.filter_by(
-                status='completed'
-            ).outerjoin(
-                Summary
-            ).filter(
-                Summary.id == None
-            ).all()
-            
-            logger.info(f'Found {len(pending_recordings)} pending recordings to analyze')
-            
-            for recording in pending_recordings:
-                try:
-                    # 分析录制内容
-                    success = content_analyzer.analyze_recording(recording.id)
-                    if success:
-                        logger.info(f'Analyzed recording {recording.id} successfully')
-                        # 分析完成后清理录制文件
-                        video_recorder.cleanup_recording(recording.id)
-                    else:
-                        logger.error(f'Failed to analyze recording {recording.id}')
-                except Exception as e:
-                    logger.error(f'Error analyzing recording {recording.id}: {e}')
-                
-                # 避免同时分析太多录制，每次分析后休息一下
-                time.sleep(5)
-        except Exception as e:
-            logger.error(f'Error checking pending recordings: {e}')
-    
     def _backup_database(self):
         """备份数据库"""
         current_time = datetime.now()
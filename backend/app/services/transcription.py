@@ -0,0 +1,182 @@
+import os
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from app.services.asr import create_backend
+from app.services.model_host import ModelHostClient
+from app.utils.audio import detect_speech, plan_chunks
+from app.utils.logging_config import configure_worker_logging
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# Whisper使用的音频采样率
+SAMPLE_RATE = 16000
+
+# 转写进程池中每个工作进程各自的模型
+_worker_model = None
+
+def _init_worker(engine, model_size, threads):
+    """初始化转写工作进程：配置日志，限制每个进程的计算线程数，模型在第一个分块时加载"""
+    global _worker_model
+    configure_worker_logging()
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = create_backend(engine, model_size, threads)
+
+def _transcribe_chunk(audio, options):
+    """在工作进程中转写一个分块"""
+    return _simplify_result(_worker_model.transcribe(audio, **options))
+
+def _simplify_result(result):
+    """只保留合并需要的字段，减少进程间传输的数据"""
+    return {
+        'text': result.get('text', ''),
+        'segments': [
+            {'start': float(segment['start']), 'end': float(segment['end']), 'text': segment['text']}
+            for segment in result.get('segments') or []
+        ]
+    }
+
+class ChunkedTranscriber:
+    """分块转写引擎
+
+    先按短时能量跳过静音，把有声部分打包成分块（长段落按重叠窗口切分），
+    各分块在进程池中并行转写，再按时间顺序合并，重叠部分只保留一份。
+    配置了模型服务时分块依次交给模型服务转写。
+    """
+
+    def __init__(self):
+        self.engine = os.getenv('ASR_ENGINE', 'whisper').lower()  # 语音识别引擎：whisper、faster-whisper（CPU int8量化）、stub（测试用）
+        self.model_size = os.getenv('WHISPER_MODEL_SIZE', 'small')
+        self.whisper_model = create_backend(self.engine, self.model_size)  # 本地模型，第一次转写时才加载
+        model_host = os.getenv('WHISPER_MODEL_HOST', '')  # 模型服务地址，配置后由模型服务进程转写
+        self.model_host = None
+        if model_host:
+            try:
+                self.model_host = ModelHostClient(model_host)
+            except ValueError as e:
+                logger.error(f'Whisper model host disabled: {e}')
+        self.workers = int(os.getenv('TRANSCRIBE_WORKERS', 1))  # 并行转写的进程数，每个进程各加载一份模型；1表示在当前进程转写
+        self.chunk_seconds = float(os.getenv('TRANSCRIBE_CHUNK_SECONDS', 300))  # 分块时长（秒）
+        self.overlap_seconds = float(os.getenv('TRANSCRIBE_CHUNK_OVERLAP', 5))  # 长段落切分时相邻分块的重叠时长（秒）
+        self.vad_enabled = os.getenv('VAD_ENABLED', 'True').lower() == 'true'  # 是否跳过静音
+        self.vad_threshold_db = float(os.getenv('VAD_THRESHOLD_DB', -40))  # 有声判定的最低能量（dBFS）
+        self.vad_min_silence = float(os.getenv('VAD_MIN_SILENCE', 1.0))  # 短于该时长（秒）的静音不切分
+        self._pool = None
+        self._pool_lock = Lock()
+
+    @property
+    def model_name(self):
+        """转写结果对应的模型标识：whisper引擎为模型大小，其他引擎加上引擎名称"""
+        if self.whisper_model.engine == 'whisper':
+            return self.model_size
+        return f'{self.whisper_model.engine}:{self.model_size}'
+
+    def transcribe(self, audio, **options):
+        """转写16kHz单声道float32音频，返回 {'text', 'segments'}；模型无法加载时返回None"""
+        started = time.time()
+        duration = len(audio) / SAMPLE_RATE
+        if self.vad_enabled:
+            regions = detect_speech(
+                audio, SAMPLE_RATE,
+                threshold_db=self.vad_threshold_db,
+                min_silence=self.vad_min_silence
+            )
+        else:
+            regions = [(0, len(audio))] if len(audio) else []
+        chunks = plan_chunks(regions, SAMPLE_RATE, self.chunk_seconds, self.overlap_seconds)
+        speech = sum(end - start for start, end in regions) / SAMPLE_RATE
+        logger.info(
+            f'Transcribing {duration:.0f}s of audio: {speech:.0f}s speech in {len(chunks)} chunks'
+        )
+        if not chunks:
+            return {'text': '', 'segments': []}
+
+        results = self._transcribe_chunks([audio[start:end] for start, end, _, _ in chunks], options)
+        if results is None:
+            return None
+
+        merged = self._merge(chunks, results)
+        logger.info(f'Transcribed {duration:.0f}s of audio in {time.time() - started:.1f}s')
+        return merged
+
+    def _transcribe_chunks(self, chunk_audio, options):
+        """按顺序返回各分块的转写结果"""
+        if self.workers > 1 and len(chunk_audio) > 1 and not self.model_host:
+            try:
+                return list(self._get_pool().map(_transcribe_chunk, chunk_audio, [options] * len(chunk_audio)))
+            except BrokenProcessPool as e:
+                logger.error(f'Transcription worker pool failed ({e}), transcribing in process')
+                self._reset_pool()
+
+        results = []
+        for audio in chunk_audio:
+            result = self._transcribe_one(audio, **options)
+            if result is None:
+                return None
+            results.append(_simplify_result(result))
+        return results
+
+    def _transcribe_one(self, audio, **options):
+        """优先由模型服务转写，未配置或不可用时使用本地模型，模型无法加载时返回None"""
+        if self.model_host:
+            try:
+                return self.model_host.transcribe(audio, **options)
+            except (OSError, EOFError) as e:
+                logger.warning(f'Whisper model host unavailable ({e}), falling back to local model')
+
+        if self.whisper_model.load() is None:
+            return None
+        return self.whisper_model.transcribe(audio, **options)
+
+    def _get_pool(self):
+        """创建转写进程池（spawn方式启动，避免fork后torch线程池死锁）"""
+        with self._pool_lock:
+            if self._pool is None:
+                threads = max(1, (os.cpu_count() or 1) // self.workers)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.whisper_model.engine, self.model_size, threads)
+                )
+            return self._pool
+
+    def _reset_pool(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    @staticmethod
+    def _merge(chunks, results):
+        """按时间顺序合并各分块的转写结果，每个分块只保留负责范围内的片段"""
+        segments = []
+        texts = []
+        for (start, _, keep_start, keep_end), result in zip(chunks, results):
+            if not result['segments']:
+                texts.append(result['text'].strip())
+                continue
+            for segment in result['segments']:
+                segment_start = start / SAMPLE_RATE + segment['start']
+                segment_end = start / SAMPLE_RATE + segment['end']
+                middle = (segment_start + segment_end) / 2 * SAMPLE_RATE
+                if keep_start <= middle < keep_end:
+                    segments.append({
+                        'start': round(segment_start, 2),
+                        'end': round(segment_end, 2),
+                        'text': segment['text'].strip()
+                    })
+                    texts.append(segment['text'].strip())
+        return {'text': ''.join(texts), 'segments': segments}
@@ -1,10 +1,22 @@
 import os
+import csv
+import glob
+import json
+import queue
+import signal
 import subprocess
 import time
 import logging
 import traceback
-from datetime import datetime
-from app.models import db, Recording
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Thread, RLock
+from flask import current_app, has_app_context
+from app.models import db, Recording, RecordingSegment
+from app.utils.media import is_audio_only
+from app.services.storage_manager import storage_manager
+from app.services.event_bus import event_bus, RECORDING_COMPLETED
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -13,6 +25,9 @@ load_dotenv()
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 分片MP4的movflags：先写空moov，每个关键帧开始一个分片
+FRAGMENTED_MOVFLAGS = '+frag_keyframe+empty_moov+default_base_moof'
+
 class VideoRecorder:
     """视频录制服务"""
     
@@ -21,26 +36,191 @@ class VideoRecorder:
         self.recording_processes = {}
         self.max_recording_duration = int(os.getenv('MAX_RECORDING_DURATION', 3600))  # 最大录制时长
         self.cleanup_video = os.getenv('CLEANUP_VIDEO', 'True').lower() == 'true'  # 是否清理视频文件
+        self.retention_batch_size = int(os.getenv('RETENTION_BATCH_SIZE', 500))  # 过期清理每批处理的录制数
+        self.retention_workers = int(os.getenv('RETENTION_WORKERS', 8))  # 过期清理并行删除文件的线程数
+        self.last_cleanup_stats = {}  # 最近一次过期清理的统计
+        
+        # 录制进程看护配置
+        self.max_concurrent_recordings = max(1, int(os.getenv('MAX_CONCURRENT_RECORDINGS', 10)))  # 同时录制的最大数量，超出的排队等待
+        self.max_restarts = int(os.getenv('RECORDING_MAX_RESTARTS', 5))  # 录制进程意外退出后的最大重启次数
+        self.restart_delay = float(os.getenv('RECORDING_RESTART_DELAY', 5))  # 重启前的基础等待秒数，按次数指数增加
+        self.watchdog_interval = float(os.getenv('RECORDING_WATCHDOG_INTERVAL', 5))  # 看护线程检查间隔（秒）
+        self.stall_timeout = float(os.getenv('RECORDING_STALL_TIMEOUT', 60))  # 超过该时间没有进度输出视为卡住并重启（秒）
+        self.status_dir = os.path.join(os.getenv('VIDEO_STORAGE_PATH', './data/temp_videos'), '.status')  # 录制实时状态快照目录，供其他进程读取
+        self.container = os.getenv('RECORDING_CONTAINER', 'ts').lower()  # 录制容器：ts、fmp4（分片MP4），进程被结束时已写入的内容仍可读取；mp4为普通MP4
+        self.remux_on_complete = os.getenv('RECORDING_REMUX', 'True').lower() == 'true'  # 录制结束后无损转封装为普通MP4（moov前置）
+        self.capture_mode = os.getenv('CAPTURE_MODE', 'video').lower()  # 默认录制模式：video录制音视频，audio只录制音频
+        self.audio_resample = os.getenv('AUDIO_CAPTURE_RESAMPLE', 'False').lower() == 'true'  # 只录音频时直接转为16kHz单声道PCM
+        self.segment_duration = int(os.getenv('RECORDING_SEGMENT_DURATION', 0))  # 分段录制的分段时长（秒），0表示录制为单个文件
+        self.closed_segments = queue.Queue()  # 已写完的分段ID，交给转写任务处理
+        self.recording_jobs = {}  # 录制ID -> 录制任务状态
+        self.pending_queue = deque()  # 等待启动的录制ID
+        self._lock = RLock()
+        self._watchdog_thread = None
+        self.accepting = True  # 是否允许启动和重启录制进程，交出录制后（失去主节点身份）为False
+        # 停止后的合并、转封装和更新录制记录在后台线程中执行，不阻塞直播监测
+        self._finalize_executor = ThreadPoolExecutor(
+            max_workers=max(1, int(os.getenv('RECORDING_FINALIZE_WORKERS', 2))),  # 并行收尾停止的录制的线程数
+            thread_name_prefix='finalize'
+        )
     
     def start_recording(self, recording_id, stream_url, output_path):
-        """开始录制视频"""
+        """开始录制视频
+        
+        同时录制数达到上限时加入等待队列，有空闲名额后由看护线程启动。
+        """
         logger.info(f'Starting video recording for recording ID: {recording_id}')
         
         # 确保输出目录存在
         output_dir = os.path.dirname(output_path)
         os.makedirs(output_dir, exist_ok=True)
         
-        # 构建FFmpeg命令
+        job = self._new_job(recording_id, stream_url, output_path)
+        
+        with self._lock:
+            if not self.accepting:
+                logger.warning(f'Recorder is not accepting recordings, recording {recording_id} not started')
+                return False
+            if recording_id in self.recording_jobs:
+                logger.warning(f'Recording {recording_id} is already being recorded')
+                return True
+            
+            self.recording_jobs[recording_id] = job
+            if self.pending_queue or self._active_count() >= self.max_concurrent_recordings:
+                self.pending_queue.append(recording_id)
+                logger.warning(
+                    f'Concurrent recording limit ({self.max_concurrent_recordings}) reached, '
+                    f'recording {recording_id} queued ({len(self.pending_queue)} waiting)'
+                )
+                started = True
+            else:
+                started = self._launch(job)
+                if not started:
+                    del self.recording_jobs[recording_id]
+        
+        self._ensure_watchdog()
+        return started
+    
+    def _new_job(self, recording_id, stream_url, output_path):
+        """创建录制任务状态"""
+        return {
+            'recording_id': recording_id,
+            'stream_url': stream_url,
+            'output_path': output_path,
+            'parts': [],  # 每次启动（含重启）写入的文件
+            'part_offsets': [],  # 各文件在整场录制中的起始秒数
+            'process': None,
+            'state': 'queued',  # 状态：queued, running, restarting
+            'restarts': 0,
+            'queued_at': time.time(),
+            'started_at': None,
+            'next_restart_at': None,
+            'launched_at': None,
+            'cpu_sample': None,
+            'metrics': {},
+            'progress': {},  # 当前进程的-progress统计
+            'completed_seconds': 0,  # 之前的进程已录制的秒数
+            'completed_bytes': 0,  # 已写完的文件（之前的进程或已写完的分段）的字节数
+            'stderr_tail': deque(maxlen=20),
+            'manifest_path': None,  # 分段录制模式下当前进程的分段清单
+            'manifest_lines': 0,  # 已读取的分段清单行数
+            'segment_count': 0,  # 已写完的分段数
+            'segment_offset': 0,  # 已写完分段的累计时长（秒）
+            'new_segments': []  # 尚未登记到数据库的分段
+        }
+    
+    def _build_command(self, stream_url, output_path, duration, manifest_path=None, segment_start=0):
+        """构建FFmpeg录制命令，传入manifest_path时使用分段录制"""
         cmd = [
             'ffmpeg',
-            '-i', stream_url,
-            '-c:v', 'copy',  # 复制视频流，不重新编码
-            '-c:a', 'copy',  # 复制音频流，不重新编码
-            '-t', str(self.max_recording_duration),  # 最大录制时长
+            '-i', stream_url
+        ]
+        if is_audio_only(output_path):
+            cmd += ['-vn']  # 不录制视频流
+            if output_path.lower().endswith('.wav'):
+                # 直接重采样为Whisper使用的16kHz单声道，转写时无需再提取音频
+                cmd += ['-ac', '1', '-ar', '16000', '-c:a', 'pcm_s16le']
+            else:
+                cmd += ['-c:a', 'copy']  # 复制音频流，不重新编码
+        else:
+            cmd += [
+                '-c:v', 'copy',  # 复制视频流，不重新编码
+                '-c:a', 'copy'  # 复制音频流，不重新编码
+            ]
+        cmd += [
+            '-t', str(duration),  # 最大录制时长
             '-y',  # 覆盖已存在的文件
             '-loglevel', 'error',  # 只记录错误
-            output_path
+            '-progress', 'pipe:1',  # 向标准输出写入机器可读的进度
+            '-nostats'
         ]
+        if manifest_path:
+            cmd += [
+                '-f', 'segment',
+                '-segment_time', str(self.segment_duration),  # 分段时长
+                '-segment_start_number', str(segment_start),  # 重启后分段序号接着编号
+                '-segment_list', manifest_path,  # 每写完一个分段追加一行清单
+                '-segment_list_type', 'csv',
+                '-reset_timestamps', '1'
+            ]
+        if self._is_fragmented(output_path):
+            # 分片MP4：先写空moov，之后每个关键帧写一个分片，中途结束的文件也可以播放
+            if manifest_path:
+                cmd += ['-segment_format_options', f'movflags={FRAGMENTED_MOVFLAGS}']
+            else:
+                cmd += ['-movflags', FRAGMENTED_MOVFLAGS]
+        cmd.append(output_path)
+        return cmd
+    
+    def output_extension(self, capture_mode=None):
+        """根据录制模式和容器返回录制文件扩展名，capture_mode为空时使用全局配置"""
+        if (capture_mode or self.capture_mode) == 'audio':
+            return '.wav' if self.audio_resample else '.m4a'
+        return '.ts' if self.container == 'ts' else '.mp4'
+    
+    def _is_fragmented(self, path):
+        """是否以分片MP4写入（ts模式下只录音频的m4a同样分片写入）"""
+        return self.container != 'mp4' and os.path.splitext(path)[1].lower() in ('.mp4', '.m4a')
+    
+    def _remux_target(self, output_path):
+        """录制结束后需要转封装时返回目标路径，否则返回None"""
+        if not self.remux_on_complete:
+            return None
+        base, ext = os.path.splitext(output_path)
+        if ext.lower() == '.ts':
+            return f'{base}.mp4'
+        if self._is_fragmented(output_path):
+            return output_path
+        return None
+    
+    def _recorded_seconds(self, job):
+        """根据录制进度统计的已录制时长（秒）"""
+        return job['completed_seconds'] + (job['progress'].get('out_time_seconds') or 0)
+    
+    def _part_path(self, output_path, index):
+        """第index次启动写入的文件路径，首次启动直接写入output_path"""
+        if index == 0:
+            return output_path
+        base, ext = os.path.splitext(output_path)
+        return f'{base}_part{index}{ext}'
+    
+    def _launch(self, job):
+        """启动（或重启）录制进程，调用方需持有锁"""
+        recording_id = job['recording_id']
+        now = time.time()
+        started_at = job['started_at'] or now
+        # 重启后的文件共享同一个最大录制时长
+        remaining = max(1, int(self.max_recording_duration - (now - started_at)))
+        if self.segment_duration > 0:
+            # 分段录制：文件名按分段序号编号，每次启动使用单独的分段清单
+            base, ext = os.path.splitext(job['output_path'])
+            part_path = f'{base}_%04d{ext}'
+            manifest_path = f'{base}_segments{len(job["parts"])}.csv'
+            cmd = self._build_command(job['stream_url'], part_path, remaining, manifest_path, job['segment_count'])
+        else:
+            part_path = self._part_path(job['output_path'], len(job['parts']))
+            manifest_path = None
+            cmd = self._build_command(job['stream_url'], part_path, remaining)
         
         try:
             # 启动录制进程
@@ -50,46 +230,638 @@ class VideoRecorder:
                 stderr=subprocess.PIPE,
                 shell=False
             )
-            
-            # 记录进程
-            self.recording_processes[recording_id] = process
-            
-            logger.info(f'Video recording started for recording ID: {recording_id}, output: {output_path}')
-            return True
         except Exception as e:
             logger.error(f'Error starting video recording: {e}')
             return False
+        
+        # 累计上一个进程已录制的时长和文件大小（分段录制按写完的分段累计）
+        job['completed_seconds'] += job['progress'].get('out_time_seconds') or 0
+        if not manifest_path:
+            job['completed_bytes'] += job['progress'].get('total_size') or 0
+        job['progress'] = {}
+        
+        # 记录进程
+        job['process'] = process
+        job['state'] = 'running'
+        job['started_at'] = started_at
+        job['launched_at'] = now
+        job['parts'].append(part_path)
+        job['part_offsets'].append(job['completed_seconds'])
+        job['manifest_path'] = manifest_path
+        job['manifest_lines'] = 0
+        job['cpu_sample'] = None
+        self.recording_processes[recording_id] = process
+        
+        # 异步读取输出，避免管道写满后ffmpeg阻塞
+        Thread(target=self._drain_progress, args=(job, process), daemon=True).start()
+        Thread(target=self._drain_stderr, args=(job, process), daemon=True).start()
+        self._write_status_snapshot(job)
+        
+        logger.info(f'Video recording started for recording ID: {recording_id}, output: {part_path}')
+        return True
     
-    def stop_recording(self, recording_id):
-        """停止录制视频"""
-        logger.info(f'Stopping video recording for recording ID: {recording_id}')
+    def _collect_segments(self, job):
+        """读取分段清单中新写完的分段，加入待登记列表"""
+        manifest_path = job['manifest_path']
+        if not manifest_path or not os.path.exists(manifest_path):
+            return
         
-        if recording_id in self.recording_processes:
-            process = self.recording_processes[recording_id]
+        with open(manifest_path, newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))
+        
+        output_dir = os.path.dirname(job['output_path'])
+        for row in rows[job['manifest_lines']:]:
+            if len(row) < 3:
+                # 清单行尚未写完，下次再读
+                break
+            filename, start, end = row[0], float(row[1]), float(row[2])
+            duration = max(0, end - start)
+            job['new_segments'].append({
+                'segment_index': job['segment_count'],
+                'path': filename if os.path.isabs(filename) else os.path.join(output_dir, filename),
+                'start_offset': job['segment_offset'],
+                'duration': duration
+            })
+            job['segment_count'] += 1
+            job['segment_offset'] += duration
+            job['completed_bytes'] += storage_manager.file_size(job['new_segments'][-1]['path'])
+            job['manifest_lines'] += 1
+    
+    def _take_new_segments(self, jobs):
+        """取出各任务待登记的分段，调用方需持有锁"""
+        new_segments = []
+        for job in jobs:
+            new_segments.extend((job['recording_id'], segment) for segment in job['new_segments'])
+            job['new_segments'] = []
+        return new_segments
+    
+    def _register_segments(self, new_segments):
+        """把写完的分段登记到数据库，并交给转写任务立即处理"""
+        if not new_segments:
+            return
+        
+        try:
+            segments = [
+                RecordingSegment(recording_id=recording_id, status='pending', **segment)
+                for recording_id, segment in new_segments
+            ]
+            db.session.add_all(segments)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f'Error registering recording segments: {e}')
+            db.session.rollback()
+            return
+        
+        for segment in segments:
+            self.closed_segments.put(segment.id)
+            logger.info(f'Segment {segment.segment_index} of recording {segment.recording_id} closed: {segment.path}')
+    
+    def _drain_progress(self, job, process):
+        """读取ffmpeg -progress输出，每个进度块结束时更新实时统计"""
+        block = {}
+        try:
+            for raw_line in iter(process.stdout.readline, b''):
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                if '=' not in line:
+                    continue
+                key, value = line.split('=', 1)
+                block[key] = value
+                if key == 'progress':
+                    progress = self._parse_progress(block)
+                    with self._lock:
+                        if job['process'] is process:
+                            job['progress'] = progress
+                    block = {}
+        except Exception as e:
+            logger.warning(f'Error reading progress for recording {job["recording_id"]}: {e}')
+        finally:
+            process.stdout.close()
+    
+    def _drain_stderr(self, job, process):
+        """读取ffmpeg错误输出，保留最近的几行用于排查"""
+        try:
+            for raw_line in iter(process.stderr.readline, b''):
+                line = raw_line.decode('utf-8', errors='replace').rstrip()
+                if line:
+                    job['stderr_tail'].append(line)
+        except Exception as e:
+            logger.warning(f'Error reading stderr for recording {job["recording_id"]}: {e}')
+        finally:
+            process.stderr.close()
+    
+    @staticmethod
+    def _parse_progress(block):
+        """解析一个ffmpeg进度块"""
+        def to_number(value, suffix='', cast=float):
+            if value is None:
+                return None
+            value = value.strip()
+            if suffix and value.endswith(suffix):
+                value = value[:-len(suffix)]
             try:
-                # 发送停止信号
-                process.terminate()
-                # 等待进程结束
-                process.wait(timeout=10)
-                # 从记录中移除
-                del self.recording_processes[recording_id]
-                logger.info(f'Video recording stopped for recording ID: {recording_id}')
-                return True
+                return cast(value)
+            except ValueError:
+                return None  # N/A
+        
+        # out_time_us是较新版本的字段，旧版本的out_time_ms实际单位也是微秒
+        out_time_us = to_number(block.get('out_time_us') or block.get('out_time_ms'), cast=int)
+        return {
+            'frame': to_number(block.get('frame'), cast=int),
+            'fps': to_number(block.get('fps')),
+            'bitrate_kbps': to_number(block.get('bitrate'), 'kbits/s'),
+            'total_size': to_number(block.get('total_size'), cast=int),
+            'out_time': block.get('out_time'),
+            'out_time_seconds': round(out_time_us / 1000000, 3) if out_time_us is not None and out_time_us >= 0 else None,
+            'speed': to_number(block.get('speed'), 'x'),
+            'drop_frames': to_number(block.get('drop_frames'), cast=int),
+            'dup_frames': to_number(block.get('dup_frames'), cast=int),
+            'progress': block.get('progress'),
+            'updated_at': time.time()
+        }
+    
+    def _active_count(self):
+        """占用录制名额的任务数（含等待重启的任务）"""
+        return sum(1 for job in self.recording_jobs.values() if job['state'] != 'queued')
+    
+    def _start_queued(self):
+        """有空闲名额时按顺序启动排队的录制，返回启动失败的任务，调用方需持有锁"""
+        failed = []
+        while self.accepting and self.pending_queue and self._active_count() < self.max_concurrent_recordings:
+            recording_id = self.pending_queue.popleft()
+            job = self.recording_jobs.get(recording_id)
+            if job is None:
+                continue
+            waited = time.time() - job['queued_at']
+            logger.info(f'Starting queued recording {recording_id} after waiting {waited:.0f} seconds')
+            if not self._launch(job):
+                del self.recording_jobs[recording_id]
+                failed.append(job)
+        return failed
+    
+    def _ensure_watchdog(self):
+        """确保看护线程在运行"""
+        with self._lock:
+            if self._watchdog_thread is None or not self._watchdog_thread.is_alive():
+                self._watchdog_thread = Thread(target=self._watchdog, daemon=True)
+                self._watchdog_thread.start()
+    
+    def _watchdog(self):
+        """看护线程：检测录制进程退出，意外退出时重启到新的文件，并采集资源指标"""
+        logger.info('Starting recording watchdog')
+        
+        while self.accepting:
+            time.sleep(self.watchdog_interval)
+            try:
+                with self._lock:
+                    if not self.accepting:
+                        break
+                    now = time.time()
+                    jobs = list(self.recording_jobs.values())
+                    finished = [job for job in jobs if self._check_job(job, now)]
+                    for job in finished:
+                        del self.recording_jobs[job['recording_id']]
+                    finished.extend(self._start_queued())
+                    new_segments = self._take_new_segments(jobs)
+                
+                # 登记分段、合并文件和更新录制记录在锁外执行，避免阻塞启动/停止
+                self._register_segments(new_segments)
+                for job in finished:
+                    try:
+                        self._finalize_job(job)
+                    except Exception as e:
+                        logger.error(f'Error finalizing recording {job["recording_id"]}: {e}')
             except Exception as e:
-                logger.error(f'Error stopping video recording: {e}')
+                logger.error(f'Error in recording watchdog: {e}')
+    
+    def _check_job(self, job, now):
+        """检查单个录制任务的进程状态，任务结束时返回True，调用方需持有锁"""
+        if job['state'] == 'running':
+            returncode = job['process'].poll()
+            self._collect_segments(job)
+            if returncode is None:
+                self._sample_metrics(job, now)
+                self._write_status_snapshot(job)
+                storage_manager.update(job['recording_id'], self._job_bytes(job))
+                last_progress = job['progress'].get('updated_at') or job['launched_at']
+                if now - last_progress > self.stall_timeout:
+                    # 长时间没有进度输出，结束进程后按意外退出重启
+                    logger.warning(
+                        f'Recording {job["recording_id"]} stalled for {now - last_progress:.0f}s, terminating'
+                    )
+                    job['process'].terminate()
                 return False
-        else:
+            self.recording_processes.pop(job['recording_id'], None)
+            return self._handle_exit(job, now, returncode)
+        
+        if job['state'] == 'restarting' and now >= job['next_restart_at'] and self.accepting:
+            if not self._launch(job):
+                # 启动失败按一次退出处理，直到用完重启次数
+                return self._handle_exit(job, now, None)
+        return False
+    
+    def _job_bytes(self, job):
+        """录制任务已写入的字节数"""
+        if job['manifest_path']:
+            return job['completed_bytes']
+        return job['completed_bytes'] + (job['progress'].get('total_size') or 0)
+    
+    def _handle_exit(self, job, now, returncode):
+        """处理录制进程退出：达到最大时长则结束，否则按退避时间安排重启"""
+        recording_id = job['recording_id']
+        elapsed = now - job['started_at']
+        if elapsed >= self.max_recording_duration - self.watchdog_interval:
+            logger.info(f'Recording {recording_id} reached max duration ({self.max_recording_duration}s)')
+            return True
+        
+        if job['stderr_tail']:
+            logger.warning(f'Last ffmpeg output for {recording_id}: {" | ".join(list(job["stderr_tail"])[-3:])}')
+        
+        if job['restarts'] < self.max_restarts:
+            delay = min(60, self.restart_delay * (2 ** job['restarts']))
+            job['restarts'] += 1
+            job['state'] = 'restarting'
+            job['next_restart_at'] = now + delay
+            logger.warning(
+                f'Recording process for {recording_id} exited with code {returncode}, '
+                f'restarting in {delay:.0f}s (attempt {job["restarts"]}/{self.max_restarts})'
+            )
+            return False
+        
+        logger.error(
+            f'Recording process for {recording_id} exited with code {returncode}, '
+            f'giving up after {job["restarts"]} restarts'
+        )
+        return True
+    
+    def _finalize_job(self, job):
+        """录制进程自行结束后合并文件并更新录制记录"""
+        self._remove_status_snapshot(job['recording_id'])
+        # 分段录制的分段各自转写，不需要合并
+        if not job['manifest_path']:
+            self._merge_parts(job)
+        self.process_recording(job['recording_id'], self._recorded_seconds(job), job['output_path'])
+    
+    def _merge_parts(self, job):
+        """把重启产生的多个文件无损拼接回output_path，需要时同时转封装为普通MP4"""
+        parts = [path for path in job['parts'] if os.path.exists(path) and os.path.getsize(path) > 0]
+        output_path = job['output_path']
+        target_path = self._remux_target(output_path)
+        if not parts or (len(parts) == 1 and not target_path):
+            if parts and parts[0] != output_path:
+                os.replace(parts[0], output_path)
+            return
+        
+        final_path = target_path or output_path
+        base, _ = os.path.splitext(output_path)
+        list_path = f'{base}_parts.txt'
+        merged_path = f'{base}_merged{os.path.splitext(final_path)[1]}'
+        cmd = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy']
+        if target_path:
+            # MPEG-TS中的AAC为ADTS格式，写入MP4需要转换；moov前置便于直接播放
+            cmd += ['-bsf:a', 'aac_adtstoasc', '-movflags', '+faststart']
+        cmd += ['-y', '-loglevel', 'error', merged_path]
+        try:
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for path in parts:
+                    f.write(f"file '{os.path.abspath(path)}'\n")
+            
+            result = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                shell=False
+            )
+            if result.returncode == 0:
+                os.replace(merged_path, final_path)
+                for path in parts:
+                    if path != final_path and os.path.exists(path):
+                        os.remove(path)
+                job['output_path'] = final_path
+                logger.info(f'Merged {len(parts)} parts for recording {job["recording_id"]} into {final_path}')
+            else:
+                logger.error(f'Error merging parts: {result.stderr}')
+                if len(parts) == 1 and parts[0] != output_path:
+                    os.replace(parts[0], output_path)
+        except Exception as e:
+            logger.error(f'Error merging parts: {e}')
+        finally:
+            if os.path.exists(list_path):
+                os.remove(list_path)
+            if os.path.exists(merged_path):
+                os.remove(merged_path)
+    
+    def _sample_metrics(self, job, now):
+        """采集录制进程的CPU、内存和写入字节数"""
+        pid = job['process'].pid
+        metrics = job['metrics']
+        
+        cpu_time = self._read_cpu_time(pid)
+        if cpu_time is not None and job['cpu_sample']:
+            last_time, last_cpu = job['cpu_sample']
+            if now > last_time:
+                metrics['cpu_percent'] = round(100 * (cpu_time - last_cpu) / (now - last_time), 1)
+        job['cpu_sample'] = (now, cpu_time) if cpu_time is not None else None
+        
+        metrics['pid'] = pid
+        metrics['memory_rss'] = self._read_memory_rss(pid)
+        metrics['bytes_written'] = sum(
+            os.path.getsize(path) for path in job['parts'] if os.path.exists(path)
+        )
+        metrics['restarts'] = job['restarts']
+        metrics['uptime'] = int(now - job['started_at'])
+        metrics['sampled_at'] = now
+    
+    @staticmethod
+    def _read_cpu_time(pid):
+        """读取进程累计CPU时间（秒），仅支持Linux"""
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                data = f.read()
+            fields = data[data.rindex(')') + 2:].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except (OSError, ValueError, IndexError):
+            return None
+    
+    @staticmethod
+    def _read_memory_rss(pid):
+        """读取进程常驻内存（字节），仅支持Linux"""
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            return None
+    
+    def stop_recording(self, recording_id):
+        """停止录制视频
+        
+        结束录制进程后立即返回，合并文件、转封装和更新录制记录（状态改为completed）
+        在后台线程中执行，期间录制状态为finalizing。
+        """
+        logger.info(f'Stopping video recording for recording ID: {recording_id}')
+        
+        with self._lock:
+            job = self.recording_jobs.pop(recording_id, None)
+            process = self.recording_processes.pop(recording_id, None)
+            if job is not None and job['state'] == 'queued':
+                self.pending_queue.remove(recording_id)
+                logger.info(f'Removed queued recording {recording_id}')
+        
+        if job is None and process is None:
             logger.warning(f'No recording process found for recording ID: {recording_id}')
             return False
+        
+        try:
+            if process and process.poll() is None:
+                # 发送停止信号，由后台线程等待进程结束
+                process.terminate()
+            app = current_app._get_current_object() if has_app_context() else None
+            self._finalize_executor.submit(self._finalize_stopped, recording_id, job, process, app)
+            logger.info(f'Video recording stopped for recording ID: {recording_id}, finalizing in background')
+            return True
+        except Exception as e:
+            logger.error(f'Error stopping video recording: {e}')
+            return False
+        finally:
+            # 释放名额后启动排队的录制
+            with self._lock:
+                failed = self._start_queued()
+            for failed_job in failed:
+                self._finalize_job(failed_job)
+    
+    def _finalize_stopped(self, recording_id, job, process, app=None):
+        """后台线程：在停止录制时的应用上下文中收尾"""
+        if app is None:
+            self._finish_stopped(recording_id, job, process)
+            return
+        with app.app_context():
+            self._finish_stopped(recording_id, job, process)
+    
+    def _finish_stopped(self, recording_id, job, process):
+        """等待停止的录制进程结束，合并文件并更新录制记录"""
+        try:
+            if process:
+                # 等待进程结束
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            if job is not None:
+                if job['manifest_path']:
+                    # 登记停止时最后写完的分段
+                    self._collect_segments(job)
+                    self._register_segments(self._take_new_segments([job]))
+                else:
+                    self._merge_parts(job)
+                # 按录制进度统计的时长更新录制记录
+                self.process_recording(recording_id, self._recorded_seconds(job), job['output_path'])
+                # 收尾完成前保留状态快照，进程中断后由恢复流程继续收尾
+                self._remove_status_snapshot(recording_id)
+            else:
+                self.process_recording(recording_id)
+            logger.info(f'Recording {recording_id} finalized')
+        except Exception as e:
+            logger.error(f'Error finalizing recording {recording_id}: {e}')
+            db.session.rollback()
+    
+    def has_recording(self, recording_id):
+        """当前进程是否在看护该录制（含排队和等待重启的录制）"""
+        with self._lock:
+            return recording_id in self.recording_jobs
     
-    def get_recording_status(self, recording_id):
-        """获取录制状态"""
+    def release_all(self):
+        """交出当前进程看护的全部录制（失去主节点身份时调用）
+        
+        停止看护线程并结束录制进程，但不合并文件、不更新录制记录：录制状态保持为
+        recording，已写入的文件和进度写入状态快照，由新的主节点恢复后继续录制。
+        之后不再启动或重启录制进程，直到调用resume。返回交出的录制数。
+        """
+        with self._lock:
+            self.accepting = False
+            jobs = list(self.recording_jobs.values())
+            self.recording_jobs.clear()
+            self.pending_queue.clear()
+            self.recording_processes.clear()
+            for job in jobs:
+                if job['process'] is not None and job['process'].poll() is None:
+                    job['process'].terminate()
+            watchdog = self._watchdog_thread
+        
+        if watchdog is not None and watchdog.is_alive():
+            watchdog.join(timeout=self.watchdog_interval + 10)
+        
+        for job in jobs:
+            recording_id = job['recording_id']
+            try:
+                process = job['process']
+                if process is not None:
+                    try:
+                        process.wait(timeout=10)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                        process.wait()
+                if job['manifest_path']:
+                    # 登记结束前最后写完的分段
+                    self._collect_segments(job)
+                    self._register_segments(self._take_new_segments([job]))
+                # 最后一个进程的进度计入已完成部分，恢复时从新的文件继续
+                job['completed_seconds'] += job['progress'].get('out_time_seconds') or 0
+                if not job['manifest_path']:
+                    job['completed_bytes'] += job['progress'].get('total_size') or 0
+                job['progress'] = {}
+                job['process'] = None
+                job['started_at'] = job['started_at'] or job['queued_at']
+                job['state'] = 'released'
+                self._write_status_snapshot(job)
+                logger.info(f'Released recording {recording_id} for recovery by the new leader')
+            except Exception as e:
+                logger.error(f'Error releasing recording {recording_id}: {e}')
+        return len(jobs)
+    
+    def resume(self):
+        """重新允许启动录制进程（成为主节点时调用）"""
+        with self._lock:
+            self.accepting = True
+    
+    def get_recording_status(self, recording_id, detailed=False):
+        """获取录制状态
+        
+        detailed为False时返回进程是否在运行；为True时返回包含实时进度和资源指标的字典，
+        录制不在当前进程时读取录制进程写入的状态快照。
+        """
+        if detailed:
+            with self._lock:
+                job = self.recording_jobs.get(recording_id)
+                if job is not None:
+                    return self._build_status(job)
+            return self._read_status_snapshot(recording_id) or {
+                'recording_id': recording_id,
+                'running': False,
+                'state': None
+            }
+        
         if recording_id in self.recording_processes:
             process = self.recording_processes[recording_id]
             return process.poll() is None  # None表示进程仍在运行
         else:
             return False
     
+    def _build_status(self, job):
+        """生成录制任务的实时状态，调用方需持有锁"""
+        process = job['process']
+        progress = dict(job['progress'])
+        now = time.time()
+        last_progress = progress.get('updated_at') or job['launched_at']
+        return {
+            'recording_id': job['recording_id'],
+            'running': job['state'] == 'running' and process is not None and process.poll() is None,
+            'state': job['state'],
+            'restarts': job['restarts'],
+            'parts': len(job['parts']),
+            'recorded_seconds': round(job['completed_seconds'] + (progress.get('out_time_seconds') or 0), 3),
+            'stalled': job['state'] == 'running' and last_progress is not None and now - last_progress > self.stall_timeout,
+            'progress': progress,
+            'metrics': dict(job['metrics']),
+            'stderr_tail': list(job['stderr_tail'])[-5:],
+            'updated_at': now
+        }
+    
+    def _write_status_snapshot(self, job):
+        """写入录制实时状态快照，调用方需持有锁"""
+        try:
+            os.makedirs(self.status_dir, exist_ok=True)
+            path = os.path.join(self.status_dir, f'{job["recording_id"]}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(self._build_status(job), recovery=self._recovery_state(job)), f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f'Error writing recording status snapshot: {e}')
+    
+    def _recovery_state(self, job):
+        """进程重启后恢复录制所需的任务状态"""
+        process = job['process']
+        return {
+            'pid': process.pid if process is not None else None,
+            'stream_url': job['stream_url'],
+            'output_path': job['output_path'],
+            'parts': job['parts'],
+            'started_at': job['started_at'],
+            'completed_seconds': job['completed_seconds'],
+            'completed_bytes': job['completed_bytes'],
+            'restarts': job['restarts']
+        }
+    
+    def _load_snapshot(self, recording_id):
+        """读取状态快照原始内容"""
+        path = os.path.join(self.status_dir, f'{recording_id}.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _read_status_snapshot(self, recording_id):
+        """读取录制实时状态快照，快照过期时视为录制已不在运行"""
+        status = self._load_snapshot(recording_id)
+        if status is None:
+            return None
+        status.pop('recovery', None)
+        if time.time() - status.get('updated_at', 0) > 3 * self.watchdog_interval:
+            status['running'] = False
+        return status
+    
+    def _remove_status_snapshot(self, recording_id):
+        """删除录制实时状态快照"""
+        path = os.path.join(self.status_dir, f'{recording_id}.json')
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f'Error removing recording status snapshot: {e}')
+    
+    def get_active_recording_ids(self):
+        """当前进程正在看护的录制ID"""
+        with self._lock:
+            return list(self.recording_jobs.keys())
+    
+    def get_capture_parts(self, recording_id):
+        """正在录制的文件及其在整场录制中的位置，返回 [(路径, 起始秒数, 已录制秒数)]
+        
+        分段录制或各文件起始位置未知（如从中断中恢复的录制）时返回None。
+        """
+        with self._lock:
+            job = self.recording_jobs.get(recording_id)
+            if job is None or job['manifest_path'] or len(job['part_offsets']) != len(job['parts']):
+                return None
+            offsets = job['part_offsets'] + [self._recorded_seconds(job)]
+            return [
+                (path, offsets[i], offsets[i + 1] - offsets[i])
+                for i, path in enumerate(job['parts'])
+            ]
+    
+    def get_recording_metrics(self, recording_id):
+        """获取录制任务的状态和资源指标"""
+        with self._lock:
+            job = self.recording_jobs.get(recording_id)
+            if job is None:
+                return None
+            return dict(job['metrics'], state=job['state'], restarts=job['restarts'], parts=len(job['parts']))
+    
+    def get_supervisor_status(self):
+        """获取录制看护的整体状态"""
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent_recordings,
+                'active': self._active_count(),
+                'queued': len(self.pending_queue),
+                'recordings': {
+                    recording_id: self._build_status(job)
+                    for recording_id, job in self.recording_jobs.items()
+                }
+            }
+    
     def get_video_duration(self, video_path):
         """获取视频时长（秒）"""
         if not os.path.exists(video_path):
@@ -124,8 +896,190 @@ class VideoRecorder:
             logger.error(f'Error getting video duration: {e}')
             return 0
     
-    def process_recording(self, recording_id):
-        """处理录制完成的视频"""
+    def recover_recording(self, recording):
+        """服务重启后恢复状态仍为recording或finalizing的录制
+        
+        结束上次运行遗留的ffmpeg进程，丢弃无法读取的残缺文件。仍在录制、在最大录制时长内且
+        有直播流地址时从已有文件继续录制，否则（包括停止后未完成收尾的录制）用已写入的文件结束录制。
+        返回 running、resumed、finalized 或 failed。
+        """
+        recording_id = recording.id
+        with self._lock:
+            if recording_id in self.recording_jobs:
+                # 录制仍由当前进程看护（如本进程重新当选主节点）
+                return 'running'
+        
+        state = (self._load_snapshot(recording_id) or {}).get('recovery') or {}
+        output_path = state.get('output_path') or recording.video_path
+        logger.info(f'Recovering interrupted recording {recording_id}')
+        
+        pid = state.get('pid')
+        if pid and self._is_recorder_process(pid, output_path):
+            # 遗留进程的输出管道已断开，无法继续看护，结束后从已写入的文件继续
+            logger.warning(f'Terminating orphaned ffmpeg process {pid} for recording {recording_id}')
+            self._terminate_pid(pid)
+        
+        if not output_path:
+            return self._fail_recovery(recording_id)
+        
+        job = self._new_job(recording_id, state.get('stream_url'), output_path)
+        job['completed_seconds'] = state.get('completed_seconds') or 0
+        job['completed_bytes'] = state.get('completed_bytes') or 0
+        job['restarts'] = state.get('restarts') or 0
+        if self.segment_duration > 0:
+            self._recover_segments(recording, job)
+            recovered = job['segment_count']
+        else:
+            job['parts'] = self._usable_parts(state.get('parts') or self._find_parts(output_path), output_path)
+            recovered = len(job['parts'])
+        
+        started_at = state.get('started_at')
+        resumable = recording.status == 'recording' and job['stream_url'] and started_at
+        if resumable and time.time() - started_at < self.max_recording_duration:
+            # 继续录制到新的文件，直播是否仍在进行由监测服务下一轮检查决定
+            job['started_at'] = started_at
+            job['state'] = 'restarting'
+            job['next_restart_at'] = time.time()
+            with self._lock:
+                if recording_id in self.recording_jobs:
+                    return 'resumed'
+                self.recording_jobs[recording_id] = job
+            self._ensure_watchdog()
+            logger.info(f'Resuming recording {recording_id} after {len(job["parts"])} recovered parts')
+            return 'resumed'
+        
+        self._remove_status_snapshot(recording_id)
+        if not recovered:
+            return self._fail_recovery(recording_id)
+        if not job['manifest_path']:
+            self._merge_parts(job)
+        # 中断前最后一个文件的进度已丢失，由ffprobe读取实际时长
+        self.process_recording(recording_id, video_path=job['output_path'])
+        logger.info(f'Finalized interrupted recording {recording_id}')
+        return 'finalized'
+    
+    def _fail_recovery(self, recording_id):
+        """没有可用文件的录制标记为失败"""
+        self._remove_status_snapshot(recording_id)
+        try:
+            recording = Recording.query.filter_by(id=recording_id).first()
+            recording.status = 'failed'
+            if not recording.end_time:
+                recording.end_time = datetime.now()
+            recording.video_path = None
+            db.session.commit()
+            storage_manager.release(recording_id)
+        except Exception as e:
+            logger.error(f'Error marking recording {recording_id} as failed: {e}')
+            db.session.rollback()
+        logger.warning(f'No usable files for interrupted recording {recording_id}, marked as failed')
+        return 'failed'
+    
+    def _find_parts(self, output_path):
+        """没有状态快照时按命名规则查找已写入的文件"""
+        parts = [output_path]
+        while os.path.exists(self._part_path(output_path, len(parts))):
+            parts.append(self._part_path(output_path, len(parts)))
+        return parts
+    
+    def _usable_parts(self, parts, output_path):
+        """探测已写入的文件，把确定无法读取的残缺文件（如缺少moov的MP4）改名隔离
+        
+        只有ffprobe明确报告文件无法读取时才隔离，ffprobe不可用或探测出错时保留文件。
+        可用的文件按顺序重新编号，继续录制时新文件不会与已有文件重名。
+        """
+        usable = []
+        for path in parts:
+            if not os.path.exists(path):
+                continue
+            if os.path.getsize(path) > 0 and self._probe_readable(path) is not False:
+                usable.append(path)
+            else:
+                quarantine_path = f'{path}.{int(time.time())}.corrupt'  # 多次恢复时不覆盖之前隔离的文件
+                logger.warning(f'Unreadable partial file {path}, moved to {quarantine_path}')
+                os.replace(path, quarantine_path)
+        
+        for index, path in enumerate(usable):
+            part_path = self._part_path(output_path, index)
+            if path != part_path:
+                os.replace(path, part_path)
+                usable[index] = part_path
+        return usable
+    
+    @staticmethod
+    def _probe_readable(path):
+        """用ffprobe检查文件能否读取：可读返回True，ffprobe报告无法读取返回False，无法判断时返回None"""
+        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', path]
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=60)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f'Cannot probe {path}: {e}')
+            return None
+        if result.returncode != 0:
+            return False
+        try:
+            return float(result.stdout.strip()) > 0
+        except ValueError:
+            # 没有时长信息（N/A），无法判断
+            return None
+    
+    def _recover_segments(self, recording, job):
+        """登记上次运行已写完但尚未登记的分段"""
+        job['segment_count'] = recording.segments.count()
+        job['segment_offset'] = db.session.query(db.func.sum(RecordingSegment.duration)).filter(
+            RecordingSegment.recording_id == recording.id
+        ).scalar() or 0
+        
+        base, ext = os.path.splitext(job['output_path'])
+        manifests = sorted(
+            glob.glob(f'{glob.escape(base)}_segments*.csv'),
+            key=lambda path: int(path[len(base) + len('_segments'):-len('.csv')] or 0)
+        )
+        # 分段按顺序登记，跳过所有清单中已登记的行数
+        registered = job['segment_count']
+        for manifest_path in manifests:
+            job['manifest_path'] = manifest_path
+            with open(manifest_path, newline='', encoding='utf-8') as f:
+                rows = sum(1 for _ in f)
+            job['manifest_lines'] = min(rows, registered)
+            registered -= job['manifest_lines']
+            self._collect_segments(job)
+            # 占用本次清单的序号，继续录制时使用新的清单
+            job['parts'].append(f'{base}_%04d{ext}')
+        self._register_segments(self._take_new_segments([job]))
+    
+    @staticmethod
+    def _is_recorder_process(pid, output_path):
+        """pid是否为写入output_path的ffmpeg进程"""
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                cmdline = f.read().decode('utf-8', 'replace')
+        except OSError:
+            return False
+        base, _ = os.path.splitext(output_path or '')
+        return 'ffmpeg' in cmdline and bool(base) and base in cmdline
+    
+    @staticmethod
+    def _terminate_pid(pid, timeout=10):
+        """结束不属于当前进程的录制进程"""
+        try:
+            os.kill(pid, signal.SIGTERM)
+            deadline = time.time() + timeout
+            while time.time() < deadline:
+                if not os.path.exists(f'/proc/{pid}'):
+                    return
+                time.sleep(0.2)
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        except OSError as e:
+            logger.error(f'Error terminating process {pid}: {e}')
+    
+    def process_recording(self, recording_id, duration=None, video_path=None):
+        """处理录制完成的视频
+        
+        duration为录制进度统计的时长，为空时用ffprobe读取；video_path为合并或转封装后的文件路径。
+        """
         logger.info(f'Processing recording: {recording_id}')
         
         try:
@@ -135,26 +1089,45 @@ class VideoRecorder:
                 logger.error(f'Recording not found: {recording_id}')
                 return False
             
+            if video_path and os.path.exists(video_path):
+                recording.video_path = video_path
+            
             # 更新视频时长
-            if os.path.exists(recording.video_path):
+            if duration:
+                recording.video_duration = int(duration)
+                logger.info(f'Updated video duration for recording {recording_id} from progress: {recording.video_duration} seconds')
+            elif recording.video_path and os.path.exists(recording.video_path):
                 duration = self.get_video_duration(recording.video_path)
                 recording.video_duration = duration
                 logger.info(f'Updated video duration for recording {recording_id}: {duration} seconds')
+            else:
+                # 分段录制按各分段时长累加
+                segment_duration = db.session.query(db.func.sum(RecordingSegment.duration)).filter(
+                    RecordingSegment.recording_id == recording_id
+                ).scalar()
+                if segment_duration:
+                    recording.video_duration = int(segment_duration)
+                    logger.info(f'Updated video duration for recording {recording_id} from segments: {recording.video_duration} seconds')
             
-            # 更新录制状态
+            # 更新录制状态（已由监测服务停止的录制保留原结束时间）
             recording.status = 'completed'
-            recording.end_time = datetime.now()
+            if not recording.end_time:
+                recording.end_time = datetime.now()
             
             db.session.commit()
+            storage_manager.refresh(recording)
             logger.info(f'Recording {recording_id} processed successfully')
+            
+            # 通知内容分析立即处理
+            event_bus.publish(RECORDING_COMPLETED, {'recording_id': recording_id})
             return True
         except Exception as e:
             logger.error(f'Error processing recording: {e}')
             db.session.rollback()
             return False
     
-    def cleanup_recording(self, recording_id):
-        """清理录制文件"""
+    def cleanup_recording(self, recording_id, force=False):
+        """清理录制文件，force为True时忽略CLEANUP_VIDEO配置（存储空间不足时）"""
         logger.info(f'Cleaning up recording: {recording_id}')
         
         try:
@@ -164,43 +1137,173 @@ class VideoRecorder:
                 logger.error(f'Recording not found: {recording_id}')
                 return False
             
-            # 清理视频文件
-            if self.cleanup_video and recording.video_path and os.path.exists(recording.video_path):
-                try:
-                    os.remove(recording.video_path)
-                    recording.video_path = None
-                    db.session.commit()
-                    logger.info(f'Cleaned up video file for recording {recording_id}')
-                except Exception as e:
-                    logger.error(f'Error cleaning up video file: {e}')
+            if self.cleanup_video or force:
+                # 先清理分段文件和分段清单（清单路径由video_path推出）
+                self._cleanup_segments(recording)
+                
+                # 清理视频文件，分段录制没有完整文件时同样清空路径，避免再次被选为清理对象
+                if recording.video_path:
+                    try:
+                        if os.path.exists(recording.video_path):
+                            os.remove(recording.video_path)
+                            logger.info(f'Cleaned up video file for recording {recording_id}')
+                        recording.video_path = None
+                        db.session.commit()
+                    except Exception as e:
+                        logger.error(f'Error cleaning up video file: {e}')
+                        db.session.rollback()
             
+            storage_manager.refresh(recording)
             return True
         except Exception as e:
             logger.error(f'Error cleaning up recording: {e}')
             db.session.rollback()
             return False
     
+    def _cleanup_segments(self, recording):
+        """清理分段录制产生的分段文件和分段清单"""
+        segments = recording.segments.filter(RecordingSegment.path != None).all()
+        for segment in segments:
+            try:
+                if os.path.exists(segment.path):
+                    os.remove(segment.path)
+                segment.path = None
+            except Exception as e:
+                logger.error(f'Error cleaning up segment file: {e}')
+        
+        if recording.video_path:
+            base, _ = os.path.splitext(recording.video_path)
+            for manifest_path in glob.glob(f'{glob.escape(base)}_segments*.csv'):
+                os.remove(manifest_path)
+        
+        if segments:
+            db.session.commit()
+            logger.info(f'Cleaned up {len(segments)} segment files for recording {recording.id}')
+    
+    def enforce_storage_quota(self):
+        """存储占用超过高水位时，按清理策略删除已分析录制的文件直到低于低水位"""
+        to_free = storage_manager.bytes_to_free()
+        if not to_free:
+            return 0
+        
+        logger.warning(f'Storage above high-water mark, evicting {to_free / 1024 ** 3:.2f} GB of analyzed recordings')
+        freed = 0
+        evicted = 0
+        for recording_id, size in storage_manager.get_eviction_candidates():
+            if freed >= to_free:
+                break
+            if not size:
+                # 当前进程未统计的录制（如其他进程完成的）按实际文件大小计算
+                recording = Recording.query.filter_by(id=recording_id).first()
+                size = storage_manager.measure(recording) if recording else 0
+            if self.cleanup_recording(recording_id, force=True):
+                freed += size
+                evicted += 1
+        
+        if freed < to_free:
+            logger.warning(f'Only {freed / 1024 ** 3:.2f} GB could be evicted, no more analyzed recordings to remove')
+        logger.info(f'Evicted {evicted} recordings, freed {freed / 1024 ** 3:.2f} GB')
+        return freed
+    
     def cleanup_old_recordings(self, days=7):
-        """清理旧的录制文件"""
+        """批量清理过期录制的文件
+        
+        用一次索引查询选出过期录制，按批并行删除文件，再用批量UPDATE清空文件路径，
+        每批单独提交，避免长时间占用数据库写锁。
+        """
         logger.info(f'Cleaning up recordings older than {days} days')
+        if not self.cleanup_video:
+            logger.info('Video cleanup disabled, skipping retention cleanup')
+            return 0
         
+        started = time.time()
+        stats = {'recordings': 0, 'files': 0, 'bytes': 0, 'errors': 0}
         try:
             cutoff_date = datetime.now() - timedelta(days=days)
-            old_recordings = Recording.query.filter(
+            candidates = db.session.query(Recording.id, Recording.video_path).filter(
+                Recording.status == 'completed',
                 Recording.end_time < cutoff_date,
-                Recording.status == 'completed'
-            ).all()
-            
-            cleaned_count = 0
-            for recording in old_recordings:
-                if self.cleanup_recording(recording.id):
-                    cleaned_count += 1
+                Recording.video_path != None
+            ).order_by(Recording.id).all()
             
-            logger.info(f'Cleaned up {cleaned_count} old recordings')
-            return cleaned_count
+            with ThreadPoolExecutor(max_workers=self.retention_workers, thread_name_prefix='retention') as executor:
+                for i in range(0, len(candidates), self.retention_batch_size):
+                    self._cleanup_recording_batch(candidates[i:i + self.retention_batch_size], executor, stats)
         except Exception as e:
             logger.error(f'Error cleaning up old recordings: {e}')
-            return 0
+            db.session.rollback()
+        
+        elapsed = time.time() - started
+        stats['elapsed'] = round(elapsed, 3)
+        stats['files_per_second'] = round(stats['files'] / elapsed, 1) if elapsed else 0
+        stats['mb_freed'] = round(stats['bytes'] / 1024 ** 2, 1)
+        self.last_cleanup_stats = stats
+        logger.info(
+            f'Cleaned up {stats["recordings"]} old recordings: {stats["files"]} files, '
+            f'{stats["mb_freed"]} MB freed in {stats["elapsed"]}s '
+            f'({stats["files_per_second"]} files/s, {stats["errors"]} errors)'
+        )
+        return stats['recordings']
+    
+    def _cleanup_recording_batch(self, candidates, executor, stats):
+        """删除一批录制的文件并批量清空文件路径"""
+        recording_ids = [recording_id for recording_id, _ in candidates]
+        files = {recording_id: [video_path] for recording_id, video_path in candidates}
+        for recording_id, path in db.session.query(RecordingSegment.recording_id, RecordingSegment.path).filter(
+            RecordingSegment.recording_id.in_(recording_ids),
+            RecordingSegment.path != None
+        ):
+            files[recording_id].append(path)
+        for recording_id, video_path in candidates:
+            base, _ = os.path.splitext(video_path)
+            files[recording_id].extend(glob.glob(f'{glob.escape(base)}_segments*.csv'))
+        
+        # 并行删除文件，只有全部文件删除成功的录制才清空路径
+        results = executor.map(self._remove_files, files.values())
+        cleaned_ids = []
+        for recording_id, (removed, freed, ok) in zip(files.keys(), results):
+            stats['files'] += removed
+            stats['bytes'] += freed
+            if ok:
+                cleaned_ids.append(recording_id)
+            else:
+                stats['errors'] += 1
+        
+        if not cleaned_ids:
+            return
+        try:
+            Recording.query.filter(Recording.id.in_(cleaned_ids)).update(
+                {Recording.video_path: None}, synchronize_session=False
+            )
+            RecordingSegment.query.filter(RecordingSegment.recording_id.in_(cleaned_ids)).update(
+                {RecordingSegment.path: None}, synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            logger.error(f'Error updating cleaned recordings: {e}')
+            db.session.rollback()
+            return
+        
+        for recording_id in cleaned_ids:
+            storage_manager.release(recording_id)
+        stats['recordings'] += len(cleaned_ids)
+    
+    @staticmethod
+    def _remove_files(paths):
+        """删除一个录制的所有文件，返回 (删除文件数, 释放字节数, 是否全部成功)"""
+        removed, freed, ok = 0, 0, True
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+                freed += size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f'Error removing recording file {path}: {e}')
+                ok = False
+        return removed, freed, ok
 
 # 创建录制服务实例
 video_recorder = VideoRecorder()
\ No newline at end of file
@@ -0,0 +1,75 @@
+import numpy as np
+
+def detect_speech(audio, sample_rate=16000, frame_seconds=0.03, threshold_db=-40.0,
+                  min_silence=1.0, min_speech=0.3, padding=0.2):
+    """基于短时能量检测有声区间，返回 [(起始采样, 结束采样)]
+
+    每帧的平均能量高于threshold_db（dBFS）时视为有声。间隔短于min_silence的区间合并，
+    短于min_speech的区间丢弃，保留的区间前后各扩展padding秒。
+    """
+    frame = max(1, int(frame_seconds * sample_rate))
+    frame_count = len(audio) // frame
+    if not frame_count:
+        return [(0, len(audio))] if len(audio) else []
+
+    frames = np.asarray(audio[:frame_count * frame], dtype=np.float32).reshape(frame_count, frame)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    voiced = energy_db > threshold_db
+
+    # 有声帧的起止位置
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and (start - regions[-1][1]) * frame_seconds < min_silence:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    pad = int(padding * sample_rate)
+    return [
+        (max(0, start * frame - pad), min(len(audio), end * frame + pad))
+        for start, end in regions
+        if (end - start) * frame_seconds >= min_speech
+    ]
+
+def plan_chunks(regions, sample_rate=16000, chunk_seconds=300, overlap_seconds=5):
+    """把有声区间打包成转写分块，返回 [(起始采样, 结束采样, 负责起点, 负责终点)]
+
+    相邻区间在不超过分块时长时合并到同一分块；超过分块时长的区间按重叠窗口切分，
+    重叠部分以中点为界分给前后两个分块，合并结果时各分块只保留自己负责范围内的文本。
+    """
+    chunk = int(chunk_seconds * sample_rate)
+    overlap = min(int(overlap_seconds * sample_rate), chunk // 2)
+    step = chunk - overlap
+
+    # 合并相邻的有声区间
+    groups = []
+    for start, end in regions:
+        if groups and end - groups[-1][0] <= chunk:
+            groups[-1][1] = end
+        else:
+            groups.append([start, end])
+
+    chunks = []
+    for start, end in groups:
+        if end - start <= chunk:
+            chunks.append((start, end, start, end))
+            continue
+
+        # 长区间按重叠窗口切分
+        windows = []
+        offset = start
+        while True:
+            window_end = min(offset + chunk, end)
+            windows.append((offset, window_end))
+            if window_end >= end:
+                break
+            offset += step
+        for i, (window_start, window_end) in enumerate(windows):
+            keep_start = start if i == 0 else (window_start + windows[i - 1][1]) // 2
+            keep_end = end if i == len(windows) - 1 else (windows[i + 1][0] + window_end) // 2
+            chunks.append((window_start, window_end, keep_start, keep_end))
+    return chunks
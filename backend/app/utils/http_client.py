@@ -0,0 +1,21 @@
+import random
+import requests
+from requests.adapters import HTTPAdapter
+
+def create_session(pool_size=10, headers=None):
+    """创建带连接池的HTTP会话
+    
+    同一主机的请求复用keep-alive连接，避免每次请求重新建立TCP和TLS连接。
+    pool_block为True时并发请求数超过连接池大小会等待空闲连接，而不是临时新建连接。
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+def backoff_delay(retry, base=1.0, cap=30.0):
+    """计算第retry次重试前的等待秒数（指数退避加随机抖动）"""
+    return random.uniform(0, min(cap, base * (2 ** retry)))
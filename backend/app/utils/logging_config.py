@@ -0,0 +1,45 @@
+import os
+import logging
+from logging.handlers import RotatingFileHandler, WatchedFileHandler
+
+def create_log_handlers(rotate=True):
+    """按LOG_FILE和LOG_LEVEL创建文件和控制台日志处理器，返回 (文件处理器, 控制台处理器)
+
+    同一个日志文件只由主进程按大小轮转；工作进程（rotate为False）追加写入同一个文件，
+    文件被主进程轮转后自动重新打开，避免多个进程同时轮转。
+    """
+    log_file = os.getenv('LOG_FILE', './logs/app.log')
+    log_level = getattr(logging, os.getenv('LOG_LEVEL', 'INFO'))
+
+    # 确保日志目录存在
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+
+    # 设置日志格式
+    formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(process)d - %(thread)d - %(message)s'
+    )
+
+    if rotate:
+        # 文件日志处理器（大小轮转）
+        file_handler = RotatingFileHandler(
+            log_file,
+            maxBytes=10*1024*1024,
+            backupCount=5
+        )
+    else:
+        file_handler = WatchedFileHandler(log_file)
+    file_handler.setLevel(log_level)
+    file_handler.setFormatter(formatter)
+
+    # 控制台日志处理器
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(log_level)
+    console_handler.setFormatter(formatter)
+    return file_handler, console_handler
+
+def configure_worker_logging():
+    """为spawn方式启动的工作进程配置与主应用相同的根日志处理器"""
+    root_logger = logging.getLogger()
+    for handler in create_log_handlers(rotate=False):
+        root_logger.addHandler(handler)
+    root_logger.setLevel(getattr(logging, os.getenv('LOG_LEVEL', 'INFO')))
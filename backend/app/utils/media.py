@@ -0,0 +1,8 @@
+import os
+
+# 只包含音频流的录制文件扩展名
+AUDIO_EXTENSIONS = ('.wav', '.m4a', '.aac', '.mp3')
+
+def is_audio_only(path):
+    """根据扩展名判断录制文件是否只包含音频"""
+    return bool(path) and os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS
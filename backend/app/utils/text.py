@@ -0,0 +1,120 @@
+import math
+import re
+from collections import deque
+import numpy as np
+import jieba
+
+class PhraseMatcher:
+    """多模式短语匹配（Aho–Corasick自动机）
+
+    构建时把所有分类的短语放进同一个自动机，匹配时对文本只扫描一遍，
+    返回文本命中的分类，耗时与文本长度成正比，与短语数量无关。
+    构建后只读，可在多个线程间共享；更换短语时构建新的实例替换。
+    """
+
+    def __init__(self, categories):
+        """categories: {分类: [短语, ...]}"""
+        self.categories = {name: tuple(phrases) for name, phrases in categories.items()}
+        self._goto = [{}]  # 状态 -> {字符: 下一状态}
+        self._fail = [0]
+        self._output = [frozenset()]  # 状态 -> 到达该状态时命中的分类
+
+        outputs = [set()]
+        for name, phrases in self.categories.items():
+            for phrase in phrases:
+                if not phrase:
+                    continue
+                state = 0
+                for char in phrase:
+                    next_state = self._goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(self._goto)
+                        self._goto[state][char] = next_state
+                        self._goto.append({})
+                        self._fail.append(0)
+                        outputs.append(set())
+                    state = next_state
+                outputs[state].add(name)
+
+        # 按层次计算失败指针，并合并失败链上的命中分类
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                outputs[next_state] |= outputs[self._fail[next_state]]
+                queue.append(next_state)
+        self._output = [frozenset(names) for names in outputs]
+
+    def match(self, text):
+        """返回文本命中的分类集合"""
+        goto, fail, output = self._goto, self._fail, self._output
+        matched = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                matched |= output[state]
+                if len(matched) == len(self.categories):
+                    break
+        return matched
+
+def split_sentences(text, delimiters='。', keep_delimiters=False):
+    """按分隔符（任一字符）切分文本，去掉空白句子；keep_delimiters为True时每句保留句末的分隔符"""
+    if keep_delimiters:
+        pattern = f'[^{re.escape(delimiters)}]+[{re.escape(delimiters)}]*'
+        return [sentence.strip() for sentence in re.findall(pattern, text) if sentence.strip()]
+    return [sentence.strip() for sentence in re.split(f'[{re.escape(delimiters)}]', text) if sentence.strip()]
+
+def classify_sentences(text, matcher):
+    """切分一次文本并对每个句子匹配所有分类，返回 {分类: [句子, ...]}（保持原文顺序）"""
+    classified = {name: [] for name in matcher.categories}
+    for sentence in split_sentences(text):
+        for name in matcher.match(sentence):
+            classified[name].append(sentence)
+    return classified
+
+def _tokenize(sentence):
+    """用jieba分词，去掉标点和空白"""
+    return {word for word in jieba.lcut(sentence) if any(char.isalnum() for char in word)}
+
+def text_rank(sentences, count, damping=0.85, iterations=50, tolerance=1e-6):
+    """TextRank选出最重要的count个句子，按原文顺序返回
+
+    句子相似度为共同词数除以两句词数对数之和，计算量与句子数的平方成正比，
+    调用方需要限制每次传入的句子数。
+    """
+    if len(sentences) <= count:
+        return list(sentences)
+
+    tokens = [_tokenize(sentence) for sentence in sentences]
+    size = len(sentences)
+    weights = np.zeros((size, size), dtype=np.float32)
+    for i in range(size):
+        if len(tokens[i]) < 2:
+            continue
+        for j in range(i + 1, size):
+            if len(tokens[j]) < 2:
+                continue
+            common = len(tokens[i] & tokens[j])
+            if common:
+                weights[i, j] = weights[j, i] = common / (math.log(len(tokens[i])) + math.log(len(tokens[j])))
+
+    # 按出边权重归一化后迭代计算PageRank，没有相似句子的句子得分为基础值
+    out_weights = weights.sum(axis=1, keepdims=True)
+    transition = np.divide(weights, out_weights, out=np.zeros_like(weights), where=out_weights > 0)
+    scores = np.full(size, 1.0 / size, dtype=np.float32)
+    for _ in range(iterations):
+        updated = (1 - damping) / size + damping * transition.T.dot(scores)
+        if np.abs(updated - scores).sum() < tolerance:
+            scores = updated
+            break
+        scores = updated
+
+    selected = sorted(np.argsort(-scores, kind='stable')[:count])
+    return [sentences[i] for i in selected]
@@ -23,6 +23,13 @@ else
     exit 1
 fi
 
+# 配置了Whisper模型服务时先启动模型服务，各进程共用一份模型
+WHISPER_MODEL_HOST=$(grep -E '^WHISPER_MODEL_HOST=' .env 2>/dev/null | cut -d= -f2- | sed 's/#.*//' | tr -d '[:space:]')
+if [ -n "$WHISPER_MODEL_HOST" ]; then
+    echo "Starting Whisper model host on $WHISPER_MODEL_HOST..."
+    python -m app.services.model_host &
+fi
+
 # 启动定时任务服务
 echo "Starting task scheduler..."
 python -c "from app.services.task_scheduler import task_scheduler; task_scheduler.start()"
@@ -0,0 +1,25 @@
+import os
+import sys
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import db
+
+def create_test_app(database_path):
+    """创建只用于数据库访问的测试应用"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+@pytest.fixture
+def app(tmp_path):
+    """使用临时SQLite数据库的应用上下文"""
+    app = create_test_app(tmp_path / 'test.db')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
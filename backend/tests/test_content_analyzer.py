@@ -0,0 +1,105 @@
+import wave
+from datetime import datetime
+import numpy as np
+import pytest
+from app.models import db, Anchor, Recording, RecordingSegment, Transcript
+from app.services.content_analyzer import content_analyzer
+
+def write_wav(path, seconds):
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(np.full(int(seconds * 16000), 8000, dtype=np.int16).tobytes())
+    return str(path)
+
+@pytest.fixture
+def model_unavailable(monkeypatch):
+    """模型无法加载，转写使用模拟结果"""
+    monkeypatch.setattr(content_analyzer.transcriber, 'transcribe', lambda audio, **options: None)
+    monkeypatch.setattr(content_analyzer, 'keep_analyzed_recordings', True)
+
+def create_recording(**kwargs):
+    anchor = Anchor(name='anchor', douyin_id='douyin-1')
+    db.session.add(anchor)
+    db.session.commit()
+    recording = Recording(anchor_id=anchor.id, start_time=datetime.now(), status='completed', **kwargs)
+    db.session.add(recording)
+    db.session.commit()
+    return recording
+
+def test_mock_live_tail_is_not_saved(app, tmp_path, model_unavailable):
+    recording = create_recording(
+        video_path=write_wav(tmp_path / '1.wav', 30),
+        live_transcript='录制中已转写的部分。',
+        live_transcribed_seconds=20
+    )
+
+    assert content_analyzer.analyze_recording(recording.id)
+    assert Transcript.query.count() == 0
+
+def test_mock_segments_are_not_saved(app, tmp_path, model_unavailable):
+    recording = create_recording(video_path=str(tmp_path / '1.wav'))
+    db.session.add_all([
+        RecordingSegment(
+            recording_id=recording.id, segment_index=0, path=str(tmp_path / '1_0000.wav'),
+            status='completed', transcript='已转写的分段。'
+        ),
+        RecordingSegment(
+            recording_id=recording.id, segment_index=1, path=write_wav(tmp_path / '1_0001.wav', 10),
+            status='pending'
+        ),
+    ])
+    db.session.commit()
+
+    assert content_analyzer.analyze_recording(recording.id)
+    assert Transcript.query.count() == 0
+    segment = RecordingSegment.query.filter_by(segment_index=1).first()
+    assert segment.status == 'failed'
+    assert segment.transcript is None
+
+def test_silent_live_tail_keeps_live_transcript(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(content_analyzer, 'keep_analyzed_recordings', True)
+    monkeypatch.setattr(content_analyzer.transcriber, 'transcribe', lambda audio, **options: {'text': '', 'segments': []})
+    recording = create_recording(
+        video_path=write_wav(tmp_path / '1.wav', 30),
+        live_transcript='录制中已转写的部分。',
+        live_transcribed_seconds=30
+    )
+    monkeypatch.setattr(content_analyzer, '_transcribe_recording', lambda recording: pytest.fail('full transcription'))
+
+    assert content_analyzer.analyze_recording(recording.id)
+    assert Transcript.query.one().text == '录制中已转写的部分。'
+
+def test_read_wav_while_recording(tmp_path):
+    path = write_wav(tmp_path / '1.wav', 2)
+    with open(path, 'r+b') as f:
+        data = bytearray(f.read())
+        # 录制中的文件头：RIFF和data的长度尚未写入
+        data[4:8] = bytes(4)
+        offset = data.find(b'data')
+        data[offset + 4:offset + 8] = bytes(4)
+        f.seek(0)
+        f.write(data)
+
+    assert len(content_analyzer._read_wav(path)) == 2 * 16000
+    assert len(content_analyzer._read_wav(path, start=1.5)) == 8000
+
+def test_reused_transcript_is_linked_to_recording(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(content_analyzer, 'keep_analyzed_recordings', True)
+    monkeypatch.setattr(
+        content_analyzer.transcriber, 'transcribe',
+        lambda audio, **options: {'text': '市场走势平稳。', 'segments': [{'start': 0, 'end': 10, 'text': '市场走势平稳。'}]}
+    )
+    first = create_recording(video_path=write_wav(tmp_path / '1.wav', 10))
+    second = Recording(
+        anchor_id=first.anchor_id, video_path=write_wav(tmp_path / '2.wav', 10),
+        start_time=datetime.now(), status='completed'
+    )
+    db.session.add(second)
+    db.session.commit()
+
+    assert content_analyzer.analyze_recording(first.id)
+    assert content_analyzer.analyze_recording(second.id)
+    assert content_analyzer._load_transcript(second.id) == '市场走势平稳。'
+    assert Transcript.query.filter_by(recording_id=second.id).one().content_hash is None
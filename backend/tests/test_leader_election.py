@@ -0,0 +1,35 @@
+from app.models import db, SchedulerLease
+from app.services.leader_election import LeaderElection
+
+def create_election(node_id):
+    election = LeaderElection('test')
+    election.node_id = node_id
+    return election
+
+def test_lease_is_exclusive_until_expired(app):
+    leader = create_election('node-a')
+    standby = create_election('node-b')
+
+    assert leader.try_acquire()
+    assert not standby.try_acquire()
+    # 持有者可以续约
+    assert leader.try_acquire()
+    assert standby.get_holder() == 'node-a'
+
+    # 租约过期后备用节点接管，原持有者无法再续约
+    db.session.get(SchedulerLease, 'test').expires_at = 0
+    db.session.commit()
+    assert standby.get_holder() is None
+    assert standby.try_acquire()
+    assert not leader.try_acquire()
+    assert leader.get_holder() == 'node-b'
+
+def test_released_lease_is_taken_over_immediately(app):
+    leader = create_election('node-a')
+    standby = create_election('node-b')
+
+    assert leader.try_acquire()
+    leader.release()
+
+    assert leader.get_holder() is None
+    assert standby.try_acquire()
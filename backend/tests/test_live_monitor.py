@@ -0,0 +1,53 @@
+from datetime import datetime
+import pytest
+from app.services.live_monitor import PollingSchedule
+
+# 2026-10-12是周一
+USUAL_START = datetime(2026, 10, 12, 20, 0)
+
+@pytest.fixture
+def schedule():
+    schedule = PollingSchedule(base_interval=60, min_interval=10, max_interval=3600, hot_window=30)
+    schedule.learn({1: [USUAL_START]})
+    return schedule
+
+def test_next_delay_follows_learned_start_times(schedule):
+    def delay(moment, anchor_id=1, is_live=False):
+        return schedule.next_delay(anchor_id, moment.timestamp(), is_live)
+
+    # 开播时段内密集检查
+    assert delay(datetime(2026, 10, 12, 20, 10)) == 10
+    # 其他日期的同一时刻按基础间隔检查
+    assert delay(datetime(2026, 10, 13, 20, 0)) == 60
+    # 其余时间退避，但不越过下一个开播时段的起点
+    assert delay(datetime(2026, 10, 12, 10, 0)) == 3600
+    assert delay(datetime(2026, 10, 12, 19, 0)) == 1800
+    # 直播中和没有历史的主播按基础间隔检查
+    assert delay(datetime(2026, 10, 12, 10, 0), is_live=True) == 60
+    assert delay(datetime(2026, 10, 12, 10, 0), anchor_id=2) == 60
+
+def test_pop_due_returns_only_current_entries(schedule):
+    schedule.sync([1, 2, 3], now=100)
+    assert schedule.pop_due(100) == [1, 2, 3]
+
+    schedule.schedule(1, 150)
+    schedule.schedule(2, 120)
+    schedule.schedule(1, 300)  # 覆盖之前的检查时间
+
+    assert schedule.next_due() == 120
+    assert schedule.pop_due(200) == [2]
+    assert schedule.next_due() == 300
+    assert 1 in schedule and len(schedule) == 1
+
+def test_sync_adds_and_removes_anchors(schedule):
+    schedule.sync([1, 2], now=100)
+    schedule.pop_due(100)
+    schedule.reschedule(1, now=100)
+    schedule.reschedule(2, now=100)
+
+    schedule.sync([2, 3], now=150)
+
+    assert 1 not in schedule
+    assert schedule.pop_due(150) == [3]
+    assert schedule.pop_due(10 ** 10) == [2]
+    assert schedule.next_due() is None
@@ -0,0 +1,18 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from app.utils.logging_config import configure_worker_logging
+
+def test_worker_process_writes_to_app_log(tmp_path, monkeypatch):
+    log_file = tmp_path / 'logs' / 'app.log'
+    monkeypatch.setenv('LOG_FILE', str(log_file))
+    monkeypatch.setenv('LOG_LEVEL', 'INFO')
+
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=configure_worker_logging
+    ) as pool:
+        pool.submit(logging.info, 'analysis worker started').result()
+
+    assert log_file.read_text().rstrip().endswith('analysis worker started')
@@ -0,0 +1,43 @@
+import os
+import stat
+import time
+from threading import Thread
+import numpy as np
+import pytest
+from app.services.model_host import ModelHostServer, ModelHostClient
+
+@pytest.fixture(autouse=True)
+def stub_engine(monkeypatch):
+    monkeypatch.setenv('ASR_ENGINE', 'stub')
+    monkeypatch.delenv('WHISPER_MODEL_HOST_AUTHKEY', raising=False)
+
+def start_server(address, authkey=None):
+    server = ModelHostServer(address, authkey)
+    Thread(target=server.serve_forever, daemon=True).start()
+    deadline = time.time() + 5
+    while not os.path.exists(address) and time.time() < deadline:
+        time.sleep(0.05)
+    return server
+
+def test_tcp_address_requires_authkey():
+    with pytest.raises(ValueError):
+        ModelHostClient('127.0.0.1:6000')
+    with pytest.raises(ValueError):
+        ModelHostServer('127.0.0.1:6000')
+    assert ModelHostClient('127.0.0.1:6000', 'secret').authkey == b'secret'
+
+def test_unix_socket_is_private(tmp_path):
+    address = str(tmp_path / 'model.sock')
+    start_server(address)
+
+    assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+    result = ModelHostClient(address).transcribe(np.zeros(16000 * 15, dtype=np.float32))
+    assert result['text'] == '[0s-10s][10s-15s]'
+
+def test_authkey_mismatch_is_rejected(tmp_path):
+    address = str(tmp_path / 'model.sock')
+    start_server(address, 'secret')
+
+    assert ModelHostClient(address, 'secret').transcribe(np.zeros(16000, dtype=np.float32))['text'] == '[0s-1s]'
+    with pytest.raises(Exception):
+        ModelHostClient(address, 'wrong').transcribe(np.zeros(16000, dtype=np.float32))
@@ -0,0 +1,112 @@
+import sqlite3
+from conftest import create_test_app
+from app.models import db, Anchor, Recording, upgrade_schema
+
+# 最早发布的数据库（instance/data.db）中的表结构
+OLD_SCHEMA = [
+    '''CREATE TABLE anchors (
+        id INTEGER NOT NULL,
+        name VARCHAR(100) NOT NULL,
+        douyin_id VARCHAR(100) NOT NULL,
+        room_id VARCHAR(100),
+        avatar_url VARCHAR(255),
+        is_followed BOOLEAN,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME,
+        PRIMARY KEY (id),
+        UNIQUE (douyin_id)
+    )''',
+    'CREATE INDEX ix_anchors_id ON anchors (id)',
+    '''CREATE TABLE recordings (
+        id INTEGER NOT NULL,
+        anchor_id INTEGER NOT NULL,
+        video_path VARCHAR(255) NOT NULL,
+        video_duration INTEGER,
+        start_time DATETIME NOT NULL,
+        end_time DATETIME,
+        status VARCHAR(20),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(anchor_id) REFERENCES anchors (id)
+    )''',
+    'CREATE INDEX ix_recordings_id ON recordings (id)',
+    '''CREATE TABLE summaries (
+        id INTEGER NOT NULL,
+        recording_id INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        core_points TEXT,
+        market_analysis TEXT,
+        investment_advice TEXT,
+        keywords VARCHAR(255),
+        status VARCHAR(20),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(recording_id) REFERENCES recordings (id)
+    )''',
+    'CREATE INDEX ix_summaries_id ON summaries (id)',
+]
+
+def create_old_database(path):
+    conn = sqlite3.connect(path)
+    for statement in OLD_SCHEMA:
+        conn.execute(statement)
+    conn.execute("INSERT INTO anchors (id, name, douyin_id, is_followed) VALUES (1, 'anchor', 'douyin-1', 1)")
+    conn.execute(
+        "INSERT INTO recordings (id, anchor_id, video_path, start_time, status) "
+        "VALUES (1, 1, '/data/1.mp4', '2024-01-01 08:00:00', 'completed')"
+    )
+    conn.commit()
+    conn.close()
+
+def upgrade_old_database(tmp_path):
+    """创建旧表结构的数据库并升级，返回应用"""
+    path = tmp_path / 'old.db'
+    create_old_database(path)
+    app = create_test_app(path)
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        # 重复执行不报错
+        upgrade_schema()
+    return app
+
+def test_upgrade_adds_anchor_columns(tmp_path):
+    app = upgrade_old_database(tmp_path)
+    with app.app_context():
+        anchor = Anchor.query.filter_by(douyin_id='douyin-1').first()
+        assert anchor.capture_mode is None
+        anchor.capture_mode = 'audio'
+        db.session.commit()
+        assert Anchor.query.filter_by(capture_mode='audio').count() == 1
+        db.session.remove()
+
+def test_upgrade_adds_recording_columns(tmp_path):
+    app = upgrade_old_database(tmp_path)
+    with app.app_context():
+        recording = Recording.query.first()
+        assert recording.video_path == '/data/1.mp4'
+        assert recording.live_transcribed_seconds is None
+        recording.live_transcript = 'text'
+        recording.live_transcribed_seconds = 60.0
+        db.session.commit()
+        db.session.expire_all()
+        assert Recording.query.first().live_transcript == 'text'
+        db.session.remove()
+
+def test_upgrade_makes_video_path_nullable(tmp_path):
+    app = upgrade_old_database(tmp_path)
+    with app.app_context():
+        recording = Recording.query.first()
+        assert recording.anchor.douyin_id == 'douyin-1'
+        recording.video_path = None
+        db.session.commit()
+        db.session.expire_all()
+        assert Recording.query.first().video_path is None
+
+        columns = {column['name']: column for column in db.inspect(db.engine).get_columns('recordings')}
+        assert columns['video_path']['nullable']
+        indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('recordings')}
+        assert 'ix_recordings_id' in indexes
+        db.session.remove()
@@ -0,0 +1,25 @@
+from app.services.shard_manager import HashRing
+
+KEYS = [f'douyin-{i}' for i in range(1000)]
+
+def test_empty_ring():
+    assert HashRing().get_node('douyin-1') is None
+
+def test_keys_are_spread_across_nodes():
+    ring = HashRing(['a', 'b', 'c'])
+
+    owners = [ring.get_node(key) for key in KEYS]
+
+    assert owners == [HashRing(['c', 'b', 'a']).get_node(key) for key in KEYS]
+    assert all(owners.count(node) > 200 for node in 'abc')
+
+def test_only_keys_of_changed_node_move():
+    before = HashRing(['a', 'b', 'c'])
+    joined = HashRing(['a', 'b', 'c', 'd'])
+    left = HashRing(['a', 'b'])
+
+    for key in KEYS:
+        if joined.get_node(key) != before.get_node(key):
+            assert joined.get_node(key) == 'd'
+        if before.get_node(key) != 'c':
+            assert left.get_node(key) == before.get_node(key)
@@ -0,0 +1,22 @@
+from app.services.summarization import HierarchicalSummarizer
+
+def test_summarize_terminates_when_ratio_keeps_everything(monkeypatch):
+    monkeypatch.setenv('SUMMARY_RATIO', '1')
+    monkeypatch.setenv('SUMMARY_CHUNK_SENTENCES', '1')
+    monkeypatch.setenv('SUMMARY_MAX_SENTENCES', '3')
+    monkeypatch.setenv('SUMMARY_WORKERS', '1')
+    summarizer = HierarchicalSummarizer()
+    text = ''.join(f'第{i}句讲的是市场行情和产品价格。' for i in range(50))
+
+    summary = summarizer.summarize(text)
+
+    assert summarizer.chunk_sentences == 2
+    assert 1 <= summary.count('。') <= 3
+
+def test_summarize_empty_text():
+    assert HierarchicalSummarizer().summarize('  \n ') == ''
+
+def test_join_keeps_original_punctuation():
+    assert HierarchicalSummarizer._join(['你好。', 'Really?', '真的吗？', '没有标点', '结束']) == (
+        '你好。Really? 真的吗？没有标点\n结束'
+    )
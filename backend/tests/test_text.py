@@ -0,0 +1,31 @@
+from app.utils.text import PhraseMatcher, classify_sentences, split_sentences, text_rank
+
+def test_phrase_matcher_finds_overlapping_phrases():
+    matcher = PhraseMatcher({'he': ['he'], 'she': ['she'], 'hers': ['hers'], 'his': ['his']})
+
+    assert matcher.match('ushers') == {'he', 'she', 'hers'}
+    assert matcher.match('this') == {'his'}
+    assert matcher.match('nothing') == set()
+
+def test_phrase_matcher_categories():
+    matcher = PhraseMatcher({'产品': ['手机', '耳机'], '价格': ['优惠', '价格'], '空': ['']})
+
+    assert matcher.match('这款耳机今天有优惠') == {'产品', '价格'}
+    assert matcher.match('') == set()
+    assert classify_sentences('手机很好用。价格很优惠。今天天气不错。', matcher) == {
+        '产品': ['手机很好用'],
+        '价格': ['价格很优惠'],
+        '空': [],
+    }
+
+def test_split_sentences_keeps_delimiters():
+    assert split_sentences('你好！真的吗?  好的。\n结束', '。！？!?\n', keep_delimiters=True) == [
+        '你好！', '真的吗?', '好的。', '结束'
+    ]
+    assert split_sentences('一。二。。三', '。') == ['一', '二', '三']
+
+def test_text_rank_keeps_original_order():
+    sentences = ['今天的市场行情非常好', '我喜欢吃苹果', '今天市场的行情不错', '市场行情今天非常好']
+
+    assert text_rank(sentences, 2) == ['今天的市场行情非常好', '市场行情今天非常好']
+    assert text_rank(sentences, 4) == sentences
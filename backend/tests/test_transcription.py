@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from app.services.transcription import ChunkedTranscriber, SAMPLE_RATE
+from app.utils.audio import detect_speech, plan_chunks
+
+def tone(seconds, amplitude=0.1):
+    return np.full(int(seconds * SAMPLE_RATE), amplitude, dtype=np.float32)
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+@pytest.fixture
+def transcriber(monkeypatch):
+    """使用模拟引擎在当前进程转写"""
+    monkeypatch.setenv('ASR_ENGINE', 'stub')
+    monkeypatch.setenv('WHISPER_MODEL_HOST', '')
+    monkeypatch.setenv('TRANSCRIBE_WORKERS', '1')
+    monkeypatch.setenv('ASR_STUB_SEGMENT_SECONDS', '1')
+    monkeypatch.setenv('TRANSCRIBE_CHUNK_SECONDS', '10')
+    monkeypatch.setenv('TRANSCRIBE_CHUNK_OVERLAP', '2')
+    return ChunkedTranscriber()
+
+def test_detect_speech_skips_silence():
+    audio = np.concatenate([tone(3), silence(5), tone(2)])
+
+    regions = detect_speech(audio, SAMPLE_RATE, padding=0)
+
+    assert len(regions) == 2
+    assert [bound / SAMPLE_RATE for region in regions for bound in region] == pytest.approx([0, 3, 8, 10], abs=0.03)
+
+def test_detect_speech_merges_short_gaps_and_drops_clicks():
+    audio = np.concatenate([tone(2), silence(0.5), tone(2), silence(3), tone(0.1), silence(3)])
+
+    regions = detect_speech(audio, SAMPLE_RATE, padding=0)
+
+    assert len(regions) == 1
+    assert regions[0][1] / SAMPLE_RATE == pytest.approx(4.5, abs=0.03)
+
+def test_detect_speech_all_silent():
+    assert detect_speech(silence(5), SAMPLE_RATE) == []
+
+def test_plan_chunks_packs_nearby_regions():
+    regions = [(0, 2 * SAMPLE_RATE), (5 * SAMPLE_RATE, 8 * SAMPLE_RATE), (20 * SAMPLE_RATE, 25 * SAMPLE_RATE)]
+
+    chunks = plan_chunks(regions, SAMPLE_RATE, chunk_seconds=10, overlap_seconds=2)
+
+    assert chunks == [
+        (0, 8 * SAMPLE_RATE, 0, 8 * SAMPLE_RATE),
+        (20 * SAMPLE_RATE, 25 * SAMPLE_RATE, 20 * SAMPLE_RATE, 25 * SAMPLE_RATE),
+    ]
+
+def test_plan_chunks_splits_long_region_with_overlap():
+    chunks = plan_chunks([(0, 25 * SAMPLE_RATE)], SAMPLE_RATE, chunk_seconds=10, overlap_seconds=2)
+
+    assert [(start, end) for start, end, _, _ in chunks] == [
+        (0, 10 * SAMPLE_RATE), (8 * SAMPLE_RATE, 18 * SAMPLE_RATE), (16 * SAMPLE_RATE, 25 * SAMPLE_RATE)
+    ]
+    # 各分块负责的范围首尾相接，覆盖整个区间且互不重叠
+    assert [(keep_start, keep_end) for _, _, keep_start, keep_end in chunks] == [
+        (0, 9 * SAMPLE_RATE), (9 * SAMPLE_RATE, 17 * SAMPLE_RATE), (17 * SAMPLE_RATE, 25 * SAMPLE_RATE)
+    ]
+
+def test_transcribe_merges_overlapping_chunks(transcriber, monkeypatch):
+    monkeypatch.setattr(transcriber, 'vad_enabled', False)
+
+    result = transcriber.transcribe(tone(25))
+
+    # 重叠部分只保留一份，片段按时间顺序排列
+    assert [segment['start'] for segment in result['segments']] == list(range(25))
+    assert result['text'] == ''.join(segment['text'] for segment in result['segments'])
+
+def test_transcribe_skips_silence(transcriber):
+    audio = np.concatenate([tone(5), silence(20), tone(5)])
+
+    result = transcriber.transcribe(audio)
+
+    assert result['segments']
+    assert not [segment for segment in result['segments'] if 6 <= segment['start'] < 24]
+    assert result['segments'][-1]['end'] == pytest.approx(30, abs=0.01)
+
+def test_transcribe_silent_audio(transcriber):
+    assert transcriber.transcribe(silence(10)) == {'text': '', 'segments': []}
@@ -33,6 +33,8 @@ const RecordingList = () => {
     switch (status) {
       case 'recording':
         return 'blue'
+      case 'finalizing':
+        return 'orange'
       case 'completed':
         return 'green'
       case 'failed':
@@ -46,6 +48,8 @@ const RecordingList = () => {
     switch (status) {
       case 'recording':
         return '录制中'
+      case 'finalizing':
+        return '处理中'
       case 'completed':
         return '已完成'
       case 'failed':